@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""
+Local signing service for EFI_VARIABLE_AUTHENTICATION_2 payloads.
+
+The daemon keeps the cryptography module and the parsed signer keys in
+memory and signs batches of variables sent over a Unix socket, so an image
+build calling the signer many times pays the Python start-up, import and key
+parsing cost once. create_auth_payload.py --socket is the client.
+
+Usage: auth_signing_daemon.py serve [--socket PATH] [--signer KEY CERT]...
+       auth_signing_daemon.py stop [--socket PATH]
+       auth_signing_daemon.py bench [--socket PATH] --key KEY --cert CERT --data FILE [--count N]
+
+Messages in both directions are a little-endian u32 length, a JSON header of
+that length and the binary blobs the header describes, back to back. A sign
+request lists its items (name, guid, attributes, timestamp, key, cert, size)
+followed by the variable data of each item; the response lists the size of
+each item's auth header (or its error) followed by the auth headers. The
+client then writes header + data itself, so the data crosses the socket once.
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import socket
+import argparse
+import threading
+import tempfile
+import subprocess
+import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from create_auth_payload import load_signer, efi_time_bytes, signed_data_prefix, \
+    build_auth_header, read_signed_data, write_buffers, load_batch_manifest
+
+AUTH_SIGNING_SOCKET_ENV_VAR = "AUTH_SIGNING_SOCKET"
+DEFAULT_SOCKET_PATH = os.path.join(os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+                                   f"auth-signing-{os.getuid()}.sock")
+MESSAGE_HEADER_LIMIT = 16 << 20
+# Most variable data accepted for one item and for one sign request
+ITEM_DATA_LIMIT = 64 << 20
+REQUEST_DATA_LIMIT = 256 << 20
+
+def default_socket_path():
+    return os.getenv(AUTH_SIGNING_SOCKET_ENV_VAR) or DEFAULT_SOCKET_PATH
+
+def recv_into_exact(sock, view):
+    while view:
+        count = sock.recv_into(view)
+        if not count:
+            raise ConnectionError("connection closed mid-message")
+        view = view[count:]
+
+def recv_message_header(sock):
+    """Returns the JSON header of the next message, or None at end of stream."""
+    length_bytes = sock.recv(4, socket.MSG_WAITALL)
+    if not length_bytes:
+        return None
+    if len(length_bytes) != 4:
+        raise ConnectionError("truncated message length")
+    length, = struct.unpack("<L", length_bytes)
+    if length > MESSAGE_HEADER_LIMIT:
+        raise ValueError(f"message header of {length} bytes exceeds the limit")
+    header = bytearray(length)
+    recv_into_exact(sock, memoryview(header))
+    return json.loads(header)
+
+def send_message(sock, header, blobs=()):
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    sock.sendall(struct.pack("<L", len(header_bytes)) + header_bytes)
+    for blob in blobs:
+        sock.sendall(blob)
+
+class SigningRequestHandler(socketserver.BaseRequestHandler):
+    """Serves the messages of one client connection until it closes."""
+
+    def handle(self):
+        try:
+            while True:
+                request = recv_message_header(self.request)
+                if request is None:
+                    return
+                op = request.get("op")
+                if op == "sign":
+                    if not self.sign(request.get("items", [])):
+                        return
+                elif op == "ping":
+                    send_message(self.request, {"ok": True, "pid": os.getpid(),
+                                                "signers": len(self.server.signer_files)})
+                elif op == "shutdown":
+                    send_message(self.request, {"ok": True})
+                    # Handlers run on their own threads, so this cannot block serve_forever()
+                    self.server.shutdown()
+                    return
+                else:
+                    send_message(self.request, {"error": f"unknown op {op!r}"})
+        except (ConnectionError, ValueError) as e:
+            print(f"Client error: {e}")
+
+    def sign(self, items):
+        """
+        Signs the items of one request and sends the results. Returns False
+        if the connection cannot be used any further: without a valid data
+        size the data of the following items cannot be found in the stream,
+        and data over the limits is not read at all.
+        """
+        results = []
+        headers = []
+        request_size = 0
+        framing_lost = False
+        # The data of every item has to be drained from the socket even when
+        # an earlier item fails, so errors are collected per item
+        for index, item in enumerate(items):
+            try:
+                size = int(item.get("size", 0))
+                if size < 0:
+                    raise ValueError(f"negative size {size}")
+                if size > ITEM_DATA_LIMIT:
+                    raise ValueError(f"{size} bytes exceed the limit of {ITEM_DATA_LIMIT} per item")
+                request_size += size
+                if request_size > REQUEST_DATA_LIMIT:
+                    raise ValueError(f"the request exceeds the limit of {REQUEST_DATA_LIMIT} bytes")
+            except (AttributeError, TypeError, ValueError) as e:
+                results.append({"error": f"bad request: invalid data size: {e}"})
+                results.extend({"error": f"not read: item {index} has an invalid data size"}
+                               for _ in items[index + 1:])
+                framing_lost = True
+                break
+            try:
+                prefix = signed_data_prefix(item["name"], item["guid"], int(item["attributes"]),
+                                            efi_time_bytes(item["timestamp"]))
+            except (KeyError, TypeError, ValueError) as e:
+                prefix = None
+                error = f"bad request: {e}"
+            signed_data = bytearray(len(prefix or b"") + size)
+            recv_into_exact(self.request, memoryview(signed_data)[len(prefix or b""):])
+            if prefix is None:
+                results.append({"error": error})
+                continue
+            signed_data[:len(prefix)] = prefix
+            try:
+                private_key, cert = load_signer(item["key"], item["cert"])
+                self.server.signer_files.add((item["key"], item["cert"]))
+                auth_header = build_auth_header(private_key, cert, signed_data, prefix[-16:])
+            except Exception as e:
+                results.append({"error": str(e)})
+                continue
+            results.append({"size": len(auth_header)})
+            headers.append(auth_header)
+        with self.server.signed_lock:
+            self.server.signed += len(headers)
+        send_message(self.request, {"items": results}, headers)
+        return not framing_lost
+
+class SigningServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        self.signer_files = set()
+        self.signed = 0
+        self.signed_lock = threading.Lock() # Handlers run on threads of their own
+        super().__init__(socket_path, SigningRequestHandler)
+
+def serve(socket_path, signers):
+    for key_file, cert_file in signers:
+        load_signer(os.path.abspath(key_file), os.path.abspath(cert_file))
+        print(f"Loaded signer '{cert_file}'")
+
+    if os.path.exists(socket_path):
+        try:
+            client = SigningClient(socket_path)
+            client.ping()
+            client.close()
+            print(f"Error: A signing daemon is already listening on '{socket_path}'")
+            return 1
+        except OSError:
+            os.unlink(socket_path) # Stale socket of a daemon that died
+
+    old_umask = os.umask(0o177) # Only this user may connect and have things signed
+    try:
+        server = SigningServer(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.signer_files.update((os.path.abspath(key), os.path.abspath(cert)) for key, cert in signers)
+
+    print(f"Signing daemon listening on '{socket_path}' (pid {os.getpid()})")
+    try:
+        server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+    print(f"Signing daemon stopped after {server.signed} payloads.")
+    return 0
+
+class SigningClient:
+    """Thin client: sends variable data to the daemon and writes the payloads."""
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+    def close(self):
+        self.sock.close()
+
+    def ping(self):
+        send_message(self.sock, {"op": "ping"})
+        return recv_message_header(self.sock)
+
+    def shutdown(self):
+        send_message(self.sock, {"op": "shutdown"})
+        return recv_message_header(self.sock)
+
+    def sign(self, items, datas):
+        """Returns (auth header or None, error or None) for each item and its data buffer."""
+        request = [dict(item, size=len(data)) for item, data in zip(items, datas)]
+        send_message(self.sock, {"op": "sign", "items": request}, datas)
+        response = recv_message_header(self.sock)
+        if response is None:
+            raise ConnectionError("daemon closed the connection")
+        if "error" in response:
+            raise ValueError(response["error"])
+        results = []
+        for result in response["items"]:
+            if "error" in result:
+                results.append((None, result["error"]))
+                continue
+            auth_header = bytearray(result["size"])
+            recv_into_exact(self.sock, memoryview(auth_header))
+            results.append((auth_header, None))
+        return results
+
+    def sign_entries(self, entries):
+        """
+        Signs create_auth_payload.py manifest entries in one request and writes
+        their outputs. Returns (output, payload size, seconds, error) per entry.
+        """
+        start = time.perf_counter()
+        items = []
+        datas = []
+        read_errors = {}
+        for index, entry in enumerate(entries):
+            try:
+                datas.append(read_signed_data(entry['data'], b""))
+            except OSError as e:
+                read_errors[index] = str(e)
+                continue
+            items.append({"name": entry['name'], "guid": entry['guid'], "attributes": entry['attributes'],
+                          "timestamp": entry['timestamp'], "key": os.path.abspath(entry['key']),
+                          "cert": os.path.abspath(entry['cert'])})
+        signed = iter(zip(self.sign(items, datas), datas))
+
+        results = []
+        for index, entry in enumerate(entries):
+            if index in read_errors:
+                results.append((entry['output'], 0, 0.0, read_errors[index]))
+                continue
+            (auth_header, error), data = next(signed)
+            if error:
+                results.append((entry['output'], 0, 0.0, error))
+                continue
+            try:
+                write_buffers(entry['output'], [auth_header, data])
+            except OSError as e:
+                results.append((entry['output'], 0, 0.0, str(e)))
+                continue
+            results.append((entry['output'], len(auth_header) + len(data), 0.0, None))
+        # One round trip for the whole batch: report the average per entry
+        seconds = (time.perf_counter() - start) / max(1, len(entries))
+        return [(output, size, seconds, error) for output, size, _, error in results]
+
+def benchmark(socket_path, key_file, cert_file, data_file, count):
+    """Compares one process per payload with single and batched daemon requests."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "create_auth_payload.py")
+    with tempfile.TemporaryDirectory(prefix="auth-bench-") as work_dir:
+        entry = {"name": "db", "key": os.path.abspath(key_file), "cert": os.path.abspath(cert_file),
+                 "timestamp": "2030-01-01 00:00:00", "data": os.path.abspath(data_file)}
+        manifest = os.path.join(work_dir, "one.json")
+        with open(manifest, "w") as f:
+            json.dump({"variables": [dict(entry, output="process.auth")]}, f)
+
+        process_count = min(count, 20)
+        start = time.perf_counter()
+        for _ in range(process_count):
+            subprocess.run([sys.executable, script, "--batch", manifest], check=True, stdout=subprocess.DEVNULL)
+        per_process = process_count / (time.perf_counter() - start)
+
+        entries = load_batch_manifest(manifest) * count
+        client = SigningClient(socket_path)
+        try:
+            start = time.perf_counter()
+            for one in entries:
+                client.sign_entries([one])
+            single = count / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            failures = sum(1 for result in client.sign_entries(entries) if result[3])
+            batched = count / (time.perf_counter() - start)
+        finally:
+            client.close()
+
+    print(f"Data: {os.path.getsize(data_file)} bytes per payload")
+    print(f"  one process per payload   {per_process:>9.1f} payloads/s ({process_count} runs)")
+    print(f"  daemon, one per request   {single:>9.1f} payloads/s ({count} requests)")
+    print(f"  daemon, one batch         {batched:>9.1f} payloads/s ({count} payloads)")
+    if failures:
+        print(f"Warning: {failures} payloads failed")
+    return 1 if failures else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Local EFI_VARIABLE_AUTHENTICATION_2 signing daemon.")
+    parser.add_argument("--socket", default=default_socket_path(),
+                        help=f"Unix socket path (default: ${AUTH_SIGNING_SOCKET_ENV_VAR} or {DEFAULT_SOCKET_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the daemon in the foreground")
+    serve_parser.add_argument("--signer", nargs=2, action="append", default=[], metavar=("KEY", "CERT"),
+                              help="preload a signer key and certificate (repeatable)")
+    subparsers.add_parser("stop", help="stop a running daemon")
+    bench_parser = subparsers.add_parser("bench", help="compare the daemon with one process per payload")
+    bench_parser.add_argument("--key", required=True)
+    bench_parser.add_argument("--cert", required=True)
+    bench_parser.add_argument("--data", required=True)
+    bench_parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        return serve(args.socket, args.signer)
+    try:
+        if args.command == "stop":
+            client = SigningClient(args.socket)
+            client.shutdown()
+            client.close()
+            return 0
+        return benchmark(args.socket, args.key, args.cert, args.data, args.count)
+    except OSError as e:
+        print(f"Error: Could not reach the signing daemon at '{args.socket}': {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks load_edk2_symbols.py against a synthetic EDK2 tree and serial log.
+
+Generates a package tree with thousands of .inf files, the matching
+Build/<Pkg>/<Target>/X64 .debug outputs (minimal ELF64 files) and a serial
+log of configurable size with EDK2_IMAGE_INFO, SMI handler_base and shim
+markers. It then times the GUID map (cold, warm and after a one-module
+rebuild), the log scan, the .text offset resolution and the symbol loading
+against a stub gdb module, so regressions show up before a debug session.
+
+Usage: bench_load_edk2_symbols.py [--infs N] [--log-mb N] [--workers N] [--keep DIR] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import types
+import uuid
+
+PLATFORM_PACKAGE = "BenchPlatformPkg"
+BUILD_TARGET = "DEBUG_BENCH"
+PACKAGES = ["MdeModulePkg", "MdePkg", "UefiPayloadPkg", "ShellPkg", "FatPkg", PLATFORM_PACKAGE]
+MODULE_TYPES = ["DXE_DRIVER", "DXE_DRIVER", "UEFI_DRIVER", "DXE_RUNTIME_DRIVER",
+                "UEFI_APPLICATION", "BASE", "PEIM", "DXE_SMM_DRIVER"]
+
+def install_stub_gdb(load_delay=0.0):
+    """
+    Installs a minimal 'gdb' module that records executed commands.
+    add-symbol-file sleeps for load_delay seconds to stand in for GDB reading
+    the DWARF of the file.
+    """
+    stub = types.ModuleType("gdb")
+
+    class GdbError(RuntimeError):
+        pass
+
+    class Objfile:
+        def __init__(self, filename, address):
+            self.filename = filename
+            self.address = address
+
+        def is_valid(self):
+            return True
+
+    class EventRegistry:
+        def __init__(self):
+            self.handlers = []
+
+        def connect(self, handler):
+            self.handlers.append(handler)
+
+        def disconnect(self, handler):
+            self.handlers.remove(handler)
+
+    loaded = []
+    commands = []
+
+    def execute(command, from_tty=False, to_string=False):
+        commands.append(command)
+        words = command.split()
+        if words[0] == "add-symbol-file":
+            if load_delay:
+                time.sleep(load_delay)
+            loaded.append(Objfile(words[1].strip('"'), int(words[2], 16)))
+        elif words[0] == "remove-symbol-file":
+            if words[1] == "-a":
+                matches = [objfile for objfile in loaded if objfile.address == int(words[2], 16)]
+            else:
+                matches = [objfile for objfile in loaded if objfile.filename == words[1].strip('"')]
+            if not matches:
+                raise GdbError(f"No symbol file found for {words[-1]}")
+            loaded.remove(matches[0])
+        return "" if to_string else None
+
+    stub.error = GdbError
+    stub.GdbError = GdbError
+    stub.COMMAND_USER = 13
+    stub.COMPLETE_FILENAME = 1
+    stub.Command = type("Command", (), {"__init__": lambda self, *args: None,
+                                        "dont_repeat": lambda self: None})
+    stub.Function = type("Function", (), {"__init__": lambda self, *args: None})
+    stub.Parameter = type("Parameter", (), {"__init__": lambda self, *args: None})
+    stub.execute = execute
+    stub.objfiles = lambda: list(loaded)
+    stub.post_event = lambda callback: callback()
+    stub.string_to_argv = lambda argument: argument.split()
+    stub.events = types.SimpleNamespace(stop=EventRegistry(), cont=EventRegistry(),
+                                        exited=EventRegistry(), new_objfile=EventRegistry())
+    stub.loaded_objfiles = loaded
+    stub.executed_commands = commands
+    sys.modules["gdb"] = stub
+    return stub
+
+def make_elf64(text_vma, text_size, padding=0):
+    """Returns a minimal little-endian ELF64 file with .text and .shstrtab sections."""
+    shstrtab = b"\0.text\0.shstrtab\0"
+    body = b"\x90" * text_size + b"\0" * padding
+    text_offset = 64
+    shstrtab_offset = text_offset + len(body)
+    shoff = (shstrtab_offset + len(shstrtab) + 7) & ~7
+
+    header = b"\x7fELF" + bytes([2, 1, 1]) + b"\0" * 9
+    header += struct.pack("<HHIQQQIHHHHHH", 1, 0x3E, 1, 0, 0, shoff, 0, 64, 0, 0, 64, 3, 2)
+    sections = struct.pack("<IIQQQQIIQQ", 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    sections += struct.pack("<IIQQQQIIQQ", 1, 1, 0x6, text_vma, text_offset, text_size, 0, 0, 16, 0)
+    sections += struct.pack("<IIQQQQIIQQ", 7, 3, 0, 0, shstrtab_offset, len(shstrtab), 0, 0, 1, 0)
+
+    data = header + body + shstrtab
+    return data + b"\0" * (shoff - len(data)) + sections
+
+def generate_tree(root, inf_count, seed):
+    """
+    Creates <root>/<Pkg>/.../<Module>.inf files and the matching .debug files
+    under <root>/Build/<Platform>/<Target>/X64. Returns the relevant modules
+    as [(file_guid, base_name)].
+    """
+    rng = random.Random(seed)
+    build_base = os.path.join(root, "Build", PLATFORM_PACKAGE, BUILD_TARGET, "X64")
+    modules = []
+    for index in range(inf_count):
+        package = PACKAGES[index % len(PACKAGES)]
+        base_name = f"BenchModule{index:05d}"
+        rel_dir = os.path.join(package, f"Group{index % 37:02d}", base_name)
+        module_type = MODULE_TYPES[index % len(MODULE_TYPES)]
+        file_guid = str(uuid.UUID(int=rng.getrandbits(128))).upper()
+
+        os.makedirs(os.path.join(root, rel_dir), exist_ok=True)
+        with open(os.path.join(root, rel_dir, base_name + ".inf"), "w") as f:
+            f.write("## @file\n#  Synthetic benchmark module\n##\n\n[Defines]\n"
+                    f"  INF_VERSION                    = 0x00010005\n"
+                    f"  BASE_NAME                      = {base_name}\n"
+                    f"  FILE_GUID                      = {file_guid}\n"
+                    f"  MODULE_TYPE                    = {module_type}\n"
+                    f"  VERSION_STRING                 = 1.0\n"
+                    f"  ENTRY_POINT                    = {base_name}Entry\n\n"
+                    "[Sources]\n  Module.c\n\n[Packages]\n  MdePkg/MdePkg.dec\n")
+
+        if module_type in ("BASE", "PEIM"):
+            continue
+        debug_dir = os.path.join(build_base, rel_dir, "DEBUG")
+        os.makedirs(debug_dir, exist_ok=True)
+        elf = make_elf64(0x240 + (index % 16) * 0x20, 0x400 + index % 0x300, padding=rng.randrange(0, 4096))
+        with open(os.path.join(debug_dir, base_name + ".debug"), "wb") as f:
+            f.write(elf)
+        # EDK2 also copies each .debug into the arch output directory
+        with open(os.path.join(build_base, base_name + ".debug"), "wb") as f:
+            f.write(elf)
+        modules.append((file_guid, base_name))
+
+    coreboot_smm = os.path.join(root, "coreboot", "build", "cpu", "x86", "smm")
+    os.makedirs(coreboot_smm, exist_ok=True)
+    with open(os.path.join(coreboot_smm, "smm.elf"), "wb") as f:
+        f.write(make_elf64(0, 0x8000))
+    return modules
+
+def generate_log(path, modules, size_bytes, boots, seed):
+    """Writes a serial log of about size_bytes with `boots` boots worth of load markers."""
+    rng = random.Random(seed)
+    noise = [f"DEBUG: synthetic noise line {i:04d} Status=Success Handle=0x{rng.getrandbits(32):08X}\n"
+             for i in range(256)]
+    lines_per_boot = max(1, size_bytes // (boots * 64))
+    written = 0
+    with open(path, "w") as f:
+        for boot in range(boots):
+            f.write(f"coreboot-4.20-bench-{boot} Mon Jan 1 00:00:00 UTC 2024 x86_64 bootblock starting (log level: 7)...\n")
+            f.write(f"SMI handler_base 0x{0x7F800000 + boot * 0x1000:X}\n")
+            marker_every = max(1, lines_per_boot // (len(modules) + 1))
+            module_iter = iter(modules)
+            image_base = 0x7E000000
+            for line in range(lines_per_boot):
+                if line % marker_every == 0:
+                    module = next(module_iter, None)
+                    if module:
+                        image_base += 0x20000
+                        record = (f"EDK2_IMAGE_INFO: FileGuid={module[0]}, "
+                                  f"ImageBase=0x{image_base:X}, ImageSize=0x{0x18000:X}\n")
+                        f.write(record)
+                        written += len(record)
+                        continue
+                text = noise[line & 0xFF]
+                f.write(text)
+                written += len(text)
+            f.write("[Bds] Bootloader loaded at address: 0x7D000000\n")
+
+def timed(results, name, function, *args, **kwargs):
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    results[name] = time.perf_counter() - start
+    print(f"  {name:<34} {results[name]:>9.3f} s")
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load_edk2_symbols.py on a synthetic EDK2 tree.")
+    parser.add_argument("--infs", type=int, default=3000, help="number of synthetic .inf files (default: 3000)")
+    parser.add_argument("--log-mb", type=float, default=32, help="approximate log size in MiB (default: 32)")
+    parser.add_argument("--boots", type=int, default=4, help="boots in the synthetic log (default: 4)")
+    parser.add_argument("--workers", type=int, default=None, help="INF scan workers (default: script default)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+    parser.add_argument("--keep", help="generate into (and keep) this directory instead of a temporary one")
+    parser.add_argument("--gdb-load-ms", type=float, default=0.0,
+                        help="simulated GDB time per add-symbol-file in ms (default: 0)")
+    parser.add_argument("--json", help="append the timings as one JSON line to this file")
+    args = parser.parse_args()
+
+    stub_gdb = install_stub_gdb(args.gdb_load_ms / 1000.0)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    root = args.keep or tempfile.mkdtemp(prefix="edk2-bench-")
+    os.makedirs(root, exist_ok=True)
+    os.environ["EDK2_SOURCE_ROOT_ENV"] = root
+    os.environ["EDK2_PLATFORM_PACKAGE_NAME_ENV"] = PLATFORM_PACKAGE
+    os.environ["EDK2_BUILD_TARGET_DIR_NAME_ENV"] = BUILD_TARGET
+    os.environ["COREBOOT_SOURCE_ROOT_ENV"] = os.path.join(root, "coreboot")
+    os.environ["EDK2_GDB_INDEX_CACHE_DIR_ENV"] = os.path.join(root, "gdb_index")
+    if args.workers is not None:
+        os.environ["EDK2_INF_SCAN_WORKERS_ENV"] = str(args.workers)
+
+    results = {}
+    try:
+        print(f"Generating synthetic tree in {root} ...")
+        modules = timed(results, "generate_tree", generate_tree, root, args.infs, args.seed)
+        log_path = os.path.join(root, "tty.log")
+        timed(results, "generate_log", generate_log, log_path, modules,
+              int(args.log_mb * 1024 * 1024), args.boots, args.seed)
+        print(f"{args.infs} .inf files, {len(modules)} DXE modules, "
+              f"{os.path.getsize(log_path) / (1024 * 1024):.1f} MiB log")
+
+        import load_edk2_symbols as loader
+        loader.GUID_MAP_CACHE_FILE = os.path.join(root, "guid_map_cache.sqlite")
+
+        # Keep the loader's progress output out of the report
+        devnull = open(os.devnull, "w")
+        real_stdout = sys.stdout
+        def quiet(function, *call_args):
+            sys.stdout = devnull
+            try:
+                return function(*call_args)
+            finally:
+                sys.stdout = real_stdout
+
+        print("Timings:")
+        helper = loader.Edk2SymbolHelper()
+        timed(results, "guid_map_cold", quiet, helper.generate_guid_map, False)
+        helper = loader.Edk2SymbolHelper()
+        timed(results, "guid_map_warm", quiet, helper.generate_guid_map, False)
+        rebuilt = os.path.join(root, "Build", PLATFORM_PACKAGE, BUILD_TARGET, "X64", modules[0][1] + ".debug")
+        os.utime(rebuilt)
+        helper = loader.Edk2SymbolHelper()
+        timed(results, "guid_map_one_module_rebuilt", quiet, helper.generate_guid_map, False)
+        helper = loader.Edk2SymbolHelper()
+        timed(results, "guid_map_forced_rebuild", quiet, helper.generate_guid_map, True)
+        if len(helper.guid_to_module_details) != len(modules):
+            print(f"Warning: mapped {len(helper.guid_to_module_details)} of {len(modules)} modules")
+
+        scanner = loader.LogScanner()
+        events = timed(results, "log_scan", scanner.scan, log_path)
+        timed(results, "log_scan_cached", scanner.scan, log_path)
+
+        boot_index = loader.LogBootIndex()
+        timed(results, "boot_index_cold", boot_index.index, log_path)
+        timed(results, "boot_index_cached", loader.LogBootIndex().index, log_path)
+        number, count, start, end = boot_index.select(log_path)
+        timed(results, "log_scan_latest_boot", loader.LogScanner().scan, log_path, None, start, end)
+        if count != args.boots:
+            print(f"Warning: indexed {count} of {args.boots} boots")
+
+        coreboot_root = os.path.join(root, "coreboot")
+        find_stages = lambda stage_index: [stage_index.find(stage) for stage in loader.COREBOOT_STAGES]
+        timed(results, "coreboot_stage_index_cold", find_stages, loader.CorebootStageIndex(coreboot_root))
+        timed(results, "coreboot_stage_index_cached", find_stages, loader.CorebootStageIndex(coreboot_root))
+
+        helper.text_offset_cache = {}
+        timed(results, "text_offsets_cold", quiet, helper.build_symbol_manifest, events)
+        timed(results, "text_offsets_memoized", quiet, helper.build_symbol_manifest, events)
+
+        loader.log_scanner = scanner
+        timed(results, "load_symbols", quiet, helper.load_symbols_from_log_file, log_path, events)
+        timed(results, "load_symbols_repeat", quiet, helper.load_symbols_from_log_file, log_path, events)
+        print(f"{len(events)} load events, {len(stub_gdb.loaded_objfiles)} objfiles in stub gdb")
+
+        # Cold loads (no memoized offsets, nothing in GDB) with serial and
+        # pipelined offset resolution; both must load the same symbol files
+        command_logs = []
+        for name, workers in (("load_symbols_cold_serial", 1), ("load_symbols_cold_pipelined", None)):
+            if workers is None:
+                os.environ.pop(loader.EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR, None)
+            else:
+                os.environ[loader.EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR] = str(workers)
+            helper.text_offset_cache = {}
+            helper.loaded_symbol_files = {}
+            helper.symbol_file_addresses = {}
+            del stub_gdb.loaded_objfiles[:]
+            del stub_gdb.executed_commands[:]
+            timed(results, name, quiet, helper.load_symbols_from_log_file, log_path, events)
+            command_logs.append([command for command in stub_gdb.executed_commands
+                                 if command.split()[0] in ("add-symbol-file", "remove-symbol-file")])
+        os.environ.pop(loader.EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR, None)
+        if command_logs[0] != command_logs[1]:
+            print("Warning: serial and pipelined loading issued different GDB commands")
+
+        if args.json:
+            record = {"time": time.time(), "infs": args.infs, "modules": len(modules),
+                      "log_bytes": os.path.getsize(log_path), "events": len(events),
+                      "timings": results, "loader_stats": loader.symbol_stats.as_dict()}
+            with open(args.json, "a") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            print(f"Appended results to {args.json}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
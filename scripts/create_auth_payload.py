@@ -3,90 +3,152 @@
 """
 Generates a correctly structured EFI_VARIABLE_AUTHENTICATION_2 payload
 for use with EDK2-based firmware.
+
+Usage: create_auth_payload.py [--socket [PATH]] <keydata folder>
+       create_auth_payload.py [--socket [PATH]] --batch <manifest.json> [--workers N]
+
+With --socket the payloads are signed by auth_signing_daemon.py, which keeps
+the signer keys loaded, instead of in this process.
+
+The batch manifest is a JSON object with optional "defaults" and a list of
+"variables"; every variable entry may override any default:
+
+    {
+      "defaults": {"key": "MOK-KEK.priv", "cert": "MOK-KEK.pem",
+                   "timestamp": "2030-01-01 00:00:00", "attributes": "0x27"},
+      "variables": [
+        {"name": "db", "data": "db.esl", "output": "db.auth"},
+        {"name": "KEK", "key": "MOK-PK.priv", "cert": "MOK-PK.pem",
+         "data": "KEK.esl", "output": "KEK.auth"}
+      ]
+    }
+
+"guid" defaults to the EFI global variable GUID for PK/KEK and to the image
+security database GUID for db/dbx/dbt/dbr. Relative paths are relative to
+the manifest. Each signer key and certificate is parsed once per process.
 """
 
+import os
 import sys
+import json
+import time
+import argparse
 from pathlib import Path
 import struct
+import concurrent.futures
 from datetime import datetime
-from cryptography import x509
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.serialization import pkcs7
-from cryptography.hazmat.backends import default_backend
 import uuid
 
-def create_auth_payload(
-    key_file, cert_file, data_file, output_file, timestamp_str,
-    variable_name, vendor_guid, attributes
-):
-    """
-    Reads all input files, generates the authenticated payload,
-    and writes it to the output file.
-    """
+# cryptography is imported on first use (load_signer/sign_pkcs7), so clients
+# of the signing daemon (--socket) never pay for importing it
 
-    print(f"Loading variable data from '{data_file}'...")
-    with open(data_file, 'rb') as f:
-        variable_payload = f.read()
+EFI_GLOBAL_VARIABLE_GUID = '8be4df61-93ca-11d2-aa0d-00e098032b8c'
+EFI_IMAGE_SECURITY_DATABASE_GUID = 'd719b2cb-3d3a-4596-a3bc-dad00e67656f'
+DEFAULT_VENDOR_GUIDS = {
+    'PK': EFI_GLOBAL_VARIABLE_GUID,
+    'KEK': EFI_GLOBAL_VARIABLE_GUID,
+    'db': EFI_IMAGE_SECURITY_DATABASE_GUID,
+    'dbx': EFI_IMAGE_SECURITY_DATABASE_GUID,
+    'dbt': EFI_IMAGE_SECURITY_DATABASE_GUID,
+    'dbr': EFI_IMAGE_SECURITY_DATABASE_GUID,
+}
+DEFAULT_ATTRIBUTES = 0x27 # NV + BS + RT + TIME_BASED_AUTH
 
-    print(f"Loading private key from '{key_file}'...")
-    with open(key_file, 'rb') as f:
-        private_key = serialization.load_pem_private_key(
-            f.read(), password=None, backend=default_backend()
-        )
+EFI_CERT_PKCS7_GUID = bytes.fromhex('9DD2AF4ADF68EE498AA9347D375665A7')
 
-    print(f"Loading certificate from '{cert_file}'...")
-    with open(cert_file, 'rb') as f:
-        cert = x509.load_pem_x509_certificate(f.read(), default_backend())
+# Most buffers passed to a single os.writev() call
+IOV_MAX = os.sysconf('SC_IOV_MAX') if hasattr(os, 'sysconf') and 'SC_IOV_MAX' in os.sysconf_names else 16
 
-    try:
-        ts = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        print(f"Error: Invalid timestamp format. Use 'YYYY-MM-DD HH:MM:SS'")
-        return
+# Signers parsed by this process: {(key_file, cert_file): (file stats, (private_key, cert))}.
+# The stats of both files are kept so that keys regenerated in place (gen-keys.sh)
+# are parsed again by the long-running signing daemon.
+_signers = {}
 
-    efi_time = struct.pack(
+def signer_file_stats(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def load_signer(key_file, cert_file):
+    """Returns (private_key, cert), parsing each key/certificate pair again only when the files change."""
+    signer_key = (str(key_file), str(cert_file))
+    stats = (signer_file_stats(key_file), signer_file_stats(cert_file))
+    cached = _signers.get(signer_key)
+    signer = cached[1] if cached and cached[0] == stats else None
+    if signer is None:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        with open(key_file, 'rb') as f:
+            private_key = serialization.load_pem_private_key(
+                f.read(), password=None, backend=default_backend()
+            )
+        with open(cert_file, 'rb') as f:
+            cert = x509.load_pem_x509_certificate(f.read(), default_backend())
+        signer = (private_key, cert)
+        _signers[signer_key] = (stats, signer)
+    return signer
+
+def efi_time_bytes(timestamp_str):
+    """Packs a 'YYYY-MM-DD HH:MM:SS' timestamp as EFI_TIME; raises ValueError if malformed."""
+    ts = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+    return struct.pack(
         '<H6BIhBB',  # H=Year, 6B=M,D,H,M,S,Pad1, I=Nano, h=TZ, B=Daylight, B=Pad2
         ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second,
         0, 0, 0, 0, 0
     )
 
-    print(f"Signing for: Variable='{variable_name}', GUID='{vendor_guid}'")
-
-    var_name_bytes = variable_name.encode('utf-16le')
-    vendor_guid_bytes = uuid.UUID(vendor_guid).bytes_le
-    attributes_bytes = struct.pack('<L', attributes)
-
-    data_to_sign = (
-        var_name_bytes +
-        vendor_guid_bytes +
-        attributes_bytes +
-        efi_time +
-        variable_payload
-    )
-    print(f"Total size of data to be signed: {len(data_to_sign)} bytes")
+def sign_pkcs7(data_to_sign, private_key, cert):
+    """Returns a DER PKCS#7 detached SHA-256 signature embedding the signer certificate."""
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.serialization import pkcs7
 
-    # Create PKCS#7 detached signature
-    print("Generating PKCS#7 signature with SHA-256...")
-    options = [pkcs7.PKCS7Options.DetachedSignature]
+    # Binary: sign the bytes as they are; without it LF is canonicalized to
+    # CRLF first and firmware rejects signatures over data containing 0x0A
+    options = [pkcs7.PKCS7Options.DetachedSignature, pkcs7.PKCS7Options.Binary]
 
     builder = pkcs7.PKCS7SignatureBuilder()
     builder = builder.set_data(data_to_sign)
-
-    print("Embedding signer certificate into PKCS#7 blob...")
     builder = builder.add_certificate(cert)
     builder = builder.add_signer(
         cert, private_key, hashes.SHA256()
     )
 
-    pkcs7_blob = builder.sign(
+    return builder.sign(
         encoding=serialization.Encoding.DER,
         options=options
     )
 
-    pkcs7_size = len(pkcs7_blob)
-    print(f"PKCS#7 signature size: {pkcs7_size} bytes")
+def signed_data_prefix(variable_name, vendor_guid, attributes, efi_time):
+    """Returns the VariableName, VendorGuid, Attributes and TimeStamp that precede the data in the signed bytes."""
+    return (
+        variable_name.encode('utf-16le') +
+        uuid.UUID(vendor_guid).bytes_le +
+        struct.pack('<L', attributes) +
+        efi_time
+    )
+
+def read_signed_data(data_file, prefix):
+    """
+    Returns a bytearray holding prefix followed by the contents of data_file.
+    The file is read straight into place, so the variable data is in memory
+    only once and serves both as signed data and as the payload to write.
+    """
+    with open(data_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        signed_data = bytearray(len(prefix) + size)
+        signed_data[:len(prefix)] = prefix
+        view = memoryview(signed_data)[len(prefix):]
+        while view:
+            count = f.readinto(view)
+            if not count:
+                raise IOError(f"'{data_file}' shrank while being read")
+            view = view[count:]
+    return signed_data
 
-    efi_cert_pkcs7_guid = bytes.fromhex('9DD2AF4ADF68EE498AA9347D375665A7')
+def build_auth_header(private_key, cert, signed_data, efi_time):
+    """Returns the EFI_VARIABLE_AUTHENTICATION_2 header for the given signed bytes."""
+    pkcs7_blob = sign_pkcs7(signed_data, private_key, cert)
+    pkcs7_size = len(pkcs7_blob)
 
     win_cert_hdr_size = 8 + 16 + pkcs7_size  # Header (8) + GUID (16) + Pkcs7
 
@@ -97,16 +159,174 @@ def create_auth_payload(
         0x0EF1             # wCertificateType (WIN_CERT_TYPE_EFI_GUID)
     )
 
-    auth_header = efi_time + win_cert_header + efi_cert_pkcs7_guid + pkcs7_blob
-    total_payload = auth_header + variable_payload
+    return efi_time + win_cert_header + EFI_CERT_PKCS7_GUID + pkcs7_blob
 
-    print(f"Total payload size: {len(total_payload)} bytes")
-    print(f"Writing to '{output_file}'...")
+def write_buffers(output_file, buffers):
+    """Writes buffers back to back with vectored writes, without joining them first."""
+    views = [memoryview(buffer).cast('B') for buffer in buffers if len(buffer)]
     with open(output_file, 'wb') as f:
-        f.write(total_payload)
+        if not hasattr(os, 'writev'):
+            for view in views:
+                f.write(view)
+            return
+        fd = f.fileno()
+        while views:
+            written = os.writev(fd, views[:IOV_MAX])
+            while views and written >= len(views[0]):
+                written -= len(views[0])
+                views.pop(0)
+            if views and written:
+                views[0] = views[0][written:]
+
+def create_payload_file(private_key, cert, data_file, output_file, efi_time,
+                        variable_name, vendor_guid, attributes):
+    """Signs data_file and streams the payload to output_file; returns the payload size."""
+    prefix = signed_data_prefix(variable_name, vendor_guid, attributes, efi_time)
+    signed_data = read_signed_data(data_file, prefix)
+    auth_header = build_auth_header(private_key, cert, signed_data, efi_time)
+    write_buffers(output_file, [auth_header, memoryview(signed_data)[len(prefix):]])
+    return len(auth_header) + len(signed_data) - len(prefix)
+
+def create_auth_payload(
+    key_file, cert_file, data_file, output_file, timestamp_str,
+    variable_name, vendor_guid, attributes
+):
+    """
+    Reads all input files, generates the authenticated payload,
+    and writes it to the output file.
+    """
+
+    print(f"Loading private key from '{key_file}'...")
+    print(f"Loading certificate from '{cert_file}'...")
+    private_key, cert = load_signer(key_file, cert_file)
+
+    try:
+        efi_time = efi_time_bytes(timestamp_str)
+    except ValueError:
+        print(f"Error: Invalid timestamp format. Use 'YYYY-MM-DD HH:MM:SS'")
+        return
+
+    print(f"Signing '{data_file}' for: Variable='{variable_name}', GUID='{vendor_guid}'")
+    print("Generating PKCS#7 signature with SHA-256...")
+    print(f"Writing to '{output_file}'...")
+    total_size = create_payload_file(private_key, cert, data_file, output_file, efi_time,
+                                     variable_name, vendor_guid, attributes)
+    print(f"Total payload size: {total_size} bytes")
 
     print("Done.")
 
+def load_batch_manifest(manifest_file):
+    """
+    Reads a batch manifest and returns its variable entries with defaults
+    applied, paths resolved and attributes parsed. Raises ValueError on
+    missing fields.
+    """
+    manifest_dir = Path(manifest_file).resolve().parent
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+
+    defaults = manifest.get('defaults', {})
+    entries = []
+    for index, variable in enumerate(manifest.get('variables', [])):
+        entry = dict(defaults, **variable)
+        missing = [field for field in ('name', 'key', 'cert', 'timestamp', 'data', 'output') if field not in entry]
+        if missing:
+            raise ValueError(f"variable #{index} ({entry.get('name', '?')}) is missing {', '.join(missing)}")
+        if 'guid' not in entry:
+            if entry['name'] not in DEFAULT_VENDOR_GUIDS:
+                raise ValueError(f"variable #{index} ({entry['name']}) needs a guid")
+            entry['guid'] = DEFAULT_VENDOR_GUIDS[entry['name']]
+        attributes = entry.get('attributes', DEFAULT_ATTRIBUTES)
+        entry['attributes'] = int(attributes, 0) if isinstance(attributes, str) else attributes
+        for field in ('key', 'cert', 'data', 'output'):
+            entry[field] = str(manifest_dir / entry[field])
+        entries.append(entry)
+    return entries
+
+def _init_batch_worker(signer_files):
+    for key_file, cert_file in signer_files:
+        load_signer(key_file, cert_file)
+
+def create_batch_entry(entry):
+    """Generates one manifest entry; returns (output, payload size, seconds, error)."""
+    start = time.perf_counter()
+    try:
+        private_key, cert = load_signer(entry['key'], entry['cert'])
+        total_size = create_payload_file(private_key, cert, entry['data'], entry['output'],
+                                         efi_time_bytes(entry['timestamp']),
+                                         entry['name'], entry['guid'], entry['attributes'])
+    except Exception as e:
+        return (entry['output'], 0, time.perf_counter() - start, str(e))
+    return (entry['output'], total_size, time.perf_counter() - start, None)
+
+def sign_entries_with_daemon(entries, socket_path):
+    """Signs manifest entries through the signing daemon; see auth_signing_daemon.py."""
+    from auth_signing_daemon import SigningClient
+    client = SigningClient(socket_path)
+    try:
+        return client.sign_entries(entries)
+    finally:
+        client.close()
+
+def create_auth_payloads_batch(manifest_file, workers=1, socket_path=None):
+    """
+    Generates every payload of a batch manifest in this process, across a
+    process pool of the given size, or through the signing daemon listening
+    on socket_path. Returns the number of failed entries.
+    """
+    try:
+        entries = load_batch_manifest(manifest_file)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read manifest '{manifest_file}': {e}")
+        return 1
+    return create_auth_payload_entries(entries, workers, socket_path)
+
+def create_auth_payload_entries(entries, workers=1, socket_path=None):
+    signer_files = sorted({(entry['key'], entry['cert']) for entry in entries})
+    if socket_path:
+        print(f"{len(entries)} variables, {len(signer_files)} signers, signing daemon '{socket_path}'")
+    else:
+        print(f"{len(entries)} variables, {len(signer_files)} signers, {workers} worker(s)")
+
+    start = time.perf_counter()
+    try:
+        if not socket_path:
+            _init_batch_worker(signer_files)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not load signer: {e}")
+        return len(entries)
+    load_time = time.perf_counter() - start
+
+    if socket_path:
+        try:
+            results = sign_entries_with_daemon(entries, socket_path)
+        except (OSError, ValueError) as e:
+            print(f"Error: Signing daemon at '{socket_path}' failed: {e}")
+            return len(entries)
+    elif workers > 1 and len(entries) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                                    initargs=(signer_files,)) as pool:
+            results = list(pool.map(create_batch_entry, entries))
+    else:
+        results = [create_batch_entry(entry) for entry in entries]
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    total_bytes = 0
+    for entry, (output_file, size, seconds, error) in zip(entries, results):
+        if error:
+            failures += 1
+            print(f"  {entry['name']:<8} -> {output_file}: Error: {error}")
+        else:
+            total_bytes += size
+            print(f"  {entry['name']:<8} -> {output_file}: {size} bytes in {seconds * 1000:.1f} ms")
+
+    generated = len(entries) - failures
+    load_info = "" if socket_path else f"(signers loaded in {load_time * 1000:.1f} ms), "
+    print(f"Generated {generated} of {len(entries)} payloads ({total_bytes} bytes) in {elapsed:.3f} s "
+          f"{load_info}{generated / elapsed if elapsed else 0:.1f} variables/s")
+    return failures
+
 if __name__ == "__main__":
     keydata_dir = ""
     # --- Configuration Variables ---
@@ -117,16 +337,42 @@ if __name__ == "__main__":
     OUTPUT_FILE = 'DeletePK.auth'
 
     VARIABLE_NAME = 'PK'
-    VENDOR_GUID = '8be4df61-93ca-11d2-aa0d-00e098032b8c'
-    ATTRIBUTES = 0x27 # NV + BS + RT + TIME_BASED_AUTH
+    VENDOR_GUID = EFI_GLOBAL_VARIABLE_GUID
+    ATTRIBUTES = DEFAULT_ATTRIBUTES
     # -----------------------------
 
-    if len(sys.argv) > 1:
-        keydata_dir = Path(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Generate EFI_VARIABLE_AUTHENTICATION_2 payloads.")
+    parser.add_argument("keydata_dir", nargs="?", help="key folder for the single PK delete payload")
+    parser.add_argument("--batch", metavar="MANIFEST", help="generate all variables of a JSON manifest")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"processes for --batch (default: 1, 0 = {os.cpu_count()})")
+    parser.add_argument("--socket", nargs="?", const="", metavar="PATH",
+                        help="sign through auth_signing_daemon.py listening on PATH "
+                             "(default: $AUTH_SIGNING_SOCKET or its default socket)")
+    args = parser.parse_args()
+
+    socket_path = args.socket
+    if socket_path == "":
+        from auth_signing_daemon import default_socket_path
+        socket_path = default_socket_path()
+
+    if args.batch:
+        sys.exit(1 if create_auth_payloads_batch(args.batch, args.workers or os.cpu_count() or 1,
+                                                 socket_path) else 0)
+
+    if args.keydata_dir:
+        keydata_dir = Path(args.keydata_dir)
     else:
-        print("Usage: create_auth_payload.py <keydata folder>")
+        print("Usage: create_auth_payload.py [--socket [PATH]] <keydata folder>")
+        print("       create_auth_payload.py [--socket [PATH]] --batch <manifest.json> [--workers N]")
         sys.exit(1)
 
+    if socket_path:
+        sys.exit(1 if create_auth_payload_entries([{
+            'name': VARIABLE_NAME, 'guid': VENDOR_GUID, 'attributes': ATTRIBUTES,
+            'timestamp': TIMESTAMP_STR, 'key': str(keydata_dir / PRIV_KEY_FILE),
+            'cert': str(keydata_dir / CERT_FILE), 'data': str(keydata_dir / DATA_FILE),
+            'output': str(keydata_dir / OUTPUT_FILE)}], socket_path=socket_path) else 0)
 
     create_auth_payload(
         keydata_dir / PRIV_KEY_FILE,
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""
+Builds EFI_SIGNATURE_LIST (ESL) data for db/dbx/KEK/PK from X.509
+certificates and SHA-256 hashes, and optionally signs it straight into an
+EFI_VARIABLE_AUTHENTICATION_2 payload with create_auth_payload.py.
+
+Usage: create_esl.py --owner GUID [--cert FILE]... [--hash HEX]... [--hash-list FILE]...
+                     [--esl FILE]... [--output FILE]
+                     [--sign KEY CERT --var NAME [--timestamp TS] [--socket [PATH]] --auth FILE]
+
+Entries are deduplicated by (signature type, data) and grouped by type:
+all SHA-256 hashes share one list, every certificate gets a list of its
+own (like cert-to-efi-sig-list). --esl merges existing lists, so new
+hashes can be appended to a dbx without duplicating the old ones.
+Without any entries an empty (zero-length) ESL is written.
+"""
+
+import os
+import sys
+import ssl
+import time
+import uuid
+import struct
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from create_auth_payload import DEFAULT_VENDOR_GUIDS, DEFAULT_ATTRIBUTES, efi_time_bytes, \
+    signed_data_prefix, build_auth_header, write_buffers, load_signer
+
+EFI_CERT_SHA256_GUID = uuid.UUID('c1c41626-504c-4092-aca9-41f936934328')
+EFI_CERT_X509_GUID = uuid.UUID('a5c059a1-94e4-4aa7-87b5-ab155c2bf072')
+
+# EFI_SIGNATURE_LIST: SignatureType, SignatureListSize, SignatureHeaderSize, SignatureSize
+ESL_HEADER = struct.Struct('<16sIII')
+SHA256_SIZE = 32
+
+def checked_der_cert(der_cert, path):
+    """Returns der_cert if it parses as an X.509 certificate; raises ValueError otherwise."""
+    from cryptography import x509 # Imported on first use, like in create_auth_payload.py
+    try:
+        x509.load_der_x509_certificate(der_cert)
+    except ValueError as e:
+        raise ValueError(f"{path}: not a valid X.509 certificate: {e}")
+    return der_cert
+
+class SignatureListBuilder:
+    """
+    Collects signature entries, dropping duplicates through an index keyed by
+    (signature type, data), and serializes them grouped by signature type.
+    """
+    def __init__(self, default_owner):
+        self.default_owner = uuid.UUID(str(default_owner))
+        self.entries = {} # {(type GUID, data): owner GUID}, in insertion order
+        self.duplicates = 0
+
+    def add(self, signature_type, data, owner=None):
+        """Adds one entry; returns False if it was already present."""
+        key = (signature_type, bytes(data))
+        if key in self.entries:
+            self.duplicates += 1
+            return False
+        self.entries[key] = owner or self.default_owner
+        return True
+
+    def add_sha256(self, digest, owner=None):
+        if len(digest) != SHA256_SIZE:
+            raise ValueError(f"SHA-256 digest must be {SHA256_SIZE} bytes, got {len(digest)}")
+        return self.add(EFI_CERT_SHA256_GUID, digest, owner)
+
+    def add_x509(self, der_cert, owner=None):
+        return self.add(EFI_CERT_X509_GUID, der_cert, owner)
+
+    def add_cert_file(self, path, owner=None):
+        """
+        Adds a PEM or DER certificate file (every certificate of a PEM bundle).
+        Raises ValueError if the file does not hold valid certificates.
+        """
+        with open(path, 'rb') as f:
+            contents = f.read()
+        if b'-----BEGIN CERTIFICATE-----' not in contents:
+            return self.add_x509(checked_der_cert(contents, path), owner)
+        text = contents.decode('ascii', errors='replace')
+        added = False
+        for block in text.split('-----BEGIN CERTIFICATE-----')[1:]:
+            pem = '-----BEGIN CERTIFICATE-----' + block.split('-----END CERTIFICATE-----')[0] + \
+                  '-----END CERTIFICATE-----\n'
+            try:
+                der_cert = ssl.PEM_cert_to_DER_cert(pem)
+            except ValueError as e:
+                raise ValueError(f"{path}: invalid PEM certificate: {e}")
+            added |= self.add_x509(checked_der_cert(der_cert, path), owner)
+        return added
+
+    def add_hash_list(self, path, owner=None):
+        """Adds hex SHA-256 hashes from a file, one per line; '#' starts a comment."""
+        with open(path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    self.add_sha256(bytes.fromhex(line), owner)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_number}: {e}")
+
+    def add_esl(self, data):
+        """Adds every entry of existing EFI_SIGNATURE_LIST data, keeping their owners."""
+        offset = 0
+        while offset < len(data):
+            if len(data) - offset < ESL_HEADER.size:
+                raise ValueError(f"truncated EFI_SIGNATURE_LIST header at offset {offset}")
+            type_bytes, list_size, header_size, signature_size = ESL_HEADER.unpack_from(data, offset)
+            if list_size < ESL_HEADER.size + header_size or offset + list_size > len(data) or \
+               signature_size <= 16 or (list_size - ESL_HEADER.size - header_size) % signature_size:
+                raise ValueError(f"malformed EFI_SIGNATURE_LIST at offset {offset}")
+            signature_type = uuid.UUID(bytes_le=type_bytes)
+            position = offset + ESL_HEADER.size + header_size
+            while position < offset + list_size:
+                owner = uuid.UUID(bytes_le=bytes(data[position:position + 16]))
+                self.add(signature_type, data[position + 16:position + signature_size], owner)
+                position += signature_size
+            offset += list_size
+
+    def __len__(self):
+        return len(self.entries)
+
+    def build(self):
+        """Returns the serialized lists: one per signature type and size, X.509 certificates one per list."""
+        groups = {}
+        for (signature_type, data), owner in self.entries.items():
+            if signature_type == EFI_CERT_X509_GUID:
+                group = (signature_type, len(data), len(groups))
+            else:
+                group = (signature_type, len(data))
+            groups.setdefault(group, []).append(owner.bytes_le + data)
+
+        parts = []
+        for group, signatures in groups.items():
+            signature_size = len(signatures[0])
+            parts.append(ESL_HEADER.pack(group[0].bytes_le, ESL_HEADER.size + signature_size * len(signatures),
+                                         0, signature_size))
+            parts.extend(signatures)
+        return b''.join(parts)
+
+def sign_esl(esl, key_file, cert_file, variable_name, vendor_guid, attributes, timestamp_str,
+             auth_file, socket_path=None):
+    """Writes esl as an EFI_VARIABLE_AUTHENTICATION_2 payload without an intermediate file."""
+    if socket_path:
+        from auth_signing_daemon import SigningClient
+        client = SigningClient(socket_path)
+        try:
+            (auth_header, error), = client.sign([{
+                "name": variable_name, "guid": vendor_guid, "attributes": attributes,
+                "timestamp": timestamp_str, "key": os.path.abspath(key_file),
+                "cert": os.path.abspath(cert_file)}], [esl])
+        finally:
+            client.close()
+        if error:
+            raise ValueError(error)
+    else:
+        efi_time = efi_time_bytes(timestamp_str)
+        private_key, cert = load_signer(key_file, cert_file)
+        auth_header = build_auth_header(private_key, cert,
+                                        signed_data_prefix(variable_name, vendor_guid, attributes, efi_time) + esl,
+                                        efi_time)
+    write_buffers(auth_file, [auth_header, esl])
+    return len(auth_header) + len(esl)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build EFI_SIGNATURE_LIST data from certificates and hashes.")
+    parser.add_argument("--owner", required=True, help="SignatureOwner GUID of the new entries")
+    parser.add_argument("--cert", action="append", default=[], help="PEM or DER X.509 certificate (repeatable)")
+    parser.add_argument("--hash", action="append", default=[], help="hex SHA-256 hash (repeatable)")
+    parser.add_argument("--hash-list", action="append", default=[], help="file of hex SHA-256 hashes, one per line")
+    parser.add_argument("--esl", action="append", default=[], help="existing ESL file to merge (repeatable)")
+    parser.add_argument("--output", help="write the ESL to this file")
+    parser.add_argument("--sign", nargs=2, metavar=("KEY", "CERT"), help="sign the ESL into an auth payload")
+    parser.add_argument("--var", help="variable name for --sign (PK, KEK, db, dbx, ...)")
+    parser.add_argument("--guid", help="vendor GUID for --sign (default: from the variable name)")
+    parser.add_argument("--attributes", type=lambda value: int(value, 0), default=DEFAULT_ATTRIBUTES,
+                        help=f"variable attributes for --sign (default: 0x{DEFAULT_ATTRIBUTES:X})")
+    parser.add_argument("--timestamp", default="2030-01-01 00:00:00",
+                        help="EFI_TIME for --sign, 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--socket", nargs="?", const="", metavar="PATH",
+                        help="sign through auth_signing_daemon.py instead of in this process")
+    parser.add_argument("--auth", help="auth payload output file for --sign")
+    args = parser.parse_args()
+
+    if not args.output and not args.sign:
+        parser.error("nothing to do: give --output and/or --sign")
+    if args.sign and not (args.var and args.auth):
+        parser.error("--sign needs --var and --auth")
+    vendor_guid = args.guid or DEFAULT_VENDOR_GUIDS.get(args.var or "")
+    if args.sign and not vendor_guid:
+        parser.error(f"--guid is required for variable '{args.var}'")
+
+    start = time.perf_counter()
+    try:
+        builder = SignatureListBuilder(args.owner)
+        for esl_file in args.esl:
+            with open(esl_file, 'rb') as f:
+                builder.add_esl(f.read())
+        for cert_file in args.cert:
+            builder.add_cert_file(cert_file)
+        for hash_hex in args.hash:
+            builder.add_sha256(bytes.fromhex(hash_hex))
+        for hash_list in args.hash_list:
+            builder.add_hash_list(hash_list)
+        esl = builder.build()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"{len(builder)} signatures ({builder.duplicates} duplicates dropped), "
+          f"{len(esl)} bytes in {time.perf_counter() - start:.3f} s")
+
+    if args.output:
+        write_buffers(args.output, [esl])
+        print(f"Wrote '{args.output}'")
+    if args.sign:
+        socket_path = args.socket
+        if socket_path == "":
+            from auth_signing_daemon import default_socket_path
+            socket_path = default_socket_path()
+        try:
+            size = sign_esl(esl, args.sign[0], args.sign[1], args.var, vendor_guid, args.attributes,
+                            args.timestamp, args.auth, socket_path)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not sign '{args.var}': {e}")
+            return 1
+        print(f"Wrote '{args.auth}' ({size} bytes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,7 +14,7 @@ genkey() {
                 -out "$KEYDIR/$1.der"
         openssl x509 -in "$KEYDIR/$1.der" \
                 -inform DER -outform PEM -out "$KEYDIR/$1.pem"
-        cert-to-efi-sig-list -g $2 "$KEYDIR/$1.der" "$KEYDIR/$1.esl"
+        $PWD/scripts/create_esl.py --owner $2 --cert "$KEYDIR/$1.der" --output "$KEYDIR/$1.esl"
 }
 
 echo "Generating keys for $GUID.."
@@ -26,7 +26,7 @@ genkey "MOK-KEK" $GUID
 genkey "MOK-DB" $GUID
 
 # Empty revocation list
-cert-to-efi-sig-list -g $GUID /dev/null $KEYDIR/empty-dbx.esl
+$PWD/scripts/create_esl.py --owner $GUID --output $KEYDIR/empty-dbx.esl
 
 touch $KEYDIR/empty_file.bin
 $PWD/scripts/create_auth_payload.py $KEYDIR
@@ -12,16 +12,60 @@
 #    export EDK2_PLATFORM_PACKAGE_NAME_ENV="YourPlatformPkgNameInBuildOutput"
 #    export EDK2_BUILD_TARGET_DIR_NAME_ENV="DEBUG_YOURTARGET"
 # 3. Configure EDK2_TARGET_ARCH and EDK2_PACKAGE_NAMES_TO_SCAN_DEFAULTS in the "User Configuration" section.
+#    Optionally: export EDK2_INF_SCAN_WORKERS_ENV=<n> to set the .inf scan worker count (1 = serial).
+#    Optionally: export EDK2_GDB_INDEX_CACHE_DIR_ENV=<dir> to move the cache of prebuilt GDB
+#    indexes (~/.cache/gdb_edk2_index, "" disables it), and EDK2_GDB_INDEX_CACHE_AUTO_ENV=1 to
+#    fill it in the background after every load.
 # 4. In GDB: source /path/to/load_edk2_symbols.py
 # 5. To load symbols from a log: load-edk2-symbols <path_to_your_tty_log_file>
+#    Logs spanning several resets are split into boots at the coreboot/SEC banners and
+#    only the latest boot is used; pick another with --boot N (-2 = previous) or --boot all.
 # 6. To rebuild map and then load symbols from log: rebuild-edk2-guidmap <path_to_your_tty_log_file>
+# 7. To keep loading symbols while the log grows: load-edk2-symbols --follow <path_to_your_tty_log_file>
+#    (stop with: load-edk2-symbols --stop-follow)
+# 8. To load module symbols only when execution stops inside them:
+#    load-edk2-symbols --lazy [--preload Name1,Name2] <path_to_your_tty_log_file>
+# 9. To find the image containing an address: edk2-whereis <addr> or $edk2_module($pc)
+# 10. To see where the attach time went: edk2-symbols-stats [--json [file]]
+#     To store GDB-indexed copies of the loaded .debug files for later sessions: edk2-index-cache
+# 11. To load the coreboot stages (bootblock, romstage, postcar, ramstage, smm, payload) at the
+#     addresses they ran at: load-coreboot-symbols <path_to_your_tty_log_file>
+#     (needs only COREBOOT_SOURCE_ROOT_ENV; --linked loads them at their link addresses and
+#     --at Stage=Addr,... at fixed ones when there is no current log)
 #
+# Headless use (no GDB, e.g. in CI next to each build):
+#   python3 load_edk2_symbols.py <log> [--edk2-root ... --platform ... --target ...]
+# writes <log>.symbols.json and <log>.symbols.gdb. In GDB either
+# "source <log>.symbols.gdb" or "load-edk2-symbols --manifest <log>.symbols.json".
 #
-import gdb
+#
+try:
+    import gdb
+except ImportError:
+    # Not running inside GDB: only the headless CLI (see main()) is available.
+    gdb = None
 import re
 import os
+import sys
 import json
-import subprocess # For calling objdump
+import time
+import mmap
+import zlib
+import struct
+import shutil
+import hashlib
+import tempfile
+import subprocess # For calling objdump (optional fallback)
+import threading
+import collections
+import contextlib
+import bisect
+import argparse
+try:
+    import sqlite3
+except ImportError: # Some embedded GDB Pythons are built without it
+    sqlite3 = None
+import concurrent.futures
 
 ##### User Configuration
 EDK2_SOURCE_ROOT_ENV_VAR = "EDK2_SOURCE_ROOT_ENV"
@@ -48,13 +92,126 @@ EDK2_PACKAGE_NAMES_TO_SCAN_DEFAULTS = [
     "ShellPkg", # If you use the shell
 ]
 
-# Cache file for the GUID map to speed up subsequent loads
-GUID_MAP_CACHE_FILE = os.path.expanduser("~/.cache/gdb_edk2_guid_map_v2.json")
+# Number of workers used to parse .inf files during a GUID map rebuild.
+# 0 or 1 keeps the original serial scan. Can be overridden with the
+# EDK2_INF_SCAN_WORKERS_ENV environment variable.
+EDK2_INF_SCAN_WORKERS = os.cpu_count() or 1
+EDK2_INF_SCAN_WORKERS_ENV_VAR = "EDK2_INF_SCAN_WORKERS_ENV"
+
+# Pool type for the parallel scan: "thread" or "process". Process pools fork
+# the GDB process, so threads are the safer default inside a debug session.
+EDK2_INF_SCAN_EXECUTOR = "thread"
+
+# Number of threads resolving debug files and .text offsets of the images in
+# a log while the GDB main thread issues add-symbol-file for the ones already
+# resolved. The work is mostly file I/O and objdump processes, so it pays off
+# even on a single CPU. 0 or 1 resolves each module right before loading it.
+# Can be overridden with the EDK2_SYMBOL_RESOLVE_WORKERS_ENV environment variable.
+EDK2_SYMBOL_RESOLVE_WORKERS = 4
+EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR = "EDK2_SYMBOL_RESOLVE_WORKERS_ENV"
+
+# Directory of .debug copies with a prebuilt .gdb_index section. The
+# edk2-index-cache command runs a batch GDB per .debug file loaded without a
+# copy to write its index (save gdb-index, like gdb-add-index), and objcopy
+# adds it to a copy; later sessions load the copy and skip GDB's DWARF
+# indexing. Only those files are indexed, never the other objfiles of the
+# session. Copies are keyed by path, file fingerprint and GDB version, so
+# rebuilt files are re-indexed automatically. None (or an empty
+# EDK2_GDB_INDEX_CACHE_DIR_ENV) disables the cache.
+EDK2_GDB_INDEX_CACHE_DIR = os.path.expanduser("~/.cache/gdb_edk2_index")
+EDK2_GDB_INDEX_CACHE_DIR_ENV_VAR = "EDK2_GDB_INDEX_CACHE_DIR_ENV"
+# Index the new .debug files on a background thread after every load instead
+# of waiting for edk2-index-cache. Never delays the load itself. Can also be
+# enabled with EDK2_GDB_INDEX_CACHE_AUTO_ENV=1.
+EDK2_GDB_INDEX_CACHE_AUTO = False
+EDK2_GDB_INDEX_CACHE_AUTO_ENV_VAR = "EDK2_GDB_INDEX_CACHE_AUTO_ENV"
+# Copies not used for this long are pruned, and then the least recently used
+# ones until the cache fits in the size limit (loading a copy marks it used).
+EDK2_GDB_INDEX_CACHE_MAX_AGE_DAYS = 30
+EDK2_GDB_INDEX_CACHE_MAX_BYTES = 4 << 30
+EDK2_GDB_INDEX_ERRORS_SHOWN = 5
+
+# Verify every .text offset read from the ELF section headers against
+# `objdump -h`. Useful when debugging the loader itself; costs one objdump
+# process per module. Can also be enabled with EDK2_TEXT_OFFSET_CROSS_CHECK_ENV=1.
+EDK2_TEXT_OFFSET_CROSS_CHECK = False
+EDK2_TEXT_OFFSET_CROSS_CHECK_ENV_VAR = "EDK2_TEXT_OFFSET_CROSS_CHECK_ENV"
+
+# How often (seconds) the --follow watcher checks the log for new output
+EDK2_FOLLOW_POLL_INTERVAL = 0.2
+# Output appended since the last poll is read into memory up to this size;
+# more (the first poll of a long boot) is scanned in place in an mmap.
+EDK2_FOLLOW_READ_LIMIT = 1 << 20
+
+# Lazy mode (load-edk2-symbols --lazy): number of backtrace frames checked on
+# each stop, and module BASE_NAMEs that are always loaded up front.
+EDK2_LAZY_MAX_FRAMES = 32
+EDK2_LAZY_PRELOAD_DEFAULTS = ["DxeCore"]
+
+# edk2-whereis: how far past its base an image of unknown size (e.g. a shim
+# load address found in the log) is assumed to extend
+EDK2_WHEREIS_UNKNOWN_SIZE_LIMIT = 0x200000
+
+# Seconds a session waits for another session's cache write to finish
+CACHE_STORE_LOCK_TIMEOUT = 10
+
+# Format version of the manifests written by the headless CLI
+SYMBOL_MANIFEST_VERSION = 1
+
+# Cache database for the GUID maps to speed up subsequent loads. One sqlite
+# file holds the maps of every (source root, platform, target, arch) side by side.
+GUID_MAP_CACHE_FILE = os.path.expanduser("~/.cache/gdb_edk2_symbols_cache.sqlite")
+GUID_MAP_CACHE_VERSION = 4
+
+# coreboot stage ELFs at their usual places in the coreboot build directory.
+# A stage that is not found there is looked up by file name in one walk of
+# the build directory (never the whole source tree). The payload ELF is
+# CONFIG_PAYLOAD_FILE of the coreboot .config. The resolved paths are kept
+# in the same cache database as the GUID maps.
+COREBOOT_BUILD_DIR_NAME = "build"
+COREBOOT_STAGE_FILES = {
+    "bootblock": ["cbfs/fallback/bootblock.debug", "bootblock.debug", "bootblock.elf"],
+    "romstage": ["cbfs/fallback/romstage.debug", "romstage.debug", "romstage.elf"],
+    "postcar": ["cbfs/fallback/postcar.debug", "postcar.debug", "postcar.elf"],
+    "ramstage": ["cbfs/fallback/ramstage.debug", "ramstage.debug", "ramstage.elf"],
+    "smm": ["smm/smm.elf", "cpu/x86/smm/smm.elf", "smm.elf", "smm.debug"],
+}
+COREBOOT_STAGES = list(COREBOOT_STAGE_FILES) + ["payload"]
+COREBOOT_STAGE_INDEX_CACHE_VERSION = 1
+# $(VAR) make references in .config values
+MAKE_VARIABLE_PATTERN = re.compile(r"\$\((\w+)\)")
 ######
 
 EDK2_DEBUG_FILES_SEARCH_BASE = None
 EDK2_PACKAGE_SOURCE_DIRS_TO_SCAN = []
 
+# Directories that never contain module .inf files worth mapping
+INF_SCAN_SKIP_DIRS = ["build", ".git", "bin", "obj", "output", "tools", "scripts"]
+
+# Module types whose images are reported by the DXE dispatcher
+RELEVANT_MODULE_TYPES = ["DXE_DRIVER", "DXE_RUNTIME_DRIVER",
+                         "DXE_SAL_DRIVER", "DXE_SMM_DRIVER",
+                         "UEFI_DRIVER", "UEFI_APPLICATION", "DXE_CORE"]
+
+EDK2_IMAGE_INFO_PATTERN = re.compile(
+    r"EDK2_IMAGE_INFO: FileGuid=(?P<file_guid>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}), "
+    r"ImageBase=0x(?P<image_base>[0-9a-fA-F]+), "
+    r"ImageSize=0x(?P<image_size>[0-9a-fA-F]+)"
+)
+
+ELF_SHF_ALLOC = 0x2
+
+# Build output file types served from the one-pass debug file index
+DEBUG_FILE_INDEX_EXTENSIONS = (".debug", ".elf")
+
+INF_GUID_PATTERN = re.compile(r"FILE_GUID\s*=\s*([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})", re.IGNORECASE)
+INF_BASE_NAME_PATTERN = re.compile(r"BASE_NAME\s*=\s*(\w+)", re.IGNORECASE)
+INF_MODULE_TYPE_PATTERN = re.compile(r"MODULE_TYPE\s*=\s*(\w+)", re.IGNORECASE)
+
+
+if GUID_MAP_CACHE_FILE and sqlite3 is None:
+    print("Warning: Python sqlite3 module not available, GUID map caching disabled.")
+    GUID_MAP_CACHE_FILE = None
 
 # Ensure cache directory exists
 if GUID_MAP_CACHE_FILE and not os.path.exists(os.path.dirname(GUID_MAP_CACHE_FILE)):
@@ -65,11 +222,834 @@ if GUID_MAP_CACHE_FILE and not os.path.exists(os.path.dirname(GUID_MAP_CACHE_FIL
         print(f"Warning: Could not create cache directory {os.path.dirname(GUID_MAP_CACHE_FILE)}: {e}")
         GUID_MAP_CACHE_FILE = None # Disable caching if dir creation fails
 
+class PhaseStats:
+    """
+    Accumulates wall-clock time per phase and event counters of the symbol
+    loader for the whole GDB session (see edk2-symbols-stats).
+    """
+    def __init__(self):
+        self.lock = threading.Lock() # Symbol resolution workers report from their threads
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.timings = collections.defaultdict(float)
+        self.calls = collections.Counter()
+        self.counters = collections.Counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """Records one call of a phase that was timed by the caller."""
+        with self.lock:
+            self.timings[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def as_dict(self):
+        return {
+            "started": self.started,
+            "phases": {name: {"seconds": round(self.timings[name], 6), "calls": self.calls[name]}
+                       for name in sorted(self.timings)},
+            "counters": dict(sorted(self.counters.items()))
+        }
+
+# Session-wide statistics shared by the scanner and the helper
+symbol_stats = PhaseStats()
+
+# A typed load event found in a serial log. kind is the marker name
+# ("edk2_image", "smi_handler", "shim", "coreboot_..."), offset the byte
+# offset of the marker in the log. name is the coreboot stage or CBFS file
+# name of coreboot markers. Fields a marker does not provide are None.
+LogLoadEvent = collections.namedtuple(
+    "LogLoadEvent", ["kind", "offset", "image_base", "image_size", "file_guid", "name"],
+    defaults=[None])
+
+# A log marker: every occurrence of literal is matched against pattern (which
+# must start with literal) and handler(kind, offset, match) turns the match
+# into a LogLoadEvent, or returns None to ignore it.
+LogMarker = collections.namedtuple("LogMarker", ["kind", "literal", "pattern", "handler"])
+
+def _edk2_image_event(kind, offset, match):
+    return LogLoadEvent(kind, offset, int(match.group("image_base"), 16),
+                        int(match.group("image_size"), 16),
+                        match.group("file_guid").decode("ascii").upper())
+
+def _image_base_event(kind, offset, match):
+    return LogLoadEvent(kind, offset, int(match.group("image_base"), 16), None, None)
+
+def _coreboot_name_event(kind, offset, match):
+    return LogLoadEvent(kind, offset, None, None, None, match.group("name").decode("ascii"))
+
+def _coreboot_module_event(kind, offset, match):
+    return LogLoadEvent(kind, offset, int(match.group("image_base"), 16), int(match.group("image_size"), 16), None)
+
+LOG_MARKERS = [
+    LogMarker("edk2_image", b"EDK2_IMAGE_INFO: ",
+              re.compile(EDK2_IMAGE_INFO_PATTERN.pattern.encode("ascii")), _edk2_image_event),
+    LogMarker("smi_handler", b"SMI handler_base ",
+              re.compile(rb"SMI handler_base 0x(?P<image_base>[0-9a-fA-F]+)"), _image_base_event),
+    LogMarker("shim", b"Bootloader loaded at address: ",
+              re.compile(rb"Bootloader loaded at address: 0x(?P<image_base>[0-9a-fA-F]+)"), _image_base_event),
+    # coreboot: the CBFS file about to be loaded, the base an rmodule stage
+    # (postcar, ramstage) was relocated to, stage banners and the payload jump
+    LogMarker("coreboot_cbfs_file", b"CBFS: ",
+              re.compile(rb"CBFS: (?:Found|Locating) '(?:fallback|normal)/(?P<name>\w+)'"), _coreboot_name_event),
+    LogMarker("coreboot_module", b"Loading module at ",
+              re.compile(rb"Loading module at (?:0x)?(?P<image_base>[0-9a-fA-F]+) with entry (?:0x)?[0-9a-fA-F]+\. "
+                         rb"filesize: 0x[0-9a-fA-F]+ memsize: 0x(?P<image_size>[0-9a-fA-F]+)"), _coreboot_module_event),
+] + [
+    # No leading space in the literals: a trigger starting with a character
+    # as common as " " would slow the scan of every log down
+    LogMarker("coreboot_stage", b"%s starting" % stage,
+              re.compile(rb"(?P<name>%s) starting" % stage), _coreboot_name_event)
+    for stage in (b"bootblock", b"romstage", b"postcar", b"ramstage")
+] + [
+    LogMarker("coreboot_payload", b"Jumping to boot code at ",
+              re.compile(rb"Jumping to boot code at 0x(?P<image_base>[0-9a-fA-F]+)"), _image_base_event),
+]
+
+# Block size of LogScanner.scan_last(), and how far before the old end of an
+# appended log LogBootIndex rescans (markers are single log lines well below
+# this length).
+LOG_REVERSE_SCAN_BLOCK_SIZE = 1 << 20
+LOG_MARKER_MAX_LENGTH = 512
+
+def _boot_event(kind, offset, match):
+    return LogLoadEvent(kind, offset, None, None, None)
+
+# Banners that start a new boot in a serial log spanning several resets:
+# coreboot's bootblock banner, and the SEC core entry for EDK2 logs without
+# coreboot. A banner kind seen again within a boot starts the next boot, so a
+# boot printing both banners still counts once. The bootblock literal is the
+# one of the coreboot_stage marker, so a boot starts at its bootblock event.
+LOG_BOOT_MARKERS = [
+    LogMarker("coreboot_bootblock", b"bootblock starting", re.compile(rb"bootblock starting"), _boot_event),
+    LogMarker("edk2_sec", b"SecCoreStartupWithStack(", re.compile(rb"SecCoreStartupWithStack\("), _boot_event),
+]
+
+# Boot index records in the cache store. The hashes of the first bytes of the
+# log and of the bytes before its old end tell an appended log (index only the
+# new bytes) from a replaced one.
+LOG_BOOT_INDEX_CACHE_VERSION = 3
+LOG_BOOT_INDEX_HEAD_BYTES = 4096
+
+class LogScanner:
+    """
+    Finds all load markers of a serial log in a single pass over an mmap of
+    the file. A combined regex of the marker literals locates candidates and
+    only those are matched against the full marker patterns. The events of
+    the last scanned log are kept until the file changes, so several commands
+    in one session share a single read of the log.
+    """
+    def __init__(self, markers=None):
+        self.markers = {}
+        self.trigger = None
+        self.longest_literal = 0
+        self.last_scan = None # (log_file_path, fingerprint, events, scanned start, scanned end or None)
+        for marker in (markers if markers is not None else LOG_MARKERS):
+            self.register(marker)
+
+    def register(self, marker):
+        """Adds or replaces a marker; later boot stages can plug in their own."""
+        self.markers[marker.literal] = marker
+        self.trigger = re.compile(b"|".join(re.escape(literal) for literal in self.markers))
+        self.longest_literal = max(len(literal) for literal in self.markers)
+        self.last_scan = None
+
+    def scan_buffer(self, buf, base_offset=0, kinds=None, start=0, end=None):
+        """
+        Returns the LogLoadEvents found in buf (bytes, mmap or memoryview),
+        or only those starting in buf[start:end]; matching in place, without
+        slicing buf, so an mmap'ed log is never copied. Markers starting
+        before end are matched in full even if they extend past it.
+        """
+        events = []
+        if not self.markers:
+            return events
+        # Search a little past end for literals that start before end
+        search_end = len(buf) if end is None else min(len(buf), end + self.longest_literal - 1)
+        for trigger_match in self.trigger.finditer(buf, start, search_end):
+            if end is not None and trigger_match.start() >= end:
+                break
+            marker = self.markers[trigger_match.group(0)]
+            if kinds is not None and marker.kind not in kinds:
+                continue
+            match = marker.pattern.match(buf, trigger_match.start())
+            if not match:
+                continue
+            event = marker.handler(marker.kind, base_offset + trigger_match.start(), match)
+            if event:
+                events.append(event)
+        return events
+
+    def scan(self, log_file_path, kinds=None, start=0, end=None):
+        """
+        Returns the LogLoadEvents of log_file_path in log order, optionally
+        filtered to the given kinds. With start/end only the markers in that
+        byte range (e.g. one boot, see LogBootIndex) are returned and only
+        that part of the log is read. Raises OSError if the log cannot be read.
+        """
+        fingerprint = file_fingerprint(log_file_path)
+        if self.cached_scan(log_file_path, fingerprint, start, end):
+            events = self.last_scan[2]
+            symbol_stats.count("log_scan_cache_hits")
+        else:
+            with symbol_stats.phase("log_scan"), open(log_file_path, "rb") as f_log:
+                log_size = os.fstat(f_log.fileno()).st_size
+                scan_end = log_size if end is None else min(log_size, end)
+                if scan_end <= start:
+                    events = []
+                else:
+                    with mmap.mmap(f_log.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+                        events = self.scan_buffer(log_map, 0, start=start, end=scan_end)
+            symbol_stats.count("log_bytes_read", max(0, scan_end - start))
+            symbol_stats.count("log_events_found", len(events))
+            self.last_scan = (log_file_path, fingerprint, events, start, end)
+        return [event for event in events
+                if (kinds is None or event.kind in kinds) and
+                   start <= event.offset and (end is None or event.offset < end)]
+
+    def cached_scan(self, log_file_path, fingerprint, start=0, end=None):
+        """True if the last scan is of this version of the log and covers start..end."""
+        if not self.last_scan or self.last_scan[0] != log_file_path or \
+           not fingerprint or self.last_scan[1] != fingerprint:
+            return False
+        scanned_start, scanned_end = self.last_scan[3], self.last_scan[4]
+        return scanned_start <= start and (scanned_end is None or (end is not None and end <= scanned_end))
+
+    def scan_last(self, log_file_path, kind, block_size=LOG_REVERSE_SCAN_BLOCK_SIZE):
+        """
+        Returns the last LogLoadEvent of the given kind in log_file_path, or
+        None. The log is scanned backwards from its end in blocks and the scan
+        stops at the first block with a match, so a marker printed late in a
+        large log is found without reading the rest of it. Raises OSError if
+        the log cannot be read.
+        """
+        fingerprint = file_fingerprint(log_file_path)
+        if self.cached_scan(log_file_path, fingerprint):
+            symbol_stats.count("log_scan_cache_hits")
+            events = [event for event in self.last_scan[2] if event.kind == kind]
+            return events[-1] if events else None
+
+        with symbol_stats.phase("log_reverse_scan"), open(log_file_path, "rb") as f_log:
+            log_size = os.fstat(f_log.fileno()).st_size
+            if log_size == 0:
+                return None
+            with mmap.mmap(f_log.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+                block_end = log_size
+                while block_end > 0:
+                    block_start = max(0, block_end - block_size)
+                    # A marker starting in this block but ending in the next
+                    # one is still matched in full
+                    symbol_stats.count("log_bytes_read", block_end - block_start)
+                    events = self.scan_buffer(log_map, 0, kinds=(kind,), start=block_start, end=block_end)
+                    if events:
+                        return events[-1]
+                    block_end = block_start
+        return None
+
+class LogBootIndex:
+    """
+    Start offsets of the boots in a serial log that spans several resets.
+    The boot markers are found in one pass over the log and the offsets kept
+    in the cache store, keyed by the log's path. A log that only grew since
+    it was indexed is indexed from its old end, so following a boot log
+    never rescans it from the start.
+    """
+    def __init__(self, markers=None):
+        self.scanner = LogScanner(markers if markers is not None else LOG_BOOT_MARKERS)
+        self.last_index = None # (log_file_path, fingerprint, record)
+
+    @staticmethod
+    def new_record():
+        # boots: start offsets (the first boot always starts at 0); kinds: the
+        # marker kinds seen in the last boot; last_marker: offset of the last
+        # marker applied, so that rescanned overlap is not counted twice
+        return {"fp": None, "size": 0, "head": None, "head_size": 0, "tail": None,
+                "boots": [0], "kinds": [], "last_marker": -1}
+
+    @staticmethod
+    def tail_hash(log_map, size):
+        # The bytes before the old end tell a log that grew from one that was
+        # replaced in place (cp keeps the inode) by a boot with the same banner
+        return hashlib.sha1(log_map[max(0, size - LOG_BOOT_INDEX_HEAD_BYTES):size]).hexdigest()
+
+    @staticmethod
+    def apply_markers(record, events):
+        for event in events:
+            if event.offset <= record["last_marker"]:
+                continue
+            if event.kind in record["kinds"]:
+                record["boots"].append(event.offset)
+                record["kinds"] = [event.kind]
+            else:
+                record["kinds"].append(event.kind)
+            record["last_marker"] = event.offset
+
+    def load_cached(self, key):
+        if not GUID_MAP_CACHE_FILE:
+            return None
+        try:
+            return CacheStore(GUID_MAP_CACHE_FILE).load("log_boot_index", key, LOG_BOOT_INDEX_CACHE_VERSION)
+        except Exception as e:
+            print(f"Warning: Could not read the log boot index: {e}")
+            return None
+
+    def save_cached(self, key, record):
+        if not GUID_MAP_CACHE_FILE:
+            return
+        try:
+            CacheStore(GUID_MAP_CACHE_FILE).save("log_boot_index", key, LOG_BOOT_INDEX_CACHE_VERSION, record)
+        except Exception as e:
+            print(f"Warning: Could not save the log boot index: {e}")
+
+    def index(self, log_file_path):
+        """Returns the boot index record of log_file_path. Raises OSError if the log cannot be read."""
+        fingerprint = file_fingerprint(log_file_path)
+        if self.last_index and self.last_index[0] == log_file_path and \
+           fingerprint and self.last_index[1] == fingerprint:
+            return self.last_index[2]
+
+        key = os.path.realpath(log_file_path)
+        record = self.load_cached(key)
+        with open(log_file_path, "rb") as f_log:
+            log_size = os.fstat(f_log.fileno()).st_size
+            if record and record["fp"] == fingerprint:
+                symbol_stats.count("log_boot_index_cache_hits")
+            elif log_size == 0:
+                record = self.new_record()
+            else:
+                with symbol_stats.phase("log_boot_index"), \
+                     mmap.mmap(f_log.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+                    appended = record and record["fp"] and fingerprint and \
+                        record["fp"][2] == fingerprint[2] and record["size"] <= log_size and \
+                        hashlib.sha1(log_map[:record["head_size"]]).hexdigest() == record["head"] and \
+                        self.tail_hash(log_map, record["size"]) == record.get("tail")
+                    if appended:
+                        # Back up far enough to catch a marker cut off at the old end
+                        start = max(0, record["size"] - LOG_MARKER_MAX_LENGTH)
+                        symbol_stats.count("log_boot_index_appends")
+                    else:
+                        start = 0
+                        record = self.new_record()
+                    self.apply_markers(record, self.scanner.scan_buffer(log_map, 0, start=start))
+                    symbol_stats.count("log_bytes_read", log_size - start)
+                    head_size = min(log_size, LOG_BOOT_INDEX_HEAD_BYTES)
+                    record["head"] = hashlib.sha1(log_map[:head_size]).hexdigest()
+                    record["head_size"] = head_size
+                    record["tail"] = self.tail_hash(log_map, log_size)
+            record["fp"] = fingerprint
+            record["size"] = log_size
+        self.save_cached(key, record)
+        self.last_index = (log_file_path, fingerprint, record)
+        return record
+
+    def select(self, log_file_path, boot=None):
+        """
+        Returns (boot number, boot count, start offset, end offset) of a boot
+        in log_file_path. boot is 1-based, negative values count back from the
+        latest boot (None: the latest). Raises OSError if the log cannot be
+        read and ValueError if there is no such boot.
+        """
+        record = self.index(log_file_path)
+        boots = record["boots"]
+        count = len(boots)
+        number = count if boot is None else (count + 1 + boot if boot < 0 else boot)
+        if not 1 <= number <= count:
+            raise ValueError(f"no boot {boot} in '{log_file_path}' ({count} boot{'s' if count != 1 else ''} found)")
+        end = boots[number] if number < count else record["size"]
+        return number, count, boots[number - 1], end
+
+def parse_boot_argument(value):
+    """Parses a --boot value: "all", or a boot number (negative: counted back from the latest)."""
+    if value == "all":
+        return value
+    try:
+        boot = int(value)
+    except ValueError:
+        raise ValueError(f"invalid boot '{value}' (expected a number or 'all')")
+    if boot == 0:
+        raise ValueError("boots are numbered from 1 (or back from the latest with -1, -2, ...)")
+    return boot
+
+def scan_log_boot(log_file_path, boot=None):
+    """
+    Returns (events, start offset) of one boot of log_file_path: the latest
+    when boot is None, the whole log for "all". Raises OSError if the log
+    cannot be read and ValueError if there is no such boot.
+    """
+    if boot == "all":
+        return log_scanner.scan(log_file_path), 0
+    number, count, start, end = log_boot_index.select(log_file_path, boot)
+    if count > 1:
+        print(f"Using boot {number} of {count} in '{log_file_path}' (bytes {start}-{end}).")
+    return log_scanner.scan(log_file_path, start=start, end=end), start
+
+# A loaded image: [start, end) address range, display name, the load event
+# kind it came from, and its GUID and debug file when known. end is None when
+# the image size is unknown.
+ImageRange = collections.namedtuple(
+    "ImageRange", ["start", "end", "name", "kind", "file_guid", "debug_path"])
+
+class ImageIntervalIndex:
+    """Sorted, non-overlapping-by-start index of image ranges with O(log n) lookups."""
+    def __init__(self):
+        self.starts = []
+        self.ranges = []
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def clear(self):
+        self.starts = []
+        self.ranges = []
+
+    def add(self, image_range):
+        """Adds image_range; a range at the same start address replaces the old one."""
+        index = bisect.bisect_left(self.starts, image_range.start)
+        if index < len(self.starts) and self.starts[index] == image_range.start:
+            self.ranges[index] = image_range
+        else:
+            self.starts.insert(index, image_range.start)
+            self.ranges.insert(index, image_range)
+
+    def lookup(self, address):
+        """Returns the ImageRange containing address, or None."""
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index < 0:
+            return None
+        image_range = self.ranges[index]
+        end = image_range.end
+        if end is None:
+            # Unknown size: assume the image ends where the next one starts,
+            # within a sane limit.
+            end = image_range.start + EDK2_WHEREIS_UNKNOWN_SIZE_LIMIT
+            if index + 1 < len(self.starts):
+                end = min(end, self.starts[index + 1])
+        if address < end:
+            return image_range
+        return None
+
+class CacheStore:
+    """
+    Keyed cache records in a single sqlite database. Each record is addressed
+    by (kind, key) and stored as zlib-compressed compact JSON, so only the
+    requested record is read and decoded. Every save is one transaction and
+    sqlite's locking keeps concurrent GDB sessions from corrupting the file.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=CACHE_STORE_LOCK_TIMEOUT)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_records ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL,"
+            " data BLOB NOT NULL, updated REAL NOT NULL, PRIMARY KEY (kind, key))")
+        return connection
+
+    def load(self, kind, key, version):
+        """Returns the record stored under (kind, key), or None if missing or of another version."""
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                "SELECT version, data FROM cache_records WHERE kind = ? AND key = ?",
+                (kind, json.dumps(key))).fetchone()
+        finally:
+            connection.close()
+        if not row or row[0] != version:
+            return None
+        return json.loads(zlib.decompress(row[1]))
+
+    def save(self, kind, key, version, record):
+        data = zlib.compress(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache_records (kind, key, version, data, updated) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (kind, json.dumps(key), version, sqlite3.Binary(data), time.time()))
+        finally:
+            connection.close()
+
+def parse_inf_file(inf_path_abs):
+    """
+    Extracts (FILE_GUID, BASE_NAME, MODULE_TYPE) from a single .inf file.
+    Kept at module level so that it can be dispatched to a process pool.
+    Returns (file_guid, base_name, module_type, error); missing fields are None.
+    """
+    file_guid = None
+    base_name = None
+    module_type = None
+    try:
+        with open(inf_path_abs, "r", encoding="utf-8", errors="ignore") as f_inf:
+            for line in f_inf:
+                line = line.strip()
+                if not file_guid:
+                    match_guid = INF_GUID_PATTERN.search(line)
+                    if match_guid: file_guid = match_guid.group(1).upper()
+                if not base_name:
+                    match_base = INF_BASE_NAME_PATTERN.search(line)
+                    if match_base: base_name = match_base.group(1)
+                if not module_type:
+                    mt_match = INF_MODULE_TYPE_PATTERN.search(line)
+                    if mt_match: module_type = mt_match.group(1)
+                if file_guid and base_name and module_type: break
+    except Exception as e:
+        return (None, None, None, str(e))
+    return (file_guid, base_name, module_type, None)
+
+def file_fingerprint(path):
+    """Returns [mtime_ns, size, inode] for path, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+def read_elf_sections(path):
+    """
+    Reads the section header table of an ELF file with mmap and struct.
+    Returns {section_name: (vma, size, flags)}, or None if path is not a valid ELF.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 64:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as elf:
+            if elf[:4] != b"\x7fELF":
+                return None
+            elf_class, elf_data = elf[4], elf[5]
+            if elf_class not in (1, 2) or elf_data not in (1, 2):
+                return None
+            endian = "<" if elf_data == 1 else ">"
+            if elf_class == 2: # ELF64
+                shoff, = struct.unpack_from(endian + "Q", elf, 0x28)
+                shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", elf, 0x3A)
+                shdr_format = endian + "IIQQQQIIQQ"
+            else: # ELF32
+                shoff, = struct.unpack_from(endian + "I", elf, 0x20)
+                shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", elf, 0x2E)
+                shdr_format = endian + "IIIIIIIIII"
+            if shoff == 0 or shnum == 0 or shstrndx >= shnum or \
+               shentsize < struct.calcsize(shdr_format) or shoff + shnum * shentsize > len(elf):
+                return None
+
+            headers = [struct.unpack_from(shdr_format, elf, shoff + i * shentsize) for i in range(shnum)]
+            strtab_offset, strtab_size = headers[shstrndx][4], headers[shstrndx][5]
+            if strtab_offset + strtab_size > len(elf):
+                return None
+            strtab = elf[strtab_offset:strtab_offset + strtab_size]
+
+            sections = {}
+            for header in headers:
+                name_offset = header[0]
+                name_end = strtab.find(b"\0", name_offset)
+                if name_end < 0:
+                    continue
+                name = strtab[name_offset:name_end].decode("ascii", errors="replace")
+                sections.setdefault(name, (header[3], header[5], header[2]))
+            return sections
+
+def read_elf_section_vma(path, section_name):
+    """Returns the VMA of section_name in the ELF file at path, or None."""
+    try:
+        sections = read_elf_sections(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if not sections or section_name not in sections:
+        return None
+    return sections[section_name][0]
+
+def elf_image_extent(path):
+    """
+    Returns the size of the loaded image of an ELF file linked at 0 (coreboot
+    rmodules, shim before PE conversion): the end of its highest SHF_ALLOC
+    section. Returns None if it cannot be determined.
+    """
+    try:
+        sections = read_elf_sections(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    if not sections:
+        return None
+    ends = [vma + size for vma, size, flags in sections.values() if flags & ELF_SHF_ALLOC]
+    return max(ends) if ends else None
+
+def text_offset_cross_check_enabled():
+    """True if .text offsets read from ELF headers should be verified with objdump."""
+    return EDK2_TEXT_OFFSET_CROSS_CHECK or os.getenv(EDK2_TEXT_OFFSET_CROSS_CHECK_ENV_VAR) == "1"
+
+def get_inf_scan_workers():
+    """Returns the configured INF scan worker count (ENV overrides the default)."""
+    workers = os.getenv(EDK2_INF_SCAN_WORKERS_ENV_VAR)
+    if workers:
+        try:
+            return max(0, int(workers))
+        except ValueError:
+            print(f"Warning: Ignoring invalid {EDK2_INF_SCAN_WORKERS_ENV_VAR} value '{workers}'")
+    return EDK2_INF_SCAN_WORKERS
+
+def get_symbol_resolve_workers():
+    """Returns the configured symbol resolution worker count (ENV overrides the default)."""
+    workers = os.getenv(EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR)
+    if workers:
+        try:
+            return max(0, int(workers))
+        except ValueError:
+            print(f"Warning: Ignoring invalid {EDK2_SYMBOL_RESOLVE_WORKERS_ENV_VAR} value '{workers}'")
+    return EDK2_SYMBOL_RESOLVE_WORKERS
+
+def get_gdb_index_cache_dir():
+    """Returns the GDB index cache directory, or None if the cache is disabled."""
+    cache_dir = os.getenv(EDK2_GDB_INDEX_CACHE_DIR_ENV_VAR, EDK2_GDB_INDEX_CACHE_DIR)
+    return os.path.expanduser(cache_dir) if cache_dir else None
+
+def gdb_index_cache_auto_enabled():
+    """True if the GDB index cache should be filled in the background after every load."""
+    return EDK2_GDB_INDEX_CACHE_AUTO or os.getenv(EDK2_GDB_INDEX_CACHE_AUTO_ENV_VAR) == "1"
+
+def gdb_executable():
+    """Returns the GDB binary for batch jobs: the running GDB when known, else gdb from PATH."""
+    if gdb:
+        with contextlib.suppress(OSError):
+            executable = os.readlink("/proc/self/exe")
+            if os.path.basename(executable).startswith("gdb"):
+                return executable
+    return shutil.which("gdb")
+
+def prune_gdb_index_cache(cache_dir, max_age_days=EDK2_GDB_INDEX_CACHE_MAX_AGE_DAYS,
+                          max_bytes=EDK2_GDB_INDEX_CACHE_MAX_BYTES):
+    """
+    Removes indexed copies unused for max_age_days, then the least recently
+    used ones until the cache is below max_bytes. Copies of .debug files
+    that no longer exist stop being used and age out. Returns the count removed.
+    """
+    copies = []
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".debug") and entry.is_file(follow_symlinks=False):
+                with contextlib.suppress(OSError):
+                    st = entry.stat(follow_symlinks=False)
+                    copies.append((st.st_mtime, st.st_size, entry.path))
+    copies.sort()
+    total = sum(size for _, size, _ in copies)
+    oldest_kept = time.time() - max_age_days * 86400
+    removed = 0
+    for mtime, size, path in copies:
+        if mtime >= oldest_kept and total <= max_bytes:
+            break
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+            removed += 1
+        total -= size
+    return removed
+
+def gdb_index_cache_prefix(cache_dir, debug_path):
+    """Returns the file name prefix shared by all indexed copies of debug_path."""
+    real_path = os.path.realpath(debug_path)
+    key = hashlib.sha1(f"{real_path}\0{getattr(gdb, 'VERSION', '')}".encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(real_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{key}-")
+
+def gdb_index_cache_path(cache_dir, debug_path, fingerprint):
+    """Returns the indexed copy of debug_path for the given fingerprint."""
+    return f"{gdb_index_cache_prefix(cache_dir, debug_path)}{fingerprint[0]}-{fingerprint[1]}.debug"
+
+class CorebootStageIndex:
+    """
+    Debug files and .text VMAs of the coreboot stages of one coreboot tree,
+    kept in the cache store like the EDK2 GUID map. Cached entries are
+    checked by file fingerprint; a stage that is missing stays cached as
+    missing until the build configuration (build/config.h) changes, so the
+    build directory walk only happens when a stage is really new.
+    """
+    def __init__(self, coreboot_root):
+        self.coreboot_root = coreboot_root
+        self.build_dir = os.path.join(coreboot_root, COREBOOT_BUILD_DIR_NAME)
+        self.stages = None # {stage: {"path", "fp", "text"} or {"path": None, "config_fp"}}
+        self.walked = None # {stage: path} from a build directory walk in this session
+        self.payload_warned = False
+
+    def cache_key(self):
+        return [self.coreboot_root]
+
+    def load(self):
+        if self.stages is not None:
+            return
+        self.stages = {}
+        if not GUID_MAP_CACHE_FILE:
+            return
+        try:
+            cached = CacheStore(GUID_MAP_CACHE_FILE).load("coreboot_stages", self.cache_key(),
+                                                          COREBOOT_STAGE_INDEX_CACHE_VERSION)
+        except Exception as e:
+            print(f"Warning: Could not read the coreboot stage index: {e}")
+            cached = None
+        self.stages = cached or {}
+
+    def save(self):
+        if not GUID_MAP_CACHE_FILE:
+            return
+        try:
+            CacheStore(GUID_MAP_CACHE_FILE).save("coreboot_stages", self.cache_key(),
+                                                 COREBOOT_STAGE_INDEX_CACHE_VERSION, self.stages)
+        except Exception as e:
+            print(f"Warning: Could not save the coreboot stage index: {e}")
+
+    def clear(self):
+        """Forgets all cached paths; the next lookups re-resolve and may walk the build directory."""
+        self.stages = {}
+        self.walked = None
+
+    def payload_path(self):
+        """
+        Returns CONFIG_PAYLOAD_FILE of the coreboot .config if it is an ELF
+        file, else None. Make variables in it ("$(FIRMWARE_OPEN_UEFIPAYLOAD)")
+        are expanded from the environment, as the coreboot build does.
+        """
+        try:
+            with open(os.path.join(self.coreboot_root, ".config"), "r", errors="ignore") as f_config:
+                config_value = next((line.split("=", 1)[1].strip().strip('"') for line in f_config
+                                     if line.startswith("CONFIG_PAYLOAD_FILE=")), None)
+        except OSError:
+            return None
+        if not config_value:
+            return None
+        path = os.path.expandvars(MAKE_VARIABLE_PATTERN.sub(r"${\1}", config_value))
+        if "$" in path:
+            if not self.payload_warned:
+                unset = sorted(set(re.findall(r"\$\{?(\w+)", path)))
+                print(f"Warning: Cannot resolve CONFIG_PAYLOAD_FILE=\"{config_value}\": set "
+                      f"{', '.join(unset)} in the environment to load payload symbols.")
+                self.payload_warned = True
+            return None
+        path = os.path.join(self.coreboot_root, os.path.expanduser(path))
+        try:
+            with open(path, "rb") as f_payload:
+                if f_payload.read(4) == b"\x7fELF":
+                    return path
+        except OSError:
+            pass
+        if not self.payload_warned:
+            print(f"Warning: coreboot payload '{path}' is missing or not an ELF file.")
+            self.payload_warned = True
+        return None
+
+    def newest_build_time(self, stages):
+        """Returns the newest mtime of the built ELFs of the given stages, or None if none is built."""
+        mtimes = []
+        for stage in stages:
+            found = self.find(stage)
+            if found:
+                with contextlib.suppress(OSError):
+                    mtimes.append(os.path.getmtime(found[0]))
+        return max(mtimes) if mtimes else None
+
+    def walk_build_dir(self):
+        """Walks the build directory once and returns {stage: shallowest .debug (else .elf) path}."""
+        if self.walked is None:
+            wanted = {}
+            for stage in COREBOOT_STAGE_FILES:
+                wanted[f"{stage}.debug"] = (stage, 0)
+                wanted[f"{stage}.elf"] = (stage, 1)
+            found = {}
+            with symbol_stats.phase("coreboot_build_walk"):
+                for root, _, files in os.walk(self.build_dir):
+                    for file_name in files:
+                        if file_name in wanted:
+                            stage, preference = wanted[file_name]
+                            path = os.path.join(root, file_name)
+                            found.setdefault(stage, []).append((preference, path.count(os.sep), path))
+            self.walked = {stage: min(paths)[2] for stage, paths in found.items()}
+        return self.walked
+
+    def find(self, stage):
+        """Returns (debug file path, .text VMA or None) of a stage, or None if its ELF is not built."""
+        self.load()
+        record = self.stages.get(stage)
+        if record and record.get("path") and record.get("fp") == file_fingerprint(record["path"]):
+            symbol_stats.count("coreboot_stage_cache_hits")
+            return record["path"], record.get("text")
+
+        config_fp = file_fingerprint(os.path.join(self.build_dir, "config.h"))
+        if stage == "payload":
+            path = self.payload_path()
+        else:
+            path = next((os.path.join(self.build_dir, relative) for relative in COREBOOT_STAGE_FILES[stage]
+                         if os.path.isfile(os.path.join(self.build_dir, relative))), None)
+            known_missing = record and record.get("path") is None and record.get("config_fp") == config_fp
+            if path is None and not known_missing:
+                path = self.walk_build_dir().get(stage)
+
+        if path:
+            new_record = {"path": path, "fp": file_fingerprint(path), "text": read_elf_section_vma(path, ".text")}
+        else:
+            new_record = {"path": None, "config_fp": config_fp}
+        if new_record != record:
+            self.stages[stage] = new_record
+            self.save()
+        return (path, new_record["text"]) if path else None
+
+def coreboot_stage_loads(events):
+    """
+    Returns {stage: relocation base or None} for the coreboot stages (and
+    the payload) that the given load events show running, in log order.
+    rmodule stages (postcar, ramstage) get the base of the "Loading module
+    at" line following their CBFS lookup and the SMM handler its logged
+    handler base; None means the stage runs at its link address.
+    """
+    stages = {}
+    cbfs_name = None
+    for event in events:
+        if event.kind == "coreboot_cbfs_file":
+            cbfs_name = event.name
+        elif event.kind == "coreboot_module":
+            if cbfs_name in COREBOOT_STAGE_FILES:
+                stages[cbfs_name] = event.image_base
+            cbfs_name = None
+        elif event.kind == "coreboot_stage":
+            stages.setdefault(event.name, None)
+        elif event.kind == "smi_handler":
+            stages["smm"] = event.image_base
+        elif event.kind == "coreboot_payload":
+            stages.setdefault("payload", None)
+    return stages
+
 # Shared instance for map generation and symbol loading logic
 class Edk2SymbolHelper:
     def __init__(self):
         self.guid_to_module_details = {} # Stores {"guid": {"base_name": "...", "full_debug_path": "..."}}
         self.debug_file_cache = {}       # Cache for found .debug file paths: {base_name: full_path}
+        self.debug_dir_mtimes = {}       # Directory mtimes of the last build output walk: {search_base: {dir: mtime_ns}}
+        self.debug_file_indexes = {}     # One-pass build output indexes: {search_base: {file_name: [paths]}}
+        self.ambiguous_debug_files = {}  # {search_base: {file_name: [paths]}} for names with differing files
+        self.inf_records = {}            # Per-.inf parse results and fingerprints: {inf_path: {...}}
+        self.debug_fingerprints = {}     # Fingerprints of the mapped .debug files: {debug_path: [...]}
+        self.text_offset_cache = {}      # Memoized .text VMAs: {debug_path: {"fp": [...], "offset": N}}
+        self.text_offset_cache_dirty = False
+        self.loaded_symbol_files = {}    # Persistent across invocations: {(debug_path, address): {"fp": [...], "path": loaded file}}
+        self.symbol_file_addresses = {}  # Addresses of loaded_symbol_files per file: {debug_path: {address}}
+        self.objfile_counts = None       # gdb_objfile_names() snapshot of the current load, kept up to date by it
+        self.symbol_load_counts = collections.Counter() # add_symbol_file() results of the current invocation
+        self.symbol_files_this_load = set() # (debug_path, address) passed to add_symbol_file() in the current invocation
+        self.gdb_index_pending = set()   # Loaded .debug files without an indexed copy yet
+        self.gdb_index_job = None        # Background thread filling the GDB index cache, if any
+        self.gdb_index_hint_shown = False
+        self.real_paths = {}             # Memoized os.path.realpath() of GDB objfile and debug file names
+        self.image_index = ImageIntervalIndex() # Address ranges of the images in the current log
+        self.coreboot_stage_indexes = {} # {coreboot root: CorebootStageIndex}
         self.loaded_modules_info = {}    # Key: ImageBase, Value: base_name (to track loaded symbols per invocation)
 
     def check_env_vars_and_paths(self):
@@ -128,123 +1108,352 @@ class Edk2SymbolHelper:
         
         return True
 
-    def find_debug_file_recursive(self, base_name, filext, search_base_abs):
+    def build_debug_file_index(self, search_base_abs):
+        """
+        Walks search_base_abs once and indexes every .debug and .elf file by
+        its file name ("<base_name>.<ext>"). Each entry holds all candidate
+        paths, shallowest first. Every base name with several candidates is
+        reported with the file used for it; names that resolve to files of
+        different sizes are not just copies of the same output, so those are
+        listed in full and resolved per module by find_debug_file_recursive().
+        The mtimes of the walked directories are kept to tell when the build
+        output changed (see build_output_changed()).
+        """
+        index = {}
+        dir_mtimes = {}
+        with symbol_stats.phase("debug_index_walk"):
+            for root, _, files in os.walk(search_base_abs):
+                with contextlib.suppress(OSError):
+                    dir_mtimes[root] = os.stat(root).st_mtime_ns
+                for file_name in files:
+                    if file_name.endswith(DEBUG_FILE_INDEX_EXTENSIONS):
+                        index.setdefault(file_name, []).append(os.path.join(root, file_name))
+        symbol_stats.count("debug_files_indexed", sum(len(paths) for paths in index.values()))
+
+        ambiguous = {}
+        duplicates = []
+        for file_name, paths in index.items():
+            if len(paths) < 2:
+                continue
+            duplicates.append(file_name)
+            paths.sort(key=lambda path: (path.count(os.sep), path))
+            sizes = set()
+            for path in paths:
+                try:
+                    sizes.add(os.path.getsize(path))
+                except OSError:
+                    pass
+            # EDK2 copies each module's .debug into the arch output directory;
+            # identical sizes mean we are looking at those copies.
+            if len(sizes) > 1:
+                ambiguous[file_name] = paths
+
+        self.debug_file_indexes[search_base_abs] = index
+        self.ambiguous_debug_files[search_base_abs] = ambiguous
+        self.debug_dir_mtimes[search_base_abs] = dir_mtimes
+        print(f"Indexed {sum(len(p) for p in index.values())} debug files ({len(index)} unique names) under {search_base_abs}.")
+        if duplicates:
+            print(f"{len(duplicates)} debug file name(s) have several candidates "
+                  f"({len(ambiguous)} of them different files):")
+            for file_name in sorted(duplicates):
+                paths = index[file_name]
+                if file_name not in ambiguous:
+                    print(f"  - {file_name}: using {paths[0]} ({len(paths)} copies of the same size)")
+                    continue
+                print(f"  - Warning: {file_name}: {len(paths)} different files, using the one in the module's "
+                      f"build directory, else {paths[0]}:")
+                for path in paths:
+                    print(f"      {path}")
+        return index
+
+    def find_debug_file_recursive(self, base_name, filext, search_base_abs, source_rel_dir=None):
+        """
+        Returns the path of <base_name>.<filext> under search_base_abs using the
+        one-pass build output index. For ambiguous names, source_rel_dir (the
+        module .inf directory relative to the source root) selects the build
+        output directory of that module; otherwise the shallowest match is used
+        and the choice is reported.
+        """
         if base_name in self.debug_file_cache:
-            return self.debug_file_cache[base_name]
+            cached_path = self.debug_file_cache[base_name]
+            if cached_path is None or os.path.exists(cached_path):
+                symbol_stats.count("debug_lookup_cache_hits")
+                return cached_path
+            del self.debug_file_cache[base_name]
 
         target_filename = f"{base_name}.{filext}"
         if not os.path.isdir(search_base_abs):
             return None
 
-        for root, _, files in os.walk(search_base_abs):
-            if target_filename in files:
-                found_path = os.path.join(root, target_filename)
-                self.debug_file_cache[base_name] = found_path
-                return found_path
-        self.debug_file_cache[base_name] = None
-        return None
+        symbol_stats.count("debug_lookup_cache_misses")
+        index = self.debug_file_indexes.get(search_base_abs)
+        if index is None:
+            index = self.build_debug_file_index(search_base_abs)
+
+        candidates = index.get(target_filename)
+        if not candidates:
+            self.debug_file_cache[base_name] = None
+            return None
+
+        if target_filename not in self.ambiguous_debug_files[search_base_abs]:
+            self.debug_file_cache[base_name] = candidates[0]
+            return candidates[0]
+
+        # Ambiguous results depend on the caller's hint and are not memoized.
+        if source_rel_dir:
+            module_dir = os.sep + os.path.normpath(source_rel_dir) + os.sep
+            matching = [path for path in candidates if module_dir in path]
+            if len(matching) == 1:
+                print(f"'{target_filename}' is ambiguous, using {matching[0]} from the module's build directory")
+                return matching[0]
+        print(f"Warning: '{target_filename}' is ambiguous, using {candidates[0]}")
+        return candidates[0]
+
+    def build_output_changed(self, search_base_abs):
+        """
+        True if a directory of search_base_abs was created, removed or changed
+        since it was last walked, e.g. because a module was built for the
+        first time. Costs one stat per directory instead of a walk.
+        """
+        dir_mtimes = self.debug_dir_mtimes.get(search_base_abs)
+        if not dir_mtimes:
+            return True
+        with symbol_stats.phase("debug_dir_check"):
+            for directory, mtime in dir_mtimes.items():
+                try:
+                    if os.stat(directory).st_mtime_ns != mtime:
+                        return True
+                except OSError:
+                    return True
+        return False
+
+    def guid_map_cache_key(self):
+        return [EDK2_SOURCE_ROOT, EDK2_PLATFORM_PACKAGE_NAME, EDK2_BUILD_TARGET_DIR_NAME, EDK2_TARGET_ARCH]
+
+    def load_guid_map_cache(self):
+        """
+        Loads the per-.inf and per-.debug records of the current configuration
+        from the cache store. Returns (inf_records, debug_fingerprints), both
+        empty when there is no usable cache.
+        """
+        if not GUID_MAP_CACHE_FILE:
+            return {}, {}
+        try:
+            with symbol_stats.phase("cache_load"):
+                cached_data = CacheStore(GUID_MAP_CACHE_FILE).load("guid_map", self.guid_map_cache_key(),
+                                                                   GUID_MAP_CACHE_VERSION)
+            if cached_data is None:
+                print("No cached GUID map for this configuration, building it.")
+                return {}, {}
+            self.debug_file_cache = cached_data.get("debug_file_cache", {})
+            self.text_offset_cache = cached_data.get("text_offsets", {})
+            self.debug_dir_mtimes = cached_data.get("debug_dirs", {})
+            print(f"Loaded GUID map cache from: {GUID_MAP_CACHE_FILE}")
+            return cached_data.get("inf_files", {}), cached_data.get("debug_files", {})
+        except Exception as e:
+            print(f"Error loading GUID map from cache ({e}), rebuilding.")
+        return {}, {}
+
+    def save_guid_map_cache(self):
+        if not GUID_MAP_CACHE_FILE:
+            return
+        try:
+            data_to_cache = {
+                "inf_files": self.inf_records,
+                "debug_files": self.debug_fingerprints,
+                "debug_file_cache": {k: v for k, v in self.debug_file_cache.items() if v},
+                "text_offsets": {path: entry for path, entry in self.text_offset_cache.items()
+                                 if path in self.debug_fingerprints},
+                "debug_dirs": self.debug_dir_mtimes
+            }
+            with symbol_stats.phase("cache_save"):
+                CacheStore(GUID_MAP_CACHE_FILE).save("guid_map", self.guid_map_cache_key(),
+                                                     GUID_MAP_CACHE_VERSION, data_to_cache)
+            self.text_offset_cache_dirty = False
+            print(f"Saved GUID map to cache: {GUID_MAP_CACHE_FILE}")
+        except Exception as e:
+            print(f"Error saving GUID map to cache: {e}")
 
     def generate_guid_map(self, force_rebuild=False):
+        """
+        Brings the GUID map up to date with the source and build trees.
+
+        Every .inf and mapped .debug file is fingerprinted (mtime, size, inode).
+        Only .inf files whose fingerprint changed are re-parsed, deleted ones are
+        dropped, and modules whose .debug file changed or disappeared are looked
+        up again in the build output index. force_rebuild re-resolves all .debug
+        paths from a fresh build tree walk but still reuses unchanged .inf parses.
+        """
         if not self.check_env_vars_and_paths():
              self.guid_to_module_details = {}
              return False 
 
-        if not force_rebuild and GUID_MAP_CACHE_FILE and os.path.exists(GUID_MAP_CACHE_FILE):
-            try:
-                with open(GUID_MAP_CACHE_FILE, 'r') as f:
-                    cached_data = json.load(f)
-                    if cached_data.get("_source_root") == EDK2_SOURCE_ROOT and \
-                       cached_data.get("_platform_package") == EDK2_PLATFORM_PACKAGE_NAME and \
-                       cached_data.get("_build_target") == EDK2_BUILD_TARGET_DIR_NAME and \
-                       cached_data.get("_target_arch") == EDK2_TARGET_ARCH:
-                        self.guid_to_module_details = cached_data.get("map", {})
-                        self.debug_file_cache = cached_data.get("debug_file_cache", {})
-                        print(f"Loaded GUID map and debug file cache from: {GUID_MAP_CACHE_FILE}")
-                        if self.guid_to_module_details:
-                            return True
-                        else:
-                            print("Cache was empty or invalid, rebuilding map.")
-                    else:
-                        print("Configuration changed, rebuilding map.")
-            except Exception as e:
-                print(f"Error loading GUID map from cache ({e}), rebuilding.")
+        scan_start = time.monotonic()
+        cached_inf_records, cached_debug_fingerprints = self.load_guid_map_cache()
+
+        print(f"Updating EDK2 GUID to debug file map (searching for .debug files in {EDK2_DEBUG_FILES_SEARCH_BASE})...")
+        self.debug_file_indexes = {}
+        self.ambiguous_debug_files = {}
+        if force_rebuild:
+            self.debug_file_cache = {}
+
+        with symbol_stats.phase("inf_walk"):
+            inf_paths = self.collect_inf_paths()
+        scanned_inf_count = len(inf_paths)
+        workers = get_inf_scan_workers()
+        symbol_stats.count("inf_files_scanned", scanned_inf_count)
+
+        inf_records = {}
+        changed_inf_paths = []
+        for inf_path_abs in inf_paths:
+            fingerprint = file_fingerprint(inf_path_abs)
+            cached = cached_inf_records.get(inf_path_abs)
+            if fingerprint and cached and cached.get("fp") == fingerprint:
+                inf_records[inf_path_abs] = cached
+            else:
+                changed_inf_paths.append(inf_path_abs)
+
+        # Results are consumed in walk order regardless of the worker count,
+        # so the resulting map is identical to the serial scan.
+        with symbol_stats.phase("inf_parse"):
+            parse_results = self.parse_inf_files(changed_inf_paths, workers)
+        symbol_stats.count("inf_files_parsed", len(changed_inf_paths))
+        symbol_stats.count("inf_files_reused", scanned_inf_count - len(changed_inf_paths))
+        for inf_path_abs, parsed in zip(changed_inf_paths, parse_results):
+            file_guid, base_name, module_type, error = parsed
+            if error:
+                print(f"Error processing {inf_path_abs}: {error}")
+                continue
+            inf_records[inf_path_abs] = {
+                "fp": file_fingerprint(inf_path_abs),
+                "guid": file_guid,
+                "base_name": base_name,
+                "module_type": module_type,
+                "relevant": bool(file_guid and base_name and module_type and
+                                 module_type.upper() in RELEVANT_MODULE_TYPES),
+                "debug_path": None
+            }
+        dropped_inf_count = len(set(cached_inf_records) - set(inf_records))
+        changed_inf_paths = set(changed_inf_paths)
 
-        print(f"Generating EDK2 GUID to debug file map (searching for .debug files in {EDK2_DEBUG_FILES_SEARCH_BASE})...")
+        # Keep a .debug path only while its fingerprint is unchanged, otherwise
+        # resolve it again so stale paths never reach add-symbol-file.
+        relevant_inf_paths = []
+        stale_inf_paths = set()
+        self.inf_records = {}
+        for inf_path_abs in inf_paths:
+            record = inf_records.get(inf_path_abs)
+            if not record:
+                continue
+            self.inf_records[inf_path_abs] = record
+            if not record["relevant"]:
+                continue
+            relevant_inf_paths.append(inf_path_abs)
+            debug_path = record["debug_path"]
+            if force_rebuild or inf_path_abs in changed_inf_paths or \
+               (debug_path and cached_debug_fingerprints.get(debug_path) != file_fingerprint(debug_path)):
+                stale_inf_paths.add(inf_path_abs)
+
+        # Modules without a .debug file are retried when the build tree has to
+        # be walked anyway, or when the build output changed since the last
+        # walk (a module built for the first time); a module that is never
+        # built must not force a walk on every load.
+        search_base_abs = os.path.abspath(EDK2_DEBUG_FILES_SEARCH_BASE)
+        unmapped_inf_paths = [path for path in relevant_inf_paths if not self.inf_records[path]["debug_path"]]
+        if unmapped_inf_paths and (stale_inf_paths or self.build_output_changed(search_base_abs)):
+            stale_inf_paths.update(unmapped_inf_paths)
         self.guid_to_module_details = {}
-        self.debug_file_cache = {}
-        guid_pattern = re.compile(r"FILE_GUID\s*=\s*([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})", re.IGNORECASE)
-        base_name_pattern = re.compile(r"BASE_NAME\s*=\s*(\w+)", re.IGNORECASE)
-        module_type_pattern = re.compile(r"MODULE_TYPE\s*=\s*(\w+)", re.IGNORECASE)
+        self.debug_fingerprints = {}
+        for inf_path_abs in relevant_inf_paths:
+            record = self.inf_records[inf_path_abs]
+            if inf_path_abs in stale_inf_paths:
+                self.debug_file_cache.pop(record["base_name"], None)
+                source_rel_dir = os.path.relpath(os.path.splitext(inf_path_abs)[0], EDK2_SOURCE_ROOT)
+                record["debug_path"] = self.find_debug_file_recursive(record["base_name"], "debug", search_base_abs, source_rel_dir)
 
-        scanned_inf_count = 0
-        relevant_module_count = 0
-        
-        for package_root_abs in EDK2_PACKAGE_SOURCE_DIRS_TO_SCAN: 
+            debug_path = record["debug_path"]
+            debug_fingerprint = file_fingerprint(debug_path) if debug_path else None
+            if debug_fingerprint:
+                self.debug_fingerprints[debug_path] = debug_fingerprint
+                self.guid_to_module_details[record["guid"]] = {
+                    "base_name": record["base_name"],
+                    "full_debug_path": debug_path
+                }
+            # else: # Silenced warning for not finding debug file during map generation
+            #     print(f"  - Could not find .debug file for {record['base_name']} (GUID: {record['guid']}) during map generation.")
+        relevant_module_count = len(relevant_inf_paths)
+        resolved_debug_count = len(stale_inf_paths)
+        scan_time = time.monotonic() - scan_start
+        symbol_stats.add_time("guid_map", scan_time)
+
+        print(f"Finished scanning {scanned_inf_count} .inf files. Found {relevant_module_count} relevant DXE modules, mapped {len(self.guid_to_module_details)} to .debug files.")
+        print(f"Re-parsed {len(changed_inf_paths)} .inf files, dropped {dropped_inf_count} deleted ones, re-resolved {resolved_debug_count} .debug paths.")
+        mode = f"{workers} {EDK2_INF_SCAN_EXECUTOR} workers" if workers > 1 else "serial"
+        print(f"GUID map scan took {scan_time:.3f}s ({mode}).")
+
+        if changed_inf_paths or dropped_inf_count or resolved_debug_count or \
+           self.debug_fingerprints != cached_debug_fingerprints:
+            self.save_guid_map_cache()
+        return True
+
+    def collect_inf_paths(self):
+        """Walks the package source directories and returns all .inf paths in walk order."""
+        inf_paths = []
+        for package_root_abs in EDK2_PACKAGE_SOURCE_DIRS_TO_SCAN:
             if not os.path.isdir(package_root_abs):
-                # print(f"Warning: EDK2 package source directory not found during scan: {package_root_abs}") # Removed warning
                 continue
-            
+
             for root, dirs, files in os.walk(package_root_abs):
-                dirs[:] = [d for d in dirs if d.lower() not in ["build", ".git", "bin", "obj", "output", "tools", "scripts"]]
-                
+                dirs[:] = [d for d in dirs if d.lower() not in INF_SCAN_SKIP_DIRS]
+
                 for file_name in files:
                     if file_name.lower().endswith(".inf"):
-                        scanned_inf_count += 1
-                        inf_path_abs = os.path.join(root, file_name)
-                        file_guid = None
-                        base_name = None
-                        module_type = None
-                        try:
-                            with open(inf_path_abs, "r", encoding="utf-8", errors="ignore") as f_inf:
-                                for line in f_inf:
-                                    line = line.strip()
-                                    if not file_guid:
-                                        match_guid = guid_pattern.search(line)
-                                        if match_guid: file_guid = match_guid.group(1).upper()
-                                    if not base_name:
-                                        match_base = base_name_pattern.search(line)
-                                        if match_base: base_name = match_base.group(1)
-                                    if not module_type:
-                                        mt_match = module_type_pattern.search(line)
-                                        if mt_match: module_type = mt_match.group(1)
-                                    if file_guid and base_name and module_type: break
-                            
-                            if file_guid and base_name and module_type and \
-                               module_type.upper() in ["DXE_DRIVER", "DXE_RUNTIME_DRIVER", 
-                                                        "DXE_SAL_DRIVER", "DXE_SMM_DRIVER", 
-                                                        "UEFI_DRIVER", "UEFI_APPLICATION", "DXE_CORE"]:
-                                relevant_module_count +=1
-                                full_debug_path = self.find_debug_file_recursive(base_name, "debug", os.path.abspath(EDK2_DEBUG_FILES_SEARCH_BASE))
-                                if full_debug_path:
-                                    self.guid_to_module_details[file_guid] = {
-                                        "base_name": base_name,
-                                        "full_debug_path": full_debug_path
-                                    }
-                                # else: # Silenced warning for not finding debug file during map generation
-                                #     print(f"  - Could not find .debug file for {base_name} (GUID: {file_guid}) during map generation.")
-                        except Exception as e:
-                            print(f"Error processing {inf_path_abs}: {e}")
-        
-        print(f"Finished scanning {scanned_inf_count} .inf files. Found {relevant_module_count} relevant DXE modules, mapped {len(self.guid_to_module_details)} to .debug files.")
-        if GUID_MAP_CACHE_FILE and self.guid_to_module_details:
-            try:
-                data_to_cache = {
-                    "_source_root": EDK2_SOURCE_ROOT,
-                    "_platform_package": EDK2_PLATFORM_PACKAGE_NAME,
-                    "_build_target": EDK2_BUILD_TARGET_DIR_NAME,
-                    "_target_arch": EDK2_TARGET_ARCH,
-                    "map": self.guid_to_module_details,
-                    "debug_file_cache": self.debug_file_cache
-                }
-                with open(GUID_MAP_CACHE_FILE, 'w') as f_cache:
-                    json.dump(data_to_cache, f_cache, indent=4)
-                print(f"Saved GUID map to cache: {GUID_MAP_CACHE_FILE}")
-            except Exception as e:
-                print(f"Error saving GUID map to cache: {e}")
-        return True
+                        inf_paths.append(os.path.join(root, file_name))
+        return inf_paths
+
+    def parse_inf_files(self, inf_paths, workers):
+        """
+        Parses the given .inf files, serially or over a worker pool.
+        Returns the parse results in the same order as inf_paths.
+        """
+        if workers <= 1 or len(inf_paths) < 2:
+            return [parse_inf_file(path) for path in inf_paths]
+
+        if EDK2_INF_SCAN_EXECUTOR == "process":
+            executor_class = concurrent.futures.ProcessPoolExecutor
+        else:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+        chunksize = max(1, len(inf_paths) // (workers * 4))
+        try:
+            with executor_class(max_workers=workers) as executor:
+                return list(executor.map(parse_inf_file, inf_paths, chunksize=chunksize))
+        except Exception as e:
+            print(f"Parallel .inf scan failed ({e}), falling back to serial scan.")
+            return [parse_inf_file(path) for path in inf_paths]
+
+    def find_text_offset_objdump(self, full_debug_path_to_check):
+        """Uses objdump to find the VMA of the .text section. Returns None on failure."""
+        objdump_cmd = ["objdump", "-h", full_debug_path_to_check]
+        with symbol_stats.phase("objdump"):
+            process = subprocess.Popen(objdump_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            objdump_output, objdump_err = process.communicate()
+        symbol_stats.count("subprocesses_spawned")
+
+        if process.returncode != 0:
+            print(f"Error running objdump for {full_debug_path_to_check}:\n{objdump_err}") # Kept error for objdump failure
+            return None
+
+        text_section_match = re.search(r"^\s*\d+\s+\.text\s+[0-9a-fA-F]+\s+([0-9a-fA-F]+)", objdump_output, re.MULTILINE)
+        if text_section_match:
+            return int(text_section_match.group(1), 16)
+        return None
 
     def find_text_offset(self, full_debug_path_to_check):
-        """Uses objdump to find the VMA of the .text section."""
+        """
+        Returns the VMA of the .text section. The ELF section headers are read
+        in-process and memoized by path and fingerprint; objdump is only used
+        when the file cannot be parsed, or to cross-check when enabled.
+        """
         try:
             if not os.path.exists(full_debug_path_to_check): return 0
             abs_search_base = os.path.abspath(EDK2_DEBUG_FILES_SEARCH_BASE) 
@@ -252,146 +1461,920 @@ class Edk2SymbolHelper:
                 # print(f"Warning: Potentially unsafe or unexpected debug file path for objdump skipped: {full_debug_path_to_check}") # Silenced
                 return 0
 
-            objdump_cmd = ["objdump", "-h", full_debug_path_to_check]
-            process = subprocess.Popen(objdump_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            objdump_output, objdump_err = process.communicate()
+            fingerprint = file_fingerprint(full_debug_path_to_check)
+            cached = self.text_offset_cache.get(full_debug_path_to_check)
+            if cached and cached.get("fp") == fingerprint:
+                symbol_stats.count("text_offset_cache_hits")
+                return cached["offset"]
 
-            if process.returncode != 0:
-                print(f"Error running objdump for {full_debug_path_to_check}:\n{objdump_err}") # Kept error for objdump failure
+            symbol_stats.count("text_offset_cache_misses")
+            with symbol_stats.phase("elf_section_read"):
+                text_offset = read_elf_section_vma(full_debug_path_to_check, ".text")
+            if text_offset is None:
+                text_offset = self.find_text_offset_objdump(full_debug_path_to_check)
+            elif text_offset_cross_check_enabled():
+                objdump_offset = self.find_text_offset_objdump(full_debug_path_to_check)
+                if objdump_offset is not None and objdump_offset != text_offset:
+                    print(f"Warning: .text offset mismatch for {full_debug_path_to_check}: "
+                          f"ELF reader 0x{text_offset:X}, objdump 0x{objdump_offset:X}")
+            if text_offset is None:
                 return 0
-            
-            text_section_match = re.search(r"^\s*\d+\s+\.text\s+[0-9a-fA-F]+\s+([0-9a-fA-F]+)", objdump_output, re.MULTILINE)
-            if text_section_match:
-                return int(text_section_match.group(1), 16)
+
+            self.text_offset_cache[full_debug_path_to_check] = {"fp": fingerprint, "offset": text_offset}
+            self.text_offset_cache_dirty = True
+            return text_offset
         except Exception as e:
             print(f"Could not get .text offset for {full_debug_path_to_check}: {e}") # Kept error for unexpected issues
         return 0
 
-    def load_smi_handler_symbols(self, log_file_path):
-        """Parses the log file and loads smm symbols if offset is found."""
-        self.loaded_modules_info = {} # Reset for this specific load operation
-        global COREBOOT_SOURCE_ROOT
+    def gdb_objfile_names(self):
+        """Returns how many objfiles GDB currently holds per (real) file name."""
+        names = collections.Counter()
+        for objfile in gdb.objfiles():
+            if objfile.is_valid() and objfile.filename:
+                names[self.real_path(objfile.filename)] += 1
+        return names
+
+    def real_path(self, path):
+        real_path = self.real_paths.get(path)
+        if real_path is None:
+            real_path = self.real_paths[path] = os.path.realpath(path)
+        return real_path
+
+    def load_objfile_counts(self):
+        """
+        Returns the objfiles per file name for the current load. GDB is asked
+        once per load (see start_symbol_load() and forget_objfile_counts());
+        add_symbol_file() and remove_symbol_file() keep the counts current.
+        """
+        if self.objfile_counts is None:
+            self.objfile_counts = self.gdb_objfile_names()
+        return self.objfile_counts
+
+    def forget_objfile_counts(self):
+        """Makes the next load ask GDB again: objfiles may have changed in between (user commands)."""
+        self.objfile_counts = None
+
+    def record_symbol_file(self, key, record):
+        self.loaded_symbol_files[key] = record
+        self.symbol_file_addresses.setdefault(key[0], set()).add(key[1])
+
+    def forget_symbol_file(self, key):
+        record = self.loaded_symbol_files.pop(key, None)
+        addresses = self.symbol_file_addresses.get(key[0])
+        if addresses is not None:
+            addresses.discard(key[1])
+            if not addresses:
+                del self.symbol_file_addresses[key[0]]
+        return record
+
+    def indexed_debug_file(self, debug_path, fingerprint):
+        """Returns the indexed copy of debug_path from the GDB index cache, or None."""
+        cache_dir = get_gdb_index_cache_dir()
+        if not cache_dir or not fingerprint:
+            return None
+        indexed_path = gdb_index_cache_path(cache_dir, debug_path, fingerprint)
+        if os.path.exists(indexed_path):
+            symbol_stats.count("gdb_index_cache_hits")
+            with contextlib.suppress(OSError):
+                os.utime(indexed_path) # Marks the copy used for prune_gdb_index_cache()
+            return indexed_path
+        symbol_stats.count("gdb_index_cache_misses")
+        return None
+
+    def add_symbol_file(self, debug_path, load_addr, single_instance=False):
+        """
+        Loads debug_path at load_addr unless GDB already holds exactly that file
+        at that address. Records are kept per (file, address), so one module
+        loaded at several ImageBases keeps all of its objfiles. A record at the
+        same address in another version (fingerprint), or copies of the file
+        that GDB holds but this helper does not know about, are removed first,
+        so repeated loads and reconnects never pile up duplicate objfiles.
+        single_instance=True also removes the file at any other address, for
+        images that only ever run once per boot (shim, coreboot stages).
+        The indexed copy from the GDB index cache is loaded instead of
+        debug_path when present. GDB's objfiles are counted once per load
+        (load_objfile_counts()), and an unchanged file is not touched at all.
+        Returns "unchanged", "replaced" or "loaded"; raises gdb.error on failure.
+        """
+        fingerprint = file_fingerprint(debug_path)
+        real_path = self.real_path(debug_path)
+        key = (real_path, load_addr)
+        self.symbol_files_this_load.add(key)
+
+        # GDB may hold the file itself or indexed copies of it, once per known address
+        record = self.loaded_symbol_files.get(key)
+        same_file = [(real_path, address) for address in self.symbol_file_addresses.get(real_path, ())]
+        paths = {real_path} | {self.loaded_symbol_files[other]["path"] for other in same_file}
+        objfile_names = self.load_objfile_counts()
+        held = sum(objfile_names.get(path, 0) for path in paths)
+
+        # An original loaded before its indexed copy existed stays loaded
+        if record and record["fp"] == fingerprint and held == len(same_file) and \
+           (not single_instance or same_file == [key]):
+            self.symbol_load_counts["unchanged"] += 1
+            symbol_stats.count("symbol_files_unchanged")
+            return "unchanged"
 
-        COREBOOT_SOURCE_ROOT = os.path.abspath(os.path.expanduser(COREBOOT_SOURCE_ROOT))
-        smm_symbols_path = self.find_debug_file_recursive("smm", "elf", os.path.abspath(COREBOOT_SOURCE_ROOT))
+        load_path = self.indexed_debug_file(debug_path, fingerprint)
+        if load_path is None:
+            load_path = debug_path
+            self.gdb_index_pending.add(real_path)
+        real_load_path = os.path.realpath(load_path)
+        if real_load_path not in paths:
+            paths.add(real_load_path)
+            held += objfile_names.get(real_load_path, 0)
 
-        if not smm_symbols_path:
-            print(f"Could not find smm.elf from {COREBOOT_SOURCE_ROOT}") # Kept error for unexpected issues
+        result = "loaded"
+        if held != len(same_file):
+            # Copies this helper lost track of: start over with this file
+            for path in paths:
+                for _ in range(objfile_names.get(path, 0)):
+                    with symbol_stats.phase("remove_symbol_file"):
+                        gdb.execute(f"remove-symbol-file \"{path}\"")
+                    objfile_names[path] -= 1
+                    result = "replaced"
+            for other in same_file:
+                self.forget_symbol_file(other)
+        else:
+            stale = same_file if single_instance else [key] if record else []
+            for other in stale:
+                self.remove_symbol_file(other)
+                result = "replaced"
+
+        with symbol_stats.phase("add_symbol_file"):
+            gdb.execute(f"add-symbol-file \"{load_path}\" 0x{load_addr:X}")
+        objfile_names[real_load_path] += 1
+        self.record_symbol_file(key, {"fp": fingerprint, "path": real_load_path})
+        self.symbol_load_counts[result] += 1
+        symbol_stats.count(f"symbol_files_{result}")
+        return result
+
+    def remove_symbol_file(self, key):
+        """Removes the objfile of one (file, address) record; its .text contains the address."""
+        record = self.forget_symbol_file(key)
+        with symbol_stats.phase("remove_symbol_file"):
+            try:
+                gdb.execute(f"remove-symbol-file -a 0x{key[1]:X}")
+            except gdb.error as e:
+                print(f"  Warning: Could not remove '{key[0]}' at 0x{key[1]:X}: {e}")
+                self.forget_objfile_counts()
+                return
+        if record and self.objfile_counts and self.objfile_counts.get(record["path"]):
+            self.objfile_counts[record["path"]] -= 1
+
+    def remove_stale_symbol_files(self):
+        """
+        Removes the objfiles of files that the current load placed at other
+        addresses only: the log shows those modules now run elsewhere, so
+        their older addresses are stale. Files not loaded by this load keep
+        all of their objfiles.
+        """
+        files = {path for path, _ in self.symbol_files_this_load}
+        stale = [key for key in self.loaded_symbol_files
+                 if key[0] in files and key not in self.symbol_files_this_load]
+        for key in stale:
+            self.remove_symbol_file(key)
+        if stale:
+            print(f"Removed {len(stale)} symbol file(s) at addresses the log no longer shows.")
+
+    def start_symbol_load(self):
+        """Starts counting add_symbol_file() results and loaded files for one load command."""
+        self.symbol_load_counts = collections.Counter()
+        self.symbol_files_this_load = set()
+        self.forget_objfile_counts()
+
+    def finish_symbol_load(self):
+        """
+        Ends a load command without waiting for the GDB index cache: its
+        files are indexed on a background thread when that is enabled, else
+        edk2-index-cache is suggested once per session.
+        """
+        if not get_gdb_index_cache_dir() or not self.gdb_index_pending:
             return
+        if not gdb_index_cache_auto_enabled():
+            if not self.gdb_index_hint_shown:
+                self.gdb_index_hint_shown = True
+                print(f"{len(self.gdb_index_pending)} loaded .debug files have no prebuilt GDB index; "
+                      f"run edk2-index-cache to store indexed copies for later sessions.")
+            return
+        if self.gdb_index_job and self.gdb_index_job.is_alive():
+            return # The files stay pending for the next load
 
-        log_pattern = re.compile(
-            r"SMI handler_base "
-            r"0x(?P<image_base>[0-9a-fA-F]+)"
-        )
+        pending = self.gdb_index_pending
+        self.gdb_index_pending = set()
+        def run():
+            lines = self.store_gdb_indexes(pending)
+            gdb.post_event(lambda: print("\n".join(lines)))
+        self.gdb_index_job = threading.Thread(target=run, name="edk2-index-cache", daemon=True)
+        self.gdb_index_job.start()
+
+    def update_gdb_index_cache(self):
+        """Stores indexed copies of the .debug files loaded without one (edk2-index-cache)."""
+        if self.gdb_index_job and self.gdb_index_job.is_alive():
+            print("Waiting for the GDB index cache update running in the background...")
+            self.gdb_index_job.join()
+        pending = self.gdb_index_pending
+        self.gdb_index_pending = set()
+        for line in self.store_gdb_indexes(pending):
+            print(line)
+
+    def store_gdb_indexes(self, pending):
+        """
+        Stores indexed copies of the given .debug files and returns the lines
+        to report. A batch GDB per file writes its index, on worker threads,
+        and objcopy adds it to a copy of the file; the objfiles of this
+        session (vmlinux, ...) are left alone. Older copies of the same file
+        are removed and the cache is pruned afterwards. Uses no GDB API, so
+        it can run on a background thread.
+        """
+        cache_dir = get_gdb_index_cache_dir()
+        if not cache_dir:
+            return ["The GDB index cache is disabled."]
+        objcopy = shutil.which("objcopy")
+        gdb_path = gdb_executable()
+        if not objcopy or not gdb_path:
+            return [f"{'objcopy' if not objcopy else 'gdb'} not found, cannot fill the GDB index cache."]
+        pending = [path for path in sorted(pending) if os.path.exists(path)]
+        if not pending:
+            return ["GDB index cache: no newly loaded .debug files to index."]
+
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            return [f"Warning: Could not create GDB index cache directory {cache_dir}: {e}"]
+
+        def add_index_section(debug_path):
+            """Returns None if an indexed copy was stored, else the reason it was not."""
+            fingerprint = file_fingerprint(debug_path)
+            if not fingerprint:
+                return "file disappeared"
+            indexed_path = gdb_index_cache_path(cache_dir, debug_path, fingerprint)
+            with tempfile.TemporaryDirectory(dir=cache_dir) as index_dir:
+                process = subprocess.run([gdb_path, "-batch", "-nx", "-iex", "set auto-load no",
+                                          "-ex", f"file \"{debug_path}\"",
+                                          "-ex", f"save gdb-index \"{index_dir}\""],
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                symbol_stats.count("subprocesses_spawned")
+                index_file = os.path.join(index_dir, os.path.basename(debug_path) + ".gdb-index")
+                if not os.path.exists(index_file):
+                    return (process.stderr.strip().splitlines() or [f"gdb exited with {process.returncode}"])[-1]
+                partial_path = os.path.join(index_dir, os.path.basename(indexed_path))
+                process = subprocess.run([objcopy, "--add-section", f".gdb_index={index_file}",
+                                          "--set-section-flags", ".gdb_index=readonly",
+                                          debug_path, partial_path],
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                symbol_stats.count("subprocesses_spawned")
+                if process.returncode != 0:
+                    return process.stderr.strip() or "objcopy failed"
+                if file_fingerprint(debug_path) != fingerprint:
+                    return "file was rebuilt while indexing"
+                prefix = gdb_index_cache_prefix(cache_dir, debug_path)
+                for stale in os.listdir(cache_dir):
+                    stale_path = os.path.join(cache_dir, stale)
+                    if stale_path.startswith(prefix) and stale_path != indexed_path:
+                        with contextlib.suppress(OSError):
+                            os.unlink(stale_path)
+                os.replace(partial_path, indexed_path)
+            return None
+
+        with symbol_stats.phase("gdb_index_generate"):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=get_symbol_resolve_workers() or 1) as pool:
+                errors = {path: error for path, error in zip(pending, pool.map(add_index_section, pending)) if error}
+            pruned = prune_gdb_index_cache(cache_dir)
+        stored = len(pending) - len(errors)
+        symbol_stats.count("gdb_index_cache_stored", stored)
+        symbol_stats.count("gdb_index_cache_pruned", pruned)
+        lines = [f"GDB index cache: stored indexed copies of {stored} of {len(pending)} newly loaded .debug files"
+                 f"{f', pruned {pruned} old copies' if pruned else ''}."]
+        lines.extend(f"  Not indexed: {path}: {errors[path]}" for path in sorted(errors)[:EDK2_GDB_INDEX_ERRORS_SHOWN])
+        if len(errors) > EDK2_GDB_INDEX_ERRORS_SHOWN:
+            lines.append(f"  ... and {len(errors) - EDK2_GDB_INDEX_ERRORS_SHOWN} more.")
+        return lines
+
+    def coreboot_stage_index(self):
+        """Returns the CorebootStageIndex of COREBOOT_SOURCE_ROOT, or None if it is not set."""
+        if not COREBOOT_SOURCE_ROOT:
+            return None
+        coreboot_root = os.path.abspath(os.path.expanduser(COREBOOT_SOURCE_ROOT))
+        if coreboot_root not in self.coreboot_stage_indexes:
+            self.coreboot_stage_indexes[coreboot_root] = CorebootStageIndex(coreboot_root)
+        return self.coreboot_stage_indexes[coreboot_root]
+
+    def coreboot_stage_file(self, stage):
+        """Returns the debug file path of a coreboot stage, or None."""
+        stage_index = self.coreboot_stage_index()
+        found = stage_index.find(stage) if stage_index else None
+        return found[0] if found else None
+
+    def index_events(self, events):
+        """Adds the image ranges of the given load events to image_index."""
+        smm_path = None
+        smm_size = None
+        cbfs_name = None
+        for event in events:
+            if event.kind == "coreboot_cbfs_file":
+                cbfs_name = event.name
+            if not event.image_base:
+                continue
+            if event.kind == "edk2_image":
+                module_details = self.guid_to_module_details.get(event.file_guid)
+                name = module_details["base_name"] if module_details else f"GUID {event.file_guid}"
+                debug_path = module_details["full_debug_path"] if module_details else None
+                self.image_index.add(ImageRange(event.image_base, event.image_base + event.image_size,
+                                                name, event.kind, event.file_guid, debug_path))
+            elif event.kind == "smi_handler":
+                if smm_path is None:
+                    smm_path = self.coreboot_stage_file("smm")
+                    smm_size = elf_image_extent(smm_path) if smm_path else None
+                self.image_index.add(ImageRange(event.image_base,
+                                                event.image_base + smm_size if smm_size else None,
+                                                "smm", event.kind, None, smm_path))
+            elif event.kind == "coreboot_module":
+                name = cbfs_name or "rmodule"
+                self.image_index.add(ImageRange(event.image_base, event.image_base + event.image_size, name,
+                                                event.kind, None,
+                                                self.coreboot_stage_file(name) if name in COREBOOT_STAGE_FILES else None))
+                cbfs_name = None
+            elif event.kind != "coreboot_payload": # The payload entry point says nothing about its extent
+                self.image_index.add(ImageRange(event.image_base, None, event.kind, event.kind, None, None))
+
+    def load_coreboot_symbols(self, log_file_path, events=None, stages=COREBOOT_STAGES, linked=False,
+                              addresses=None):
+        """
+        Loads the symbols of the coreboot stages that ran in the log (or in
+        the given scan events), at the address each stage ran at: the SMI
+        handler base for smm, the logged relocation base plus the .text VMA
+        for rmodule stages and the linked .text VMA for the other stages.
+        With linked=True every built stage is loaded at its link address
+        without looking at a log. addresses ({stage: .text load address})
+        is used for the stages the log gives no address for, such as a
+        ramstage linked at 0. stages limits the stages considered.
+        """
+        addresses = addresses or {}
+        stage_index = self.coreboot_stage_index()
+        if stage_index is None:
+            print(f"{COREBOOT_SOURCE_ROOT_ENV_VAR} not set, skipping coreboot symbols.")
+            return
 
         try:
-            with open(log_file_path, "r", encoding="utf-8", errors="ignore") as f_log:
-                for line_num, line in enumerate(f_log, 1):
-                    match = log_pattern.search(line)
-                    if match:
-                        image_base_addr = int(match.group("image_base"), 16)
-                        print(f"Found: SMI handler base: 0x{image_base_addr:X}")
-                        try:
-                            gdb.execute(f"add-symbol-file \"{smm_symbols_path}\" 0x{image_base_addr:X}")
-                            print(f"  Symbols from '{smm_symbols_path}' loaded.")
-                        except gdb.error as e:
-                            print(f"  Error loading symbols from '{smm_symbols_path}': {e}") # Kept GDB load errors
-                    # else:
-                        # print(f"SMI handler symbols not loaded")
+            if linked:
+                stage_loads = {stage: None for stage in stages}
+            else:
+                if events is None:
+                    events, _ = scan_log_boot(log_file_path)
+                stage_loads = {stage: base for stage, base in coreboot_stage_loads(events).items()
+                               if stage in stages}
+            for stage, base in stage_loads.items():
+                if base is None and stage in addresses:
+                    found = stage_index.find(stage)
+                    if not found:
+                        print(f"Could not find the {stage} ELF under {stage_index.build_dir}")
+                        continue
+                    load_addr = addresses[stage]
+                    print(f"Using the given address for coreboot {stage}: Load Addr=0x{load_addr:X}")
+                    self.add_coreboot_stage_symbols(found[0], load_addr)
+                    continue
+                found = stage_index.find(stage)
+                if not found:
+                    if base is not None or stage == "smm":
+                        print(f"Could not find the {stage} ELF under {stage_index.build_dir}")
+                    continue
+                debug_path, text_vma = found
+                if stage == "smm" and base is not None:
+                    load_addr = base
+                    print(f"Found: SMI handler base: 0x{base:X}")
+                elif base is not None:
+                    load_addr = base + (text_vma or 0)
+                    print(f"Found: coreboot {stage} relocated to 0x{base:X}, Load Addr=0x{load_addr:X}")
+                elif text_vma:
+                    load_addr = text_vma
+                else:
+                    # An rmodule linked at 0 whose relocation base is not in the log
+                    print(f"Warning: Not loading coreboot {stage}: it is linked at 0 and neither the log "
+                          f"nor --at gives its load address.")
+                    continue
+                self.add_coreboot_stage_symbols(debug_path, load_addr)
         except FileNotFoundError: print(f"Error: Log file '{log_file_path}' not found.") # Kept critical errors
         except Exception as e: print(f"An error occurred during symbol loading from log: {e}") # Kept critical errors
 
-    def load_symbols_from_log_file(self, log_file_path):
-        """Parses the log file and loads symbols for found modules."""
+    def add_coreboot_stage_symbols(self, debug_path, load_addr):
+        try:
+            if self.add_symbol_file(debug_path, load_addr, single_instance=True) == "unchanged":
+                print(f"  Symbols from '{debug_path}' already loaded.")
+            else:
+                print(f"  Symbols from '{debug_path}' loaded at 0x{load_addr:X}.")
+        except gdb.error as e:
+            print(f"  Error loading symbols from '{debug_path}': {e}") # Kept GDB load errors
+
+    def load_smi_handler_symbols(self, log_file_path, events=None):
+        """Loads smm symbols at the SMI handler base found in the log (or in the given scan events)."""
+        if not COREBOOT_SOURCE_ROOT:
+            print(f"{COREBOOT_SOURCE_ROOT_ENV_VAR} not set, skipping SMI handler symbols.")
+            return
+        self.load_coreboot_symbols(log_file_path, events, stages=("smm",))
+
+    def resolve_image_symbols(self, file_guid_str, image_base_addr):
+        """
+        Looks up the debug file and .text offset of one EDK2_IMAGE_INFO record
+        without touching GDB, so that it can run on a worker thread.
+        Returns (base_name, full_debug_path, text_offset, status); status is
+        None when the symbols can be loaded.
+        """
+        module_details = self.guid_to_module_details.get(file_guid_str)
+        if not module_details:
+            return (None, None, None, "mapping not found")
+        base_name = module_details["base_name"]
+        full_debug_path = module_details["full_debug_path"]
+        if not full_debug_path or not os.path.exists(full_debug_path):
+            return (base_name, full_debug_path, None, "debug file not found")
+        return (base_name, full_debug_path, self.find_text_offset(full_debug_path), None)
+
+    def add_image_symbols(self, file_guid_str, image_base_addr, resolved):
+        """Loads one image resolved by resolve_image_symbols() into GDB (main thread only)."""
+        base_name, full_debug_path, text_offset, status = resolved
+        if status == "mapping not found":
+            # print(f"Warning: No GUID-to-module mapping found for GUID: {file_guid_str} (ImageBase: 0x{image_base_addr:X})") # Silenced
+            self.loaded_modules_info[image_base_addr] = f"GUID {file_guid_str} (mapping not found)"
+            return
+        if status:
+            # print(f"Warning: Pre-mapped debug file not found for GUID {file_guid_str} (Name: {base_name}) at path: {full_debug_path}") # Silenced
+            self.loaded_modules_info[image_base_addr] = f"{base_name} ({status})"
+            return
+
+        load_addr = image_base_addr + text_offset
+        print(f"Found: GUID={file_guid_str}, Name='{base_name}', ImageBase=0x{image_base_addr:X}, .text offset=0x{text_offset:X}, Load Addr=0x{load_addr:X}")
+        try:
+            result = self.add_symbol_file(full_debug_path, load_addr)
+            self.loaded_modules_info[image_base_addr] = base_name
+            if result == "unchanged":
+                print(f"  Symbols for '{base_name}' already loaded.")
+            else:
+                print(f"  Symbols for '{base_name}' {result}.")
+        except gdb.error as e:
+            print(f"  Error loading symbols for '{base_name}': {e}") # Kept GDB load errors
+            self.loaded_modules_info[image_base_addr] = f"{base_name} (load error)"
+
+    def load_image_symbols(self, file_guid_str, image_base_addr):
+        """Loads the symbols of one EDK2_IMAGE_INFO record unless its ImageBase was already handled."""
+        if image_base_addr == 0: return
+        if image_base_addr in self.loaded_modules_info: return
+        self.add_image_symbols(file_guid_str, image_base_addr,
+                               self.resolve_image_symbols(file_guid_str, image_base_addr))
+
+    def load_images_pipelined(self, events):
+        """
+        Loads the EDK2 images of the given events in log order. Worker threads
+        resolve debug files and .text offsets ahead of the GDB main thread,
+        which adds each image's symbols as soon as its result is ready.
+        """
+        images = []
+        seen_image_bases = set(self.loaded_modules_info)
+        for event in events:
+            if event.kind == "edk2_image" and event.image_base and event.image_base not in seen_image_bases:
+                seen_image_bases.add(event.image_base)
+                images.append(event)
+
+        workers = get_symbol_resolve_workers()
+        if workers <= 1 or len(images) <= 1:
+            for event in images:
+                self.load_image_symbols(event.file_guid, event.image_base)
+            return
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(self.resolve_image_symbols, event.file_guid, event.image_base)
+                       for event in images]
+            for event, future in zip(images, futures):
+                with symbol_stats.phase("resolve_wait"):
+                    resolved = future.result()
+                self.add_image_symbols(event.file_guid, event.image_base, resolved)
+        finally:
+            # On errors or Ctrl-C do not resolve the rest of the log
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def build_symbol_manifest(self, events):
+        """
+        Resolves the debug file and load address of every DXE image and SMI
+        handler in the given load events without touching GDB. Returns a list
+        of manifest entries (dicts) in log order, one per unique ImageBase.
+        """
+        entries = []
+        seen_image_bases = set()
+        smm_symbols_path = None
+        if any(event.kind == "smi_handler" for event in events):
+            smm_symbols_path = self.coreboot_stage_file("smm")
+
+        for event in events:
+            if event.kind not in ("edk2_image", "smi_handler") or not event.image_base:
+                continue
+            entry = {
+                "kind": event.kind,
+                "log_offset": event.offset,
+                "image_base": event.image_base,
+                "image_size": event.image_size,
+                "file_guid": event.file_guid,
+                "name": None,
+                "debug_path": None,
+                "text_offset": None,
+                "load_address": None,
+                "status": "ok"
+            }
+            if event.kind == "smi_handler":
+                entry["name"] = "smm"
+                if smm_symbols_path:
+                    entry["debug_path"] = smm_symbols_path
+                    entry["image_size"] = elf_image_extent(smm_symbols_path)
+                    entry["load_address"] = event.image_base
+                else:
+                    entry["status"] = "debug file not found"
+                entries.append(entry)
+                continue
+
+            if event.image_base in seen_image_bases:
+                continue
+            seen_image_bases.add(event.image_base)
+            module_details = self.guid_to_module_details.get(event.file_guid)
+            if not module_details:
+                entry["status"] = "mapping not found"
+            elif not os.path.exists(module_details["full_debug_path"]):
+                entry["name"] = module_details["base_name"]
+                entry["status"] = "debug file not found"
+            else:
+                entry["name"] = module_details["base_name"]
+                entry["debug_path"] = module_details["full_debug_path"]
+                entry["text_offset"] = self.find_text_offset(entry["debug_path"])
+                entry["load_address"] = event.image_base + entry["text_offset"]
+            entries.append(entry)
+        if self.text_offset_cache_dirty:
+            self.save_guid_map_cache()
+        return entries
+
+    def load_symbol_manifest(self, manifest_path):
+        """Loads the symbols listed in a manifest written by the headless CLI."""
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read symbol manifest '{manifest_path}': {e}")
+            return
+
+        self.loaded_modules_info = {}
+        self.start_symbol_load()
+        self.image_index.clear()
+        for entry in manifest.get("images", []):
+            image_size = entry.get("image_size")
+            self.image_index.add(ImageRange(entry["image_base"],
+                                            entry["image_base"] + image_size if image_size else None,
+                                            entry.get("name") or f"GUID {entry.get('file_guid')}",
+                                            entry["kind"], entry.get("file_guid"), entry.get("debug_path")))
+            if entry.get("status") != "ok":
+                continue
+            if file_fingerprint(entry["debug_path"]) is None:
+                print(f"  Skipping '{entry['name']}': {entry['debug_path']} no longer exists.")
+                continue
+            try:
+                self.add_symbol_file(entry["debug_path"], entry["load_address"])
+                self.loaded_modules_info[entry["image_base"]] = entry["name"]
+            except gdb.error as e:
+                print(f"  Error loading symbols for '{entry['name']}': {e}") # Kept GDB load errors
+        self.remove_stale_symbol_files()
+        print(f"Symbol files from manifest: {self.symbol_load_counts['loaded']} loaded, "
+              f"{self.symbol_load_counts['replaced']} replaced, "
+              f"{self.symbol_load_counts['unchanged']} already loaded and unchanged.")
+        self.finish_symbol_load()
+
+    def load_symbols_from_log_file(self, log_file_path, events=None):
+        """Loads symbols for the modules found in the log file (or in the given scan events)."""
         if not self.guid_to_module_details:
             print("GUID map is empty. Cannot load symbols. Generate map first (e.g., with rebuild-edk2-guidmap or load-edk2-symbols --rebuild-map).")
             return
 
         self.loaded_modules_info = {} # Reset for this specific load operation
+        self.start_symbol_load()
 
-        log_pattern = re.compile(
-            r"EDK2_IMAGE_INFO: FileGuid=(?P<file_guid>[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}), "
-            r"ImageBase=0x(?P<image_base>[0-9a-fA-F]+), "
-            r"ImageSize=0x(?P<image_size>[0-9a-fA-F]+)"
-        )
-        
-        # processed_guids_for_warning = set() # No longer needed for this specific warning
         try:
-            with open(log_file_path, "r", encoding="utf-8", errors="ignore") as f_log:
-                for line_num, line in enumerate(f_log, 1):
-                    match = log_pattern.search(line)
-                    if match:
-                        file_guid_str = match.group("file_guid").upper()
-                        image_base_addr = int(match.group("image_base"), 16)
-
-                        if image_base_addr == 0: continue
-                        if image_base_addr in self.loaded_modules_info: continue 
-                        
-                        module_details = self.guid_to_module_details.get(file_guid_str)
-
-                        if module_details:
-                            base_name = module_details["base_name"]
-                            full_debug_path = module_details["full_debug_path"] 
-
-                            if not full_debug_path or not os.path.exists(full_debug_path):
-                                # print(f"Warning: Pre-mapped debug file not found for GUID {file_guid_str} (Name: {base_name}) at path: {full_debug_path}") # Silenced
-                                self.loaded_modules_info[image_base_addr] = f"{base_name} (debug file not found)"
-                                continue
-                            
-                            text_offset = self.find_text_offset(full_debug_path)
-                            load_addr = image_base_addr + text_offset
-                            
-                            print(f"Found: GUID={file_guid_str}, Name='{base_name}', ImageBase=0x{image_base_addr:X}, .text offset=0x{text_offset:X}, Load Addr=0x{load_addr:X}")
-                            try:
-                                gdb.execute(f"add-symbol-file \"{full_debug_path}\" 0x{load_addr:X}")
-                                self.loaded_modules_info[image_base_addr] = base_name
-                                print(f"  Symbols for '{base_name}' loaded.")
-                            except gdb.error as e:
-                                print(f"  Error loading symbols for '{base_name}': {e}") # Kept GDB load errors
-                                self.loaded_modules_info[image_base_addr] = f"{base_name} (load error)"
-                        else:
-                            # if file_guid_str not in processed_guids_for_warning: # Silenced warning
-                                # print(f"Warning: No GUID-to-module mapping found for GUID: {file_guid_str} (ImageBase: 0x{image_base_addr:X})")
-                                # processed_guids_for_warning.add(file_guid_str)
-                            self.loaded_modules_info[image_base_addr] = f"GUID {file_guid_str} (mapping not found)"
+            if events is None:
+                events, _ = scan_log_boot(log_file_path)
+            self.load_images_pipelined(events)
+            self.remove_stale_symbol_files()
             
             if not self.loaded_modules_info: print("No EDK2_IMAGE_INFO lines found or processed from the log file.")
             else: print(f"Attempted to load symbols for {len(self.loaded_modules_info)} unique ImageBase instances.")
+            if self.symbol_load_counts:
+                print(f"Symbol files: {self.symbol_load_counts['loaded']} loaded, "
+                      f"{self.symbol_load_counts['replaced']} replaced, "
+                      f"{self.symbol_load_counts['unchanged']} already loaded and unchanged.")
+            self.finish_symbol_load()
+
+            if self.text_offset_cache_dirty:
+                self.save_guid_map_cache()
 
         except FileNotFoundError: print(f"Error: Log file '{log_file_path}' not found.") # Kept critical errors
         except Exception as e: print(f"An error occurred during symbol loading from log: {e}") # Kept critical errors
         print("Symbol loading process finished.")
 
 
-# Create a single instance of the helper to share the map and caches
+class Edk2LogFollower:
+    """
+    Tails a growing serial log and loads symbols for EDK2_IMAGE_INFO lines as
+    they appear. Only the bytes appended since the saved offset are parsed.
+    Following starts at the given offset (the start of the latest boot) and
+    the images of a boot are dropped when the log shows the next one.
+
+    Parsing and add-symbol-file always run on the GDB main thread: on every
+    stop event, and from gdb.post_event() when the background watcher thread
+    notices that the log has grown while the target is running.
+    """
+    def __init__(self, helper, log_file_path, lazy_loader=None, start_offset=0):
+        self.helper = helper
+        self.log_file_path = log_file_path
+        self.lazy_loader = lazy_loader
+        self.offset = start_offset
+        self.partial_line = b""
+        self.boot_kinds = [] # Boot marker kinds seen in the current boot
+        self.poll_pending = False
+        self.stop_event = threading.Event()
+        self.watcher = None
+
+    def start(self):
+        self.helper.loaded_modules_info = {}
+        self.helper.image_index.clear()
+        self.helper.start_symbol_load()
+        self.poll()
+        gdb.events.stop.connect(self.on_stop)
+        self.watcher = threading.Thread(target=self.watch, name="edk2-log-follow", daemon=True)
+        self.watcher.start()
+        print(f"Following '{self.log_file_path}' from offset {self.offset} (stop with load-edk2-symbols --stop-follow).")
+
+    def stop(self):
+        self.stop_event.set()
+        try:
+            gdb.events.stop.disconnect(self.on_stop)
+        except (RuntimeError, ValueError):
+            pass
+        if self.watcher:
+            self.watcher.join(timeout=EDK2_FOLLOW_POLL_INTERVAL * 2)
+        if self.helper.text_offset_cache_dirty:
+            self.helper.save_guid_map_cache()
+        print(f"Stopped following '{self.log_file_path}' at offset {self.offset}.")
+
+    def on_stop(self, event):
+        self.poll()
+
+    def watch(self):
+        """Background thread: only stats the log and schedules polls on the main thread."""
+        while not self.stop_event.wait(EDK2_FOLLOW_POLL_INTERVAL):
+            try:
+                size = os.path.getsize(self.log_file_path)
+            except OSError:
+                continue
+            if size != self.offset + len(self.partial_line) and not self.poll_pending:
+                self.poll_pending = True
+                gdb.post_event(self.poll)
+
+    def drop_boot_images(self):
+        """Forgets the images of the current boot and removes the objfiles loaded for them."""
+        for key in list(self.helper.symbol_files_this_load):
+            if key in self.helper.loaded_symbol_files:
+                self.helper.remove_symbol_file(key)
+        self.helper.start_symbol_load()
+        self.helper.loaded_modules_info = {}
+        self.helper.image_index.clear()
+
+    def scan_mapped(self, f_log, size):
+        """
+        Scans the complete lines from self.offset to size in place in an mmap
+        of the log, like LogScanner.scan(). Returns (events, boot markers,
+        length of the complete lines) and keeps the incomplete last line.
+        """
+        with mmap.mmap(f_log.fileno(), size, access=mmap.ACCESS_READ) as log_map:
+            end = log_map.rfind(b"\n", self.offset, size) + 1
+            if not end:
+                end = self.offset
+            self.partial_line = log_map[end:size]
+            with symbol_stats.phase("log_scan"):
+                events = log_scanner.scan_buffer(log_map, 0, start=self.offset, end=end)
+                markers = log_boot_index.scanner.scan_buffer(log_map, 0, start=self.offset, end=end)
+        symbol_stats.count("log_bytes_read", size - self.offset)
+        return events, markers, end - self.offset
+
+    def poll(self):
+        """Parses the lines appended since the last poll and loads their symbols."""
+        self.poll_pending = False
+        self.helper.forget_objfile_counts()
+        try:
+            with open(self.log_file_path, "rb") as f_log:
+                size = os.fstat(f_log.fileno()).st_size
+                if size < self.offset + len(self.partial_line):
+                    # The log was truncated or recreated (e.g. QEMU restarted).
+                    print(f"Log '{self.log_file_path}' was truncated, following from the start.")
+                    self.offset = 0
+                    self.partial_line = b""
+                    self.boot_kinds = []
+                    self.drop_boot_images()
+                if size - self.offset - len(self.partial_line) > EDK2_FOLLOW_READ_LIMIT:
+                    events, markers, complete_len = self.scan_mapped(f_log, size)
+                else:
+                    f_log.seek(self.offset + len(self.partial_line))
+                    appended = f_log.read()
+                    symbol_stats.count("log_bytes_read", len(appended))
+                    data = self.partial_line + appended
+                    complete_len = data.rfind(b"\n") + 1
+                    self.partial_line = data[complete_len:]
+                    events = log_scanner.scan_buffer(memoryview(data)[:complete_len], self.offset)
+                    markers = log_boot_index.scanner.scan_buffer(memoryview(data)[:complete_len], self.offset)
+        except OSError as e:
+            print(f"Error reading followed log '{self.log_file_path}': {e}")
+            return
+
+        boot_record = {"boots": [], "kinds": self.boot_kinds, "last_marker": -1}
+        LogBootIndex.apply_markers(boot_record, markers)
+        self.boot_kinds = boot_record["kinds"]
+        if boot_record["boots"]:
+            new_boot_offset = boot_record["boots"][-1]
+            print(f"New boot at offset {new_boot_offset} of '{self.log_file_path}', "
+                  f"dropping the images of the previous boot.")
+            self.drop_boot_images()
+            events = [event for event in events if event.offset >= new_boot_offset]
+        self.offset += complete_len
+        if self.lazy_loader:
+            self.lazy_loader.add_events(events)
+            return
+        self.helper.index_events(events)
+        for event in events:
+            if event.kind == "edk2_image":
+                self.helper.load_image_symbols(event.file_guid, event.image_base)
+
+
+class Edk2LazySymbolLoader:
+    """
+    Uses the helper's image range index, built from the EDK2_IMAGE_INFO
+    (ImageBase, ImageSize) records, to load a module's symbols only once a
+    stop PC or backtrace frame falls inside its range. Modules on the preload
+    allow-list are loaded right away.
+    """
+    def __init__(self, helper, preload_names=None):
+        self.helper = helper
+        self.preload_names = set(name.lower() for name in (preload_names or []))
+        self.connected = False
+
+    def add_events(self, events):
+        """Registers the ranges of the given load events and loads preloaded modules."""
+        self.helper.index_events(events)
+        for event in events:
+            if event.kind != "edk2_image" or not event.image_base:
+                continue
+            module_details = self.helper.guid_to_module_details.get(event.file_guid)
+            if module_details and module_details["base_name"].lower() in self.preload_names:
+                self.helper.load_image_symbols(event.file_guid, event.image_base)
+
+    def start(self):
+        if not self.connected:
+            gdb.events.stop.connect(self.on_stop)
+            self.connected = True
+        print(f"Lazy symbol loading enabled for {len(self.helper.image_index)} images "
+              f"({len(self.helper.loaded_modules_info)} preloaded).")
+
+    def stop(self):
+        if self.connected:
+            try:
+                gdb.events.stop.disconnect(self.on_stop)
+            except (RuntimeError, ValueError):
+                pass
+            self.connected = False
+        print("Lazy symbol loading disabled.")
+
+    def stack_pcs(self):
+        """Yields the PCs of the current stack, innermost first."""
+        try:
+            frame = gdb.newest_frame()
+        except gdb.error:
+            return
+        for _ in range(EDK2_LAZY_MAX_FRAMES):
+            if frame is None:
+                return
+            try:
+                yield frame.pc()
+                frame = frame.older()
+            except gdb.error:
+                return
+
+    def on_stop(self, event):
+        # Loading a module can make more of the stack unwindable, so walk
+        # the stack again until no new module shows up.
+        self.helper.forget_objfile_counts()
+        while True:
+            loaded_any = False
+            for pc in self.stack_pcs():
+                image_range = self.helper.image_index.lookup(pc)
+                if image_range is None or image_range.kind != "edk2_image" or \
+                   image_range.start in self.helper.loaded_modules_info:
+                    continue
+                self.helper.load_image_symbols(image_range.file_guid, image_range.start)
+                loaded_any = True
+            if not loaded_any:
+                break
+        if self.helper.text_offset_cache_dirty:
+            self.helper.save_guid_map_cache()
+
+
+# Base classes of the GDB commands; plain objects in headless CLI mode, where
+# the commands are never registered.
+GdbCommand = gdb.Command if gdb else object
+GdbFunction = gdb.Function if gdb else object
+
+# Create a single instance of the helper and log scanner to share the map and caches
+log_scanner = LogScanner()
+log_boot_index = LogBootIndex()
 edk2_helper = Edk2SymbolHelper()
+edk2_log_follower = None
+edk2_lazy_loader = None
+
+class LoadEdk2SymbolsCommand(GdbCommand):
+    """Load EDK2 symbols based on image load info from a log file.
+    Usage: load-edk2-symbols [--rebuild-map] [--boot N|all] [--follow] [--lazy [--preload Name,...]] <log_file_path>
+           load-edk2-symbols --manifest <manifest.json>
+           load-edk2-symbols --stop-follow | --stop-lazy
+
+    Only the images of one boot of a log spanning several resets are used:
+    the latest by default, or --boot N (1 = first, -1 = latest, -2 = the one
+    before, ...). --boot all uses every image record of the log.
+
+    --follow keeps tailing the log after the initial load and adds symbols
+    for newly loaded images as their EDK2_IMAGE_INFO lines appear.
+    --lazy only records the image ranges and loads a module's symbols once
+    the target stops with the PC or a backtrace frame inside it. --preload
+    adds module BASE_NAMEs to EDK2_LAZY_PRELOAD_DEFAULTS to load right away.
+    --manifest loads a manifest precomputed by running this script as a CLI."""
+    USAGE = ("Usage: load-edk2-symbols [--rebuild-map] [--boot N|all] [--follow] [--lazy [--preload Name,...]] "
+             "<log_file_path>\n"
+             "       load-edk2-symbols --manifest <manifest.json>\n"
+             "       load-edk2-symbols --stop-follow | --stop-lazy")
 
-class LoadEdk2SymbolsCommand(gdb.Command):
-    """Load EDK2 symbols based on image load info from a log file."""
     def __init__(self):
         super(LoadEdk2SymbolsCommand, self).__init__("load-edk2-symbols", gdb.COMMAND_USER)
 
     def invoke(self, argument, from_tty):
-        global edk2_helper 
-
-        if not edk2_helper.check_env_vars_and_paths():
-            return
+        global edk2_helper, edk2_log_follower, edk2_lazy_loader
 
         args = gdb.string_to_argv(argument)
         force_rebuild_map = False
+        follow = False
+        lazy = False
+        preload_names = list(EDK2_LAZY_PRELOAD_DEFAULTS)
+        boot = None
         log_file_path = None
 
         if not args:
-            print("Usage: load-edk2-symbols [--rebuild-map] <log_file_path>")
+            print(self.USAGE)
             return
 
-        if args[0] == "--rebuild-map":
-            force_rebuild_map = True
-            if len(args) > 1: log_file_path = os.path.expanduser(args[1])
+        args_iter = iter(args)
+        for arg in args_iter:
+            if arg == "--rebuild-map":
+                force_rebuild_map = True
+            elif arg == "--follow":
+                follow = True
+            elif arg == "--lazy":
+                lazy = True
+            elif arg == "--boot":
+                try:
+                    boot = parse_boot_argument(next(args_iter, ""))
+                except ValueError as e:
+                    print(f"Error: {e}"); return
+            elif arg == "--preload":
+                names = next(args_iter, None)
+                if not names:
+                    print(self.USAGE); return
+                preload_names.extend(name for name in names.split(",") if name)
+            elif arg == "--manifest":
+                manifest_path = next(args_iter, None)
+                if not manifest_path:
+                    print(self.USAGE); return
+                edk2_helper.load_symbol_manifest(os.path.expanduser(manifest_path))
+                return
+            elif arg == "--stop-follow":
+                if edk2_log_follower:
+                    edk2_log_follower.stop()
+                    edk2_log_follower = None
+                else:
+                    print("Not following any log.")
+                return
+            elif arg == "--stop-lazy":
+                if edk2_lazy_loader:
+                    edk2_lazy_loader.stop()
+                    edk2_lazy_loader = None
+                else:
+                    print("Lazy symbol loading is not enabled.")
+                return
+            elif arg.startswith("--") or log_file_path:
+                print(self.USAGE); return
             else:
-                print("Usage: load-edk2-symbols --rebuild-map <log_file_path>"); return
-        else:
-            log_file_path = os.path.expanduser(args[0])
+                log_file_path = os.path.expanduser(arg)
+
+        if not edk2_helper.check_env_vars_and_paths():
+            return
         
         if not log_file_path: print("Error: Log file path not provided."); return
         if not os.path.exists(log_file_path): print(f"Error: Log file '{log_file_path}' not found."); return
@@ -400,13 +2383,44 @@ class LoadEdk2SymbolsCommand(gdb.Command):
             print("Failed to generate or load GUID map. Aborting symbol load.")
             return
         
-        edk2_helper.load_symbols_from_log_file(log_file_path)
-        edk2_helper.load_smi_handler_symbols(log_file_path)
+        try:
+            events, boot_offset = scan_log_boot(log_file_path, boot)
+        except OSError as e:
+            print(f"Error: Could not read log file '{log_file_path}': {e}"); return
+        except ValueError as e:
+            print(f"Error: {e}"); return
+
+        if edk2_lazy_loader:
+            edk2_lazy_loader.stop()
+            edk2_lazy_loader = None
+        if edk2_log_follower:
+            edk2_log_follower.stop()
+            edk2_log_follower = None
+
+        edk2_helper.image_index.clear()
+        if lazy:
+            edk2_helper.loaded_modules_info = {}
+            edk2_lazy_loader = Edk2LazySymbolLoader(edk2_helper, preload_names)
 
+        if follow:
+            edk2_log_follower = Edk2LogFollower(edk2_helper, log_file_path, edk2_lazy_loader, boot_offset)
+            edk2_log_follower.start()
+        elif lazy:
+            edk2_lazy_loader.add_events(events)
+        else:
+            edk2_helper.index_events(events)
+            edk2_helper.load_symbols_from_log_file(log_file_path, events)
+
+        if edk2_lazy_loader:
+            edk2_lazy_loader.start()
+        edk2_helper.load_smi_handler_symbols(log_file_path, events)
 
-class RebuildEdk2GuidMapCommand(gdb.Command):
+
+class RebuildEdk2GuidMapCommand(GdbCommand):
     """Rebuilds and caches the EDK2 GUID to .debug file mapping, then loads symbols from the provided log file.
-    Usage: rebuild-edk2-guidmap <log_file_path>"""
+    Usage: rebuild-edk2-guidmap [--boot N|all] <log_file_path>
+
+    Symbols are loaded for the latest boot in the log unless --boot selects another."""
     def __init__(self):
         super(RebuildEdk2GuidMapCommand, self).__init__("rebuild-edk2-guidmap", gdb.COMMAND_USER)
 
@@ -417,8 +2431,15 @@ class RebuildEdk2GuidMapCommand(gdb.Command):
             return
 
         args = gdb.string_to_argv(argument)
-        if not args:
-            print("Usage: rebuild-edk2-guidmap <log_file_path>")
+        boot = None
+        if len(args) == 3 and args[0] == "--boot":
+            try:
+                boot = parse_boot_argument(args[1])
+            except ValueError as e:
+                print(f"Error: {e}"); return
+            args = args[2:]
+        if len(args) != 1:
+            print("Usage: rebuild-edk2-guidmap [--boot N|all] <log_file_path>")
             return
         
         log_file_path = os.path.expanduser(args[0])
@@ -430,13 +2451,342 @@ class RebuildEdk2GuidMapCommand(gdb.Command):
         if edk2_helper.generate_guid_map(force_rebuild=True):
             print("GUID map rebuild complete and cached.")
             print(f"Now loading symbols from log: {log_file_path}")
-            edk2_helper.load_symbols_from_log_file(log_file_path)
-            edk2_helper.load_smi_handler_symbols(log_file_path)
+            try:
+                events, _ = scan_log_boot(log_file_path, boot)
+            except OSError as e:
+                print(f"Error: Could not read log file '{log_file_path}': {e}"); return
+            except ValueError as e:
+                print(f"Error: {e}"); return
+            edk2_helper.image_index.clear()
+            edk2_helper.index_events(events)
+            edk2_helper.load_symbols_from_log_file(log_file_path, events)
+            edk2_helper.load_smi_handler_symbols(log_file_path, events)
         else:
             print("GUID map rebuild failed. Check errors and environment variable settings.")
 
-# Register the commands with GDB
-if __name__ == "__main__":
+class LoadCorebootSymbolsCommand(GdbCommand):
+    """Load coreboot stage symbols at the addresses the stages ran at in a log file.
+    Usage: load-coreboot-symbols [--boot N|all] [--stages Stage,...] [--at Stage=Addr,...] [--rebuild-index]
+                                 [--linked] <log_file_path>
+           load-coreboot-symbols [--stages Stage,...] [--at Stage=Addr,...] [--rebuild-index] --linked
+
+    Stages are bootblock, romstage, postcar, ramstage, smm and payload; their
+    ELFs are looked up in the build directory of $COREBOOT_SOURCE_ROOT_ENV and
+    the paths cached. rmodule stages (postcar, ramstage) are loaded at the
+    base of their "Loading module at" line, smm at the SMI handler base.
+    --at gives the .text load address of stages the log has no address for.
+    --linked without a log loads every built stage at its link address (or
+    its --at address); stages linked at 0 without one are not loaded. With a
+    log, --linked is the fallback used when the log is missing or older than
+    the coreboot build; without --linked such a log is an error.
+    --rebuild-index forgets the cached stage paths first."""
+    USAGE = ("Usage: load-coreboot-symbols [--boot N|all] [--stages Stage,...] [--at Stage=Addr,...] "
+             "[--rebuild-index] [--linked] <log_file_path>\n"
+             "       load-coreboot-symbols [--stages Stage,...] [--at Stage=Addr,...] [--rebuild-index] --linked")
+
+    def __init__(self):
+        super(LoadCorebootSymbolsCommand, self).__init__("load-coreboot-symbols", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        global edk2_helper, COREBOOT_SOURCE_ROOT
+
+        args = gdb.string_to_argv(argument)
+        stages = COREBOOT_STAGES
+        boot = None
+        linked = False
+        rebuild_index = False
+        addresses = {}
+        log_file_path = None
+
+        args_iter = iter(args)
+        for arg in args_iter:
+            if arg == "--at":
+                try:
+                    for item in next(args_iter, "").split(","):
+                        stage, address = item.split("=", 1)
+                        if stage not in COREBOOT_STAGES:
+                            raise ValueError(f"unknown coreboot stage '{stage}'")
+                        addresses[stage] = int(address, 0)
+                except ValueError as e:
+                    print(f"Error: Invalid --at (expected Stage=Addr,...): {e}"); return
+            elif arg == "--linked":
+                linked = True
+            elif arg == "--rebuild-index":
+                rebuild_index = True
+            elif arg == "--boot":
+                try:
+                    boot = parse_boot_argument(next(args_iter, ""))
+                except ValueError as e:
+                    print(f"Error: {e}"); return
+            elif arg == "--stages":
+                stages = [stage for stage in next(args_iter, "").split(",") if stage]
+                unknown = [stage for stage in stages if stage not in COREBOOT_STAGES]
+                if not stages or unknown:
+                    print(f"Error: Unknown coreboot stage(s) {', '.join(unknown)} "
+                          f"(expected: {', '.join(COREBOOT_STAGES)})"); return
+            elif arg.startswith("--") or log_file_path:
+                print(self.USAGE); return
+            else:
+                log_file_path = os.path.expanduser(arg)
+        if not linked and not log_file_path:
+            print(self.USAGE); return
+
+        COREBOOT_SOURCE_ROOT = os.getenv(COREBOOT_SOURCE_ROOT_ENV_VAR)
+        stage_index = edk2_helper.coreboot_stage_index()
+        if stage_index is None:
+            print(f"Error: {COREBOOT_SOURCE_ROOT_ENV_VAR} is not set."); return
+        if rebuild_index:
+            stage_index.clear()
+
+        events = None
+        if log_file_path:
+            # A log of an older build gives addresses that no longer match the ELFs
+            log_problem = None
+            if not os.path.exists(log_file_path):
+                log_problem = "not found"
+            else:
+                build_time = stage_index.newest_build_time(stages)
+                if build_time and os.path.getmtime(log_file_path) < build_time:
+                    log_problem = "is older than the coreboot build"
+            if log_problem and not linked:
+                print(f"Error: Log file '{log_file_path}' {log_problem} (add --linked to fall back "
+                      f"to link and --at addresses)."); return
+            if log_problem:
+                print(f"Log file '{log_file_path}' {log_problem}, using link and --at addresses.")
+                log_file_path = None
+        if log_file_path:
+            try:
+                events, _ = scan_log_boot(log_file_path, boot)
+            except OSError as e:
+                print(f"Error: Could not read log file '{log_file_path}': {e}"); return
+            except ValueError as e:
+                print(f"Error: {e}"); return
+            edk2_helper.index_events(events)
+
+        edk2_helper.start_symbol_load()
+        edk2_helper.load_coreboot_symbols(log_file_path, events, stages, linked=not log_file_path,
+                                          addresses=addresses)
+        edk2_helper.finish_symbol_load()
+
+class Edk2WhereisCommand(GdbCommand):
+    """Shows which loaded image (DXE module, coreboot stage, SMI handler, shim) contains an address.
+    Usage: edk2-whereis <address_expression> [<log_file_path>]
+
+    Uses the image ranges of the log last loaded with load-edk2-symbols, or
+    indexes the latest boot of the given log first. Works without any symbols loaded."""
+    def __init__(self):
+        super(Edk2WhereisCommand, self).__init__("edk2-whereis", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        global edk2_helper
+
+        args = gdb.string_to_argv(argument)
+        if not args or len(args) > 2:
+            print("Usage: edk2-whereis <address_expression> [<log_file_path>]")
+            return
+
+        if len(args) == 2:
+            log_file_path = os.path.expanduser(args[1])
+            try:
+                events, _ = scan_log_boot(log_file_path)
+            except OSError as e:
+                print(f"Error: Could not read log file '{log_file_path}': {e}"); return
+            if not edk2_helper.guid_to_module_details and edk2_helper.check_env_vars_and_paths():
+                edk2_helper.generate_guid_map()
+            edk2_helper.image_index.clear()
+            edk2_helper.index_events(events)
+
+        if not len(edk2_helper.image_index):
+            print("No image ranges indexed. Run load-edk2-symbols or pass a log file.")
+            return
+
+        try:
+            address = int(gdb.parse_and_eval(args[0])) & 0xFFFFFFFFFFFFFFFF
+        except (gdb.error, ValueError) as e:
+            print(f"Error: Invalid address '{args[0]}': {e}")
+            return
+
+        image_range = edk2_helper.image_index.lookup(address)
+        if image_range is None:
+            print(f"0x{address:X} is not inside any known image.")
+            return
+        size = f"0x{image_range.end - image_range.start:X}" if image_range.end is not None else "unknown"
+        print(f"0x{address:X} is {image_range.name}+0x{address - image_range.start:X} "
+              f"({image_range.kind} image at 0x{image_range.start:X}, size {size})")
+        if image_range.debug_path:
+            print(f"  Debug file: {image_range.debug_path}")
+
+
+class Edk2SymbolsStatsCommand(GdbCommand):
+    """Shows per-phase timings and counters of the EDK2 symbol loader for this session.
+    Usage: edk2-symbols-stats [--reset] [--json [<output_file>]]
+
+    --json prints (or appends as one line to <output_file>) a JSON record
+    including the build configuration, for tracking attach latency over builds."""
+    USAGE = "Usage: edk2-symbols-stats [--reset] [--json [<output_file>]]"
+
+    def __init__(self):
+        super(Edk2SymbolsStatsCommand, self).__init__("edk2-symbols-stats", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        args = gdb.string_to_argv(argument)
+        if args == ["--reset"]:
+            symbol_stats.reset()
+            print("EDK2 symbol loader statistics reset.")
+            return
+
+        if args and args[0] == "--json":
+            if len(args) > 2:
+                print(self.USAGE); return
+            record = symbol_stats.as_dict()
+            record.update({
+                "source_root": EDK2_SOURCE_ROOT,
+                "platform_package": EDK2_PLATFORM_PACKAGE_NAME,
+                "build_target": EDK2_BUILD_TARGET_DIR_NAME,
+                "target_arch": EDK2_TARGET_ARCH
+            })
+            if len(args) == 2:
+                output_file = os.path.expanduser(args[1])
+                try:
+                    with open(output_file, "a") as f:
+                        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                except OSError as e:
+                    print(f"Error: Could not write '{output_file}': {e}"); return
+                print(f"Appended statistics to {output_file}")
+            else:
+                print(json.dumps(record, indent=4))
+            return
+
+        if args:
+            print(self.USAGE); return
+
+        stats = symbol_stats.as_dict()
+        print(f"EDK2 symbol loader statistics since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['started']))}:")
+        print("  Phase                        Time (s)    Calls")
+        for name, phase in stats["phases"].items():
+            print(f"  {name:<26} {phase['seconds']:>10.3f} {phase['calls']:>8}")
+        print("  Counters:")
+        for name, value in stats["counters"].items():
+            print(f"  {name:<26} {value:>19}")
+
+class Edk2IndexCacheCommand(GdbCommand):
+    """Stores GDB-indexed copies of the .debug files loaded in this session without one.
+    Usage: edk2-index-cache
+
+    Later sessions load the copies and skip GDB's DWARF indexing. Runs a batch
+    GDB and objcopy per file, so it is not done by the load commands unless
+    EDK2_GDB_INDEX_CACHE_AUTO_ENV=1 runs it in the background after every load."""
+    def __init__(self):
+        super(Edk2IndexCacheCommand, self).__init__("edk2-index-cache", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        if gdb.string_to_argv(argument):
+            print("Usage: edk2-index-cache"); return
+        edk2_helper.update_gdb_index_cache()
+
+
+class Edk2ModuleFunction(GdbFunction):
+    """Returns "<module>+0x<offset>" for an address, or "??" if no known image contains it.
+    Usage: $edk2_module($pc)"""
+    def __init__(self):
+        super(Edk2ModuleFunction, self).__init__("edk2_module")
+
+    def invoke(self, address):
+        address = int(address) & 0xFFFFFFFFFFFFFFFF
+        image_range = edk2_helper.image_index.lookup(address)
+        if image_range is None:
+            return "??"
+        return f"{image_range.name}+0x{address - image_range.start:X}"
+
+
+def write_symbol_manifest(manifest_path, gdb_script_path, log_file_path, entries):
+    """Writes the JSON manifest and the equivalent add-symbol-file gdb script."""
+    manifest = {
+        "_version": SYMBOL_MANIFEST_VERSION,
+        "log_file": os.path.abspath(log_file_path),
+        "source_root": EDK2_SOURCE_ROOT,
+        "platform_package": EDK2_PLATFORM_PACKAGE_NAME,
+        "build_target": EDK2_BUILD_TARGET_DIR_NAME,
+        "target_arch": EDK2_TARGET_ARCH,
+        "images": entries
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    with open(gdb_script_path, "w") as f:
+        f.write(f"# Generated by load_edk2_symbols.py from {os.path.abspath(log_file_path)}\n")
+        for entry in entries:
+            if entry["status"] != "ok":
+                f.write(f"# {entry['name'] or entry['file_guid']} at 0x{entry['image_base']:X}: {entry['status']}\n")
+                continue
+            f.write(f"add-symbol-file \"{entry['debug_path']}\" 0x{entry['load_address']:X}\n")
+
+def main(argv=None):
+    """Headless mode: precompute the symbol manifest for a log outside GDB."""
+    parser = argparse.ArgumentParser(
+        description="Precompute EDK2/coreboot symbol load addresses from a serial log. "
+                    "Writes a JSON manifest (for load-edk2-symbols --manifest) and a gdb "
+                    "script of add-symbol-file commands (for 'source').")
+    parser.add_argument("log_file", help="serial log containing EDK2_IMAGE_INFO lines")
+    parser.add_argument("--edk2-root", default=os.getenv(EDK2_SOURCE_ROOT_ENV_VAR),
+                        help=f"EDK2 source root (default: ${EDK2_SOURCE_ROOT_ENV_VAR})")
+    parser.add_argument("--platform", default=os.getenv(EDK2_PLATFORM_PACKAGE_NAME_ENV_VAR),
+                        help=f"platform package name in Build/ (default: ${EDK2_PLATFORM_PACKAGE_NAME_ENV_VAR})")
+    parser.add_argument("--target", default=os.getenv(EDK2_BUILD_TARGET_DIR_NAME_ENV_VAR),
+                        help=f"build target directory, e.g. DEBUG_COREBOOT (default: ${EDK2_BUILD_TARGET_DIR_NAME_ENV_VAR})")
+    parser.add_argument("--coreboot-root", default=os.getenv(COREBOOT_SOURCE_ROOT_ENV_VAR),
+                        help=f"coreboot tree for smm.elf (default: ${COREBOOT_SOURCE_ROOT_ENV_VAR})")
+    parser.add_argument("--rebuild-map", action="store_true", help="re-resolve all .debug paths")
+    parser.add_argument("--boot", default=None,
+                        help="boot of a multi-boot log: N (1 = first, -1 = latest, the default) or 'all'")
+    parser.add_argument("-o", "--manifest", help="output JSON manifest (default: <log_file>.symbols.json)")
+    parser.add_argument("-g", "--gdb-script", help="output gdb script (default: <log_file>.symbols.gdb)")
+    args = parser.parse_args(argv)
+
+    for var, value in ((EDK2_SOURCE_ROOT_ENV_VAR, args.edk2_root),
+                       (EDK2_PLATFORM_PACKAGE_NAME_ENV_VAR, args.platform),
+                       (EDK2_BUILD_TARGET_DIR_NAME_ENV_VAR, args.target),
+                       (COREBOOT_SOURCE_ROOT_ENV_VAR, args.coreboot_root)):
+        if value:
+            os.environ[var] = value
+
+    try:
+        boot = parse_boot_argument(args.boot) if args.boot is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not edk2_helper.generate_guid_map(force_rebuild=args.rebuild_map):
+        return 1
+    try:
+        events, _ = scan_log_boot(args.log_file, boot)
+    except OSError as e:
+        print(f"Error: Could not read log file '{args.log_file}': {e}")
+        return 1
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    entries = edk2_helper.build_symbol_manifest(events)
+    manifest_path = args.manifest or args.log_file + ".symbols.json"
+    gdb_script_path = args.gdb_script or args.log_file + ".symbols.gdb"
+    write_symbol_manifest(manifest_path, gdb_script_path, args.log_file, entries)
+    resolved = sum(1 for entry in entries if entry["status"] == "ok")
+    print(f"Resolved {resolved} of {len(entries)} images.")
+    print(f"Wrote {manifest_path} and {gdb_script_path}")
+    return 0
+
+# Register the commands with GDB, or run the headless CLI outside of it
+if __name__ == "__main__" and gdb is None:
+    sys.exit(main())
+elif __name__ == "__main__":
+    # Let scripts sourced later (load_shim_symbols.py) import this instance
+    # instead of creating a second helper.
+    sys.modules.setdefault("load_edk2_symbols", sys.modules[__name__])
     LoadEdk2SymbolsCommand()
     RebuildEdk2GuidMapCommand()
+    LoadCorebootSymbolsCommand()
+    Edk2WhereisCommand()
+    Edk2SymbolsStatsCommand()
+    Edk2IndexCacheCommand()
+    Edk2ModuleFunction()
 
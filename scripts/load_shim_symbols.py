@@ -1,11 +1,47 @@
 # GDB Python script to load shim symbols automatically.
 
 import gdb
-import re
 import os
+import sys
 
-# The static offset of the .text section within the shim EFI debug file.
-SHIM_TEXT_OFFSET = 0x25000
+# Share the log scanner with load_edk2_symbols.py living next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import load_edk2_symbols
+from load_edk2_symbols import log_scanner, edk2_helper, elf_image_extent, ImageRange, \
+    CacheStore, file_fingerprint, read_elf_section_vma
+
+# Offset of the .text section within the shim image. It is read from the
+# section headers of the shim debug file; this value is only used when the
+# debug file cannot be parsed as ELF.
+SHIM_TEXT_OFFSET_FALLBACK = 0x25000
+SHIM_TEXT_OFFSET_CACHE_VERSION = 1
+
+def shim_text_offset(symbol_file_path):
+    """
+    Returns the .text VMA of the shim debug file, cached in the symbol
+    loader's cache store by path and file fingerprint, or None if the file
+    has no readable .text section.
+    """
+    cache_file = load_edk2_symbols.GUID_MAP_CACHE_FILE
+    key = os.path.realpath(symbol_file_path)
+    fingerprint = file_fingerprint(symbol_file_path)
+    if cache_file:
+        try:
+            cached = CacheStore(cache_file).load("shim_text_offset", key, SHIM_TEXT_OFFSET_CACHE_VERSION)
+        except Exception as e:
+            print(f"Warning: Could not read the shim offset cache: {e}")
+            cached = None
+        if cached and cached.get("fp") == fingerprint:
+            return cached["offset"]
+
+    text_offset = read_elf_section_vma(symbol_file_path, ".text")
+    if text_offset is not None and cache_file:
+        try:
+            CacheStore(cache_file).save("shim_text_offset", key, SHIM_TEXT_OFFSET_CACHE_VERSION,
+                                        {"fp": fingerprint, "offset": text_offset})
+        except Exception as e:
+            print(f"Warning: Could not update the shim offset cache: {e}")
+    return text_offset
 
 class LoadShimSymbols(gdb.Command):
     """
@@ -40,22 +76,18 @@ class LoadShimSymbols(gdb.Command):
             print(f"Error: Symbol file not found at '{symbol_file_path}'")
             return
 
-        address_pattern = re.compile(r"Bootloader loaded at address: (0x[0-9a-fA-F]+)")
-
         base_address = None
 
         print(f"Searching for shim load address in '{logfile_path}'...")
 
+        # Only the last load matters, so scan from the end of the log
         try:
-            with open(logfile_path, 'r') as f:
-                for line in f:
-                    match = address_pattern.search(line)
-                    if match:
-                        base_address_str = match.group(1)
-                        base_address = int(base_address_str, 16)
+            event = log_scanner.scan_last(logfile_path, "shim")
         except IOError as e:
             print(f"Error: Could not read log file: {e}")
             return
+        if event:
+            base_address = event.image_base
 
         if base_address is None:
             print("Error: Could not find the bootloader load address in the log file.")
@@ -64,12 +96,24 @@ class LoadShimSymbols(gdb.Command):
 
         print(f"✅ Found ImageBase address: {hex(base_address)}")
 
-        symbol_load_address = base_address + SHIM_TEXT_OFFSET
-
-        gdb_command = f"add-symbol-file {symbol_file_path} {hex(symbol_load_address)}"
-
-        print(f"Executing: {gdb_command}")
-
-        gdb.execute(gdb_command)
+        text_offset = shim_text_offset(symbol_file_path)
+        if text_offset is None:
+            text_offset = SHIM_TEXT_OFFSET_FALLBACK
+            print(f"Warning: No .text section found in '{symbol_file_path}', "
+                  f"assuming offset {hex(text_offset)}")
+        symbol_load_address = base_address + text_offset
+
+        # Make the shim image visible to edk2-whereis / $edk2_module()
+        image_size = elf_image_extent(symbol_file_path)
+        edk2_helper.image_index.add(ImageRange(base_address, base_address + image_size if image_size else None,
+                                               "shim", "shim", None, symbol_file_path))
+
+        print(f"Loading '{symbol_file_path}' at {hex(symbol_load_address)}")
+
+        # Skips the load if GDB already holds this file at this address and
+        # replaces it if it was loaded elsewhere (e.g. in an earlier boot).
+        edk2_helper.forget_objfile_counts()
+        result = edk2_helper.add_symbol_file(symbol_file_path, symbol_load_address, single_instance=True)
+        print(f"Shim symbols {result}.")
 
 LoadShimSymbols()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+"""
+Parses and verifies EFI_VARIABLE_AUTHENTICATION_2 payloads written by
+create_auth_payload.py / create_esl.py: the EFI_TIME, the
+WIN_CERTIFICATE_UEFI_GUID header, the PKCS#7 SignedData blob and its
+detached signature over VariableName + VendorGuid + Attributes + TimeStamp +
+data, and for PK/KEK/db/dbx/dbt/dbr the EFI_SIGNATURE_LIST structure of the
+data.
+
+Usage: verify_auth_payload.py [--manifest FILE] [--var NAME] [--guid GUID] [--attributes N]
+                              [--trust CERT]... [--workers N] [--quiet] PATH...
+
+PATH may be a payload or a directory, searched recursively for *.auth. The
+variable name of a payload comes from --manifest (a create_auth_payload.py
+batch manifest listing it as an output), --var, or its file name (db.auth,
+DeletePK.auth, ...). With --trust the signer must be one of, or be issued by
+one of, the given certificates. Files are read through mmap and checked in
+a process pool; the exit status is 1 if any payload fails.
+"""
+
+import os
+import re
+import sys
+import mmap
+import time
+import uuid
+import struct
+import hashlib
+import argparse
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from create_auth_payload import DEFAULT_VENDOR_GUIDS, DEFAULT_ATTRIBUTES, EFI_CERT_PKCS7_GUID, \
+    signed_data_prefix, load_batch_manifest
+from create_esl import SignatureListBuilder
+
+EFI_TIME_SIZE = 16
+WIN_CERTIFICATE_UEFI_GUID_SIZE = 24 # dwLength, wRevision, wCertificateType, CertType
+WIN_CERT_REVISION = 0x0200
+WIN_CERT_TYPE_EFI_GUID = 0x0EF1
+
+OID_SIGNED_DATA = "1.2.840.113549.1.7.2"
+OID_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+DIGEST_ALGORITHMS = {
+    "1.3.14.3.2.26": "sha1",
+    "2.16.840.1.101.3.4.2.1": "sha256",
+    "2.16.840.1.101.3.4.2.2": "sha384",
+    "2.16.840.1.101.3.4.2.3": "sha512",
+}
+
+class PayloadError(Exception):
+    pass
+
+def der_element(buf, offset):
+    """Returns (tag, content start, content end) of the DER element at offset."""
+    if offset + 2 > len(buf):
+        raise PayloadError(f"truncated DER element at offset {offset}")
+    tag = buf[offset]
+    length = buf[offset + 1]
+    start = offset + 2
+    if length & 0x80:
+        count = length & 0x7F
+        if count == 0 or count > 4 or start + count > len(buf):
+            raise PayloadError(f"unsupported DER length at offset {offset}")
+        length = int.from_bytes(buf[start:start + count], "big")
+        start += count
+    if start + length > len(buf):
+        raise PayloadError(f"DER element at offset {offset} overruns its container")
+    return tag, start, start + length
+
+def der_children(buf, start, end):
+    """Returns [(tag, element start, content start, content end)] of a constructed element's contents."""
+    children = []
+    while start < end:
+        tag, content_start, content_end = der_element(buf, start)
+        children.append((tag, start, content_start, content_end))
+        start = content_end
+    return children
+
+def der_oid(buf, start, end):
+    octets = bytes(buf[start:end])
+    if not octets:
+        raise PayloadError("empty OID")
+    parts = [min(octets[0] // 40, 2)]
+    parts.append(octets[0] - parts[0] * 40)
+    value = 0
+    for octet in octets[1:]:
+        value = (value << 7) | (octet & 0x7F)
+        if not octet & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(str(part) for part in parts)
+
+def parse_signed_data(blob):
+    """
+    Returns (certificates DER, signer infos) of a PKCS#7 SignedData, with or
+    without its ContentInfo wrapper (firmware accepts both). Each signer info
+    is a dict with the issuer DER, serial, digest name, the signed attributes
+    DER (or None) and the signature.
+    """
+    tag, start, end = der_element(blob, 0)
+    if tag != 0x30:
+        raise PayloadError("PKCS#7 blob is not a SEQUENCE")
+    fields = der_children(blob, start, end)
+    if fields and fields[0][0] == 0x06: # ContentInfo
+        if der_oid(blob, fields[0][2], fields[0][3]) != OID_SIGNED_DATA or len(fields) < 2:
+            raise PayloadError("PKCS#7 ContentInfo is not SignedData")
+        tag, start, end = der_element(blob, fields[1][2])
+        fields = der_children(blob, start, end)
+    if len(fields) < 4 or fields[0][0] != 0x02:
+        raise PayloadError("malformed SignedData")
+
+    certificates = []
+    signer_infos_field = fields[-1]
+    for tag, element_start, content_start, content_end in fields[3:-1]:
+        if tag == 0xA0:
+            certificates = [bytes(blob[child[1]:child[3]]) for child in der_children(blob, content_start, content_end)]
+    if signer_infos_field[0] != 0x31:
+        raise PayloadError("SignedData has no signerInfos SET")
+
+    signer_infos = []
+    for signer in der_children(blob, signer_infos_field[2], signer_infos_field[3]):
+        signer_fields = der_children(blob, signer[2], signer[3])
+        if len(signer_fields) < 5 or signer_fields[1][0] != 0x30:
+            raise PayloadError("unsupported SignerInfo (only issuerAndSerialNumber signers)")
+        issuer, serial = der_children(blob, signer_fields[1][2], signer_fields[1][3])[:2]
+        digest_algorithm = der_children(blob, signer_fields[2][2], signer_fields[2][3])[0]
+        digest_oid = der_oid(blob, digest_algorithm[2], digest_algorithm[3])
+        if digest_oid not in DIGEST_ALGORITHMS:
+            raise PayloadError(f"unsupported digest algorithm {digest_oid}")
+        index = 3
+        signed_attributes = None
+        if signer_fields[index][0] == 0xA0:
+            signed_attributes = signer_fields[index]
+            index += 1
+        signature = signer_fields[index + 1]
+        if signature[0] != 0x04:
+            raise PayloadError("SignerInfo signature is not an OCTET STRING")
+        signer_infos.append({
+            "issuer": bytes(blob[issuer[1]:issuer[3]]),
+            "serial": int.from_bytes(blob[serial[2]:serial[3]], "big", signed=True),
+            "digest": DIGEST_ALGORITHMS[digest_oid],
+            "signed_attributes": signed_attributes and (bytes(blob[signed_attributes[1]:signed_attributes[3]]),
+                                                        signed_attributes[2] - signed_attributes[1]),
+            "signature": bytes(blob[signature[2]:signature[3]]),
+        })
+    if not signer_infos:
+        raise PayloadError("SignedData has no signers")
+    return certificates, signer_infos
+
+def message_digest_attribute(signed_attributes):
+    """Returns the messageDigest value of a DER [0] signedAttrs element."""
+    attributes, header_size = signed_attributes
+    for attribute in der_children(attributes, header_size, len(attributes)):
+        oid, values = der_children(attributes, attribute[2], attribute[3])[:2]
+        if der_oid(attributes, oid[2], oid[3]) == OID_MESSAGE_DIGEST:
+            value = der_children(attributes, values[2], values[3])[0]
+            return attributes[value[2]:value[3]]
+    raise PayloadError("signedAttrs carry no messageDigest")
+
+def verify_signature(certificate, signature, data, digest_name):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+
+    algorithm = getattr(hashes, digest_name.upper())()
+    public_key = certificate.public_key()
+    if isinstance(public_key, rsa.RSAPublicKey):
+        public_key.verify(signature, data, padding.PKCS1v15(), algorithm)
+    elif isinstance(public_key, ec.EllipticCurvePublicKey):
+        public_key.verify(signature, data, ec.ECDSA(algorithm))
+    else:
+        raise PayloadError(f"unsupported signer key type {type(public_key).__name__}")
+
+def variable_name_for(path, manifest_names):
+    """Returns the variable name of a payload from the manifest or its file name, or None."""
+    name = manifest_names.get(os.path.realpath(path))
+    if name:
+        return name
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem in DEFAULT_VENDOR_GUIDS:
+        return stem
+    # Longest name first so that "dbx" wins over "db"
+    for known in sorted(DEFAULT_VENDOR_GUIDS, key=len, reverse=True):
+        if stem.endswith(known) or re.match(re.escape(known) + r"([-_.]|\d)", stem):
+            return known
+    return None
+
+def verify_payload(path, variable_name, vendor_guid, attributes, trusted_der=()):
+    """
+    Verifies one payload. Returns a dict with the parsed fields; raises
+    PayloadError (or a cryptography error) describing the first problem.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < EFI_TIME_SIZE + WIN_CERTIFICATE_UEFI_GUID_SIZE:
+            raise PayloadError(f"{size} bytes is too short for an EFI_VARIABLE_AUTHENTICATION_2 header")
+        payload = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return check_payload(memoryview(payload), variable_name, vendor_guid, attributes, trusted_der)
+    finally:
+        try:
+            payload.close()
+        except BufferError:
+            pass # Views are still held by an exception's traceback; the mmap closes with them
+
+def check_payload(view, variable_name, vendor_guid, attributes, trusted_der=()):
+    """Verifies the payload in view; see verify_payload()."""
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+
+    efi_time = bytes(view[:EFI_TIME_SIZE])
+    year, month, day, hour, minute, second, pad1, nanosecond, time_zone, daylight, pad2 = \
+        struct.unpack("<H6BIhBB", efi_time)
+    # Time-based authenticated variables require all but the date and time to be 0
+    if pad1 or nanosecond or time_zone or daylight or pad2:
+        raise PayloadError("EFI_TIME Pad1, Nanosecond, TimeZone, Daylight and Pad2 must be 0")
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour <= 23 and minute <= 59 and second <= 59):
+        raise PayloadError(f"invalid EFI_TIME {year}-{month}-{day} {hour}:{minute}:{second}")
+
+    length, revision, certificate_type = struct.unpack_from("<LHH", view, EFI_TIME_SIZE)
+    if revision != WIN_CERT_REVISION or certificate_type != WIN_CERT_TYPE_EFI_GUID:
+        raise PayloadError(f"WIN_CERTIFICATE revision 0x{revision:X} type 0x{certificate_type:X}, "
+                           f"expected 0x{WIN_CERT_REVISION:X} 0x{WIN_CERT_TYPE_EFI_GUID:X}")
+    if bytes(view[EFI_TIME_SIZE + 8:EFI_TIME_SIZE + WIN_CERTIFICATE_UEFI_GUID_SIZE]) != EFI_CERT_PKCS7_GUID:
+        raise PayloadError("WIN_CERTIFICATE_UEFI_GUID CertType is not EFI_CERT_TYPE_PKCS7_GUID")
+    data_offset = EFI_TIME_SIZE + length
+    if length <= WIN_CERTIFICATE_UEFI_GUID_SIZE or data_offset > len(view):
+        raise PayloadError(f"WIN_CERTIFICATE dwLength {length} does not fit the {len(view)} byte payload")
+
+    pkcs7_blob = view[EFI_TIME_SIZE + WIN_CERTIFICATE_UEFI_GUID_SIZE:data_offset]
+    data = view[data_offset:]
+    certificates, signer_infos = parse_signed_data(pkcs7_blob)
+    certificates = [x509.load_der_x509_certificate(der) for der in certificates]
+
+    if variable_name in DEFAULT_VENDOR_GUIDS and len(data):
+        try:
+            SignatureListBuilder(uuid.UUID(int=0)).add_esl(data)
+        except ValueError as e:
+            raise PayloadError(f"data is not a valid EFI_SIGNATURE_LIST: {e}")
+
+    prefix = signed_data_prefix(variable_name, vendor_guid, attributes, efi_time)
+    # Only the certificates of verified SignerInfos are reported; the blob
+    # may also carry intermediates or unrelated certificates
+    signers = []
+    for signer in signer_infos:
+        certificate = next((certificate for certificate in certificates
+                            if certificate.serial_number == signer["serial"] and
+                            certificate.issuer.public_bytes() == signer["issuer"]), None)
+        if certificate is None:
+            raise PayloadError("signer certificate is not embedded in the PKCS#7 blob")
+
+        # Hash the prefix and the mmap'd data without joining them
+        content_digest = hashlib.new(signer["digest"], prefix)
+        content_digest.update(data)
+        try:
+            if signer["signed_attributes"]:
+                if bytes(message_digest_attribute(signer["signed_attributes"])) != content_digest.digest():
+                    raise PayloadError("messageDigest does not match the signed data "
+                                       f"(wrong variable name/GUID/attributes for '{variable_name}'?)")
+                # The signature covers the attributes re-tagged as a SET OF
+                verify_signature(certificate, signer["signature"],
+                                 b"\x31" + signer["signed_attributes"][0][1:], signer["digest"])
+            else:
+                verify_signature(certificate, signer["signature"], prefix + bytes(data), signer["digest"])
+        except InvalidSignature:
+            raise PayloadError(f"signature by '{certificate.subject.rfc4514_string()}' does not verify")
+
+        if trusted_der:
+            trusted = [x509.load_der_x509_certificate(der) for der in trusted_der]
+            if not any(certificate == anchor or certificate_issued_by(certificate, anchor) for anchor in trusted):
+                raise PayloadError(f"signer '{certificate.subject.rfc4514_string()}' is not trusted")
+        signers.append(certificate.subject.rfc4514_string())
+
+    return {"time": f"{year:04}-{month:02}-{day:02} {hour:02}:{minute:02}:{second:02}",
+            "signers": signers,
+            "data_size": len(data)}
+
+def certificate_issued_by(certificate, issuer):
+    try:
+        certificate.verify_directly_issued_by(issuer)
+    except Exception:
+        return False
+    return True
+
+def verify_entry(job):
+    """Pool worker: returns (path, variable name, info or None, error or None)."""
+    path, variable_name, vendor_guid, attributes, trusted_der = job
+    if not variable_name:
+        return (path, None, None, "unknown variable name: use --var or --manifest")
+    try:
+        return (path, variable_name, verify_payload(path, variable_name, vendor_guid, attributes, trusted_der), None)
+    except Exception as e:
+        return (path, variable_name, None, str(e) or type(e).__name__)
+
+def collect_payloads(paths):
+    payloads = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                payloads.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".auth"))
+        else:
+            payloads.append(path)
+    return payloads
+
+def load_trusted_certificates(cert_files):
+    """Returns the DER encodings of PEM or DER certificate files."""
+    builder = SignatureListBuilder(uuid.UUID(int=0))
+    for cert_file in cert_files:
+        builder.add_cert_file(cert_file)
+    return tuple(data for (_, data) in builder.entries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify EFI_VARIABLE_AUTHENTICATION_2 payloads.")
+    parser.add_argument("paths", nargs="+", help="payload files or directories of *.auth files")
+    parser.add_argument("--manifest", action="append", default=[],
+                        help="create_auth_payload.py batch manifest naming the payloads (repeatable)")
+    parser.add_argument("--var", help="variable name of all payloads")
+    parser.add_argument("--guid", help="vendor GUID (default: from the variable name)")
+    parser.add_argument("--attributes", type=lambda value: int(value, 0), default=None,
+                        help=f"variable attributes (default: manifest value or 0x{DEFAULT_ATTRIBUTES:X})")
+    parser.add_argument("--trust", action="append", default=[], help="trusted signer or issuer certificate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="verification processes (default: CPU count)")
+    parser.add_argument("--quiet", action="store_true", help="only report failures")
+    args = parser.parse_args()
+
+    try:
+        manifest_entries = {}
+        for manifest in args.manifest:
+            for entry in load_batch_manifest(manifest):
+                manifest_entries[os.path.realpath(entry['output'])] = entry
+        trusted_der = load_trusted_certificates(args.trust)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    jobs = []
+    manifest_names = {path: entry['name'] for path, entry in manifest_entries.items()}
+    for path in collect_payloads(args.paths):
+        entry = manifest_entries.get(os.path.realpath(path), {})
+        variable_name = args.var or variable_name_for(path, manifest_names)
+        vendor_guid = args.guid or entry.get('guid') or DEFAULT_VENDOR_GUIDS.get(variable_name or "")
+        attributes = args.attributes if args.attributes is not None else entry.get('attributes', DEFAULT_ATTRIBUTES)
+        if variable_name and not vendor_guid:
+            variable_name = None
+        jobs.append((path, variable_name, vendor_guid, attributes, trusted_der))
+    if not jobs:
+        print("No payloads found.")
+        return 1
+
+    start = time.perf_counter()
+    if args.workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(verify_entry, jobs, chunksize=max(1, len(jobs) // (args.workers * 8))))
+    else:
+        results = [verify_entry(job) for job in jobs]
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    for path, variable_name, info, error in results:
+        if error:
+            failures += 1
+            print(f"FAIL {path} ({variable_name or '?'}): {error}")
+        elif not args.quiet:
+            print(f"OK   {path} ({variable_name}, {info['time']}, {info['data_size']} bytes, "
+                  f"signed by {'; '.join(info['signers'])})")
+    print(f"Verified {len(results) - failures} of {len(results)} payloads in {elapsed:.3f} s "
+          f"({len(results) / elapsed if elapsed else 0:.1f} payloads/s), {failures} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
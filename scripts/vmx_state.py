@@ -0,0 +1,574 @@
+# vmx_state.py
+#
+# GDB Python script to snapshot VMCS state of the stopped pKVM hypervisor and
+# decode it on the host side.
+#
+# 'vmx vmcs dump' in gdb-commands formats a fixed set of fields in the target
+# and every 'vmx vmcs <offset>' is another inferior call over the remote
+# stub. The snapshots taken here are decoded by GDB itself with the field
+# encoding table below, kept in a history and compared with each other.
+#
+# Two snapshot sources:
+# - A software VMCS in pKVM's struct vmcs12 layout (the cached_vmcs12 page of
+#   a shadow vcpu, or a vmcs12 page in guest memory) is read with one bulk
+#   memory read and decoded with the struct layout from the debug info.
+# - Without an address the current hardware VMCS is read through one
+#   debug_dump_vmcs() call, whose output is parsed into the same fields. The
+#   hardware VMCS region format is processor specific (SDM 25.2), so it
+#   cannot be decoded from a memory read.
+#
+# To use (after gdb-commands, which defines the 'vmx vmcs' prefix):
+#   source scripts/vmx_state.py
+#   vmx vmcs snapshot [<vmcs12 address expression>]
+#     e.g. vmx vmcs snapshot pkvm_hyp->host_vm.host_vcpus[0]->current_shadow_vcpu->cached_vmcs12
+#   vmx vmcs show [<snapshot>] [FIELD...]
+#   vmx vmcs diff [<snapshot> [<snapshot>]]   (default: the last two snapshots)
+#
+# The script also caches what 'vmx msr', 'vmx msr dump' and 'lapics' read
+# from the target (debug_read_msr(), debug_dump_vmx_msr_state() and
+# print_apicstate()) until the target resumes, so repeated queries at one
+# stop cost no remote traffic. gdb-commands uses the cache through
+# $vmx_msr(), $vmx_msr_dump() and $lapic_state() once this script is loaded.
+#   vmx msr diff   (MSRs and LAPIC registers that changed since the last stop)
+#
+import gdb
+import re
+import time
+
+# Number of snapshots kept for 'vmx vmcs show' / 'vmx vmcs diff'
+VMX_SNAPSHOT_HISTORY = 64
+
+# VMCS field encodings (arch/x86/include/asm/vmx.h)
+VMCS_FIELDS = {
+    0x0000: "VIRTUAL_PROCESSOR_ID",
+    0x0002: "POSTED_INTR_NV",
+    0x0008: "LAST_PID_POINTER_INDEX",
+    0x0800: "GUEST_ES_SELECTOR",
+    0x0802: "GUEST_CS_SELECTOR",
+    0x0804: "GUEST_SS_SELECTOR",
+    0x0806: "GUEST_DS_SELECTOR",
+    0x0808: "GUEST_FS_SELECTOR",
+    0x080a: "GUEST_GS_SELECTOR",
+    0x080c: "GUEST_LDTR_SELECTOR",
+    0x080e: "GUEST_TR_SELECTOR",
+    0x0810: "GUEST_INTR_STATUS",
+    0x0812: "GUEST_PML_INDEX",
+    0x0c00: "HOST_ES_SELECTOR",
+    0x0c02: "HOST_CS_SELECTOR",
+    0x0c04: "HOST_SS_SELECTOR",
+    0x0c06: "HOST_DS_SELECTOR",
+    0x0c08: "HOST_FS_SELECTOR",
+    0x0c0a: "HOST_GS_SELECTOR",
+    0x0c0c: "HOST_TR_SELECTOR",
+    0x2000: "IO_BITMAP_A",
+    0x2002: "IO_BITMAP_B",
+    0x2004: "MSR_BITMAP",
+    0x2006: "VM_EXIT_MSR_STORE_ADDR",
+    0x2008: "VM_EXIT_MSR_LOAD_ADDR",
+    0x200a: "VM_ENTRY_MSR_LOAD_ADDR",
+    0x200e: "PML_ADDRESS",
+    0x2010: "TSC_OFFSET",
+    0x2012: "VIRTUAL_APIC_PAGE_ADDR",
+    0x2014: "APIC_ACCESS_ADDR",
+    0x2016: "POSTED_INTR_DESC_ADDR",
+    0x2018: "VM_FUNCTION_CONTROL",
+    0x201a: "EPT_POINTER",
+    0x201c: "EOI_EXIT_BITMAP0",
+    0x201e: "EOI_EXIT_BITMAP1",
+    0x2020: "EOI_EXIT_BITMAP2",
+    0x2022: "EOI_EXIT_BITMAP3",
+    0x2024: "EPTP_LIST_ADDRESS",
+    0x2026: "VMREAD_BITMAP",
+    0x2028: "VMWRITE_BITMAP",
+    0x202c: "XSS_EXIT_BITMAP",
+    0x202e: "ENCLS_EXITING_BITMAP",
+    0x2032: "TSC_MULTIPLIER",
+    0x2034: "TERTIARY_VM_EXEC_CONTROL",
+    0x2042: "PID_POINTER_TABLE",
+    0x2400: "GUEST_PHYSICAL_ADDRESS",
+    0x2800: "VMCS_LINK_POINTER",
+    0x2802: "GUEST_IA32_DEBUGCTL",
+    0x2804: "GUEST_IA32_PAT",
+    0x2806: "GUEST_IA32_EFER",
+    0x2808: "GUEST_IA32_PERF_GLOBAL_CTRL",
+    0x280a: "GUEST_PDPTR0",
+    0x280c: "GUEST_PDPTR1",
+    0x280e: "GUEST_PDPTR2",
+    0x2810: "GUEST_PDPTR3",
+    0x2812: "GUEST_BNDCFGS",
+    0x2814: "GUEST_IA32_RTIT_CTL",
+    0x2c00: "HOST_IA32_PAT",
+    0x2c02: "HOST_IA32_EFER",
+    0x2c04: "HOST_IA32_PERF_GLOBAL_CTRL",
+    0x4000: "PIN_BASED_VM_EXEC_CONTROL",
+    0x4002: "CPU_BASED_VM_EXEC_CONTROL",
+    0x4004: "EXCEPTION_BITMAP",
+    0x4006: "PAGE_FAULT_ERROR_CODE_MASK",
+    0x4008: "PAGE_FAULT_ERROR_CODE_MATCH",
+    0x400a: "CR3_TARGET_COUNT",
+    0x400c: "VM_EXIT_CONTROLS",
+    0x400e: "VM_EXIT_MSR_STORE_COUNT",
+    0x4010: "VM_EXIT_MSR_LOAD_COUNT",
+    0x4012: "VM_ENTRY_CONTROLS",
+    0x4014: "VM_ENTRY_MSR_LOAD_COUNT",
+    0x4016: "VM_ENTRY_INTR_INFO_FIELD",
+    0x4018: "VM_ENTRY_EXCEPTION_ERROR_CODE",
+    0x401a: "VM_ENTRY_INSTRUCTION_LEN",
+    0x401c: "TPR_THRESHOLD",
+    0x401e: "SECONDARY_VM_EXEC_CONTROL",
+    0x4020: "PLE_GAP",
+    0x4022: "PLE_WINDOW",
+    0x4024: "NOTIFY_WINDOW",
+    0x4400: "VM_INSTRUCTION_ERROR",
+    0x4402: "VM_EXIT_REASON",
+    0x4404: "VM_EXIT_INTR_INFO",
+    0x4406: "VM_EXIT_INTR_ERROR_CODE",
+    0x4408: "IDT_VECTORING_INFO_FIELD",
+    0x440a: "IDT_VECTORING_ERROR_CODE",
+    0x440c: "VM_EXIT_INSTRUCTION_LEN",
+    0x440e: "VMX_INSTRUCTION_INFO",
+    0x4800: "GUEST_ES_LIMIT",
+    0x4802: "GUEST_CS_LIMIT",
+    0x4804: "GUEST_SS_LIMIT",
+    0x4806: "GUEST_DS_LIMIT",
+    0x4808: "GUEST_FS_LIMIT",
+    0x480a: "GUEST_GS_LIMIT",
+    0x480c: "GUEST_LDTR_LIMIT",
+    0x480e: "GUEST_TR_LIMIT",
+    0x4810: "GUEST_GDTR_LIMIT",
+    0x4812: "GUEST_IDTR_LIMIT",
+    0x4814: "GUEST_ES_AR_BYTES",
+    0x4816: "GUEST_CS_AR_BYTES",
+    0x4818: "GUEST_SS_AR_BYTES",
+    0x481a: "GUEST_DS_AR_BYTES",
+    0x481c: "GUEST_FS_AR_BYTES",
+    0x481e: "GUEST_GS_AR_BYTES",
+    0x4820: "GUEST_LDTR_AR_BYTES",
+    0x4822: "GUEST_TR_AR_BYTES",
+    0x4824: "GUEST_INTERRUPTIBILITY_INFO",
+    0x4826: "GUEST_ACTIVITY_STATE",
+    0x482a: "GUEST_SYSENTER_CS",
+    0x482e: "VMX_PREEMPTION_TIMER_VALUE",
+    0x4c00: "HOST_IA32_SYSENTER_CS",
+    0x6000: "CR0_GUEST_HOST_MASK",
+    0x6002: "CR4_GUEST_HOST_MASK",
+    0x6004: "CR0_READ_SHADOW",
+    0x6006: "CR4_READ_SHADOW",
+    0x6008: "CR3_TARGET_VALUE0",
+    0x600a: "CR3_TARGET_VALUE1",
+    0x600c: "CR3_TARGET_VALUE2",
+    0x600e: "CR3_TARGET_VALUE3",
+    0x6400: "EXIT_QUALIFICATION",
+    0x640a: "GUEST_LINEAR_ADDRESS",
+    0x6800: "GUEST_CR0",
+    0x6802: "GUEST_CR3",
+    0x6804: "GUEST_CR4",
+    0x6806: "GUEST_ES_BASE",
+    0x6808: "GUEST_CS_BASE",
+    0x680a: "GUEST_SS_BASE",
+    0x680c: "GUEST_DS_BASE",
+    0x680e: "GUEST_FS_BASE",
+    0x6810: "GUEST_GS_BASE",
+    0x6812: "GUEST_LDTR_BASE",
+    0x6814: "GUEST_TR_BASE",
+    0x6816: "GUEST_GDTR_BASE",
+    0x6818: "GUEST_IDTR_BASE",
+    0x681a: "GUEST_DR7",
+    0x681c: "GUEST_RSP",
+    0x681e: "GUEST_RIP",
+    0x6820: "GUEST_RFLAGS",
+    0x6822: "GUEST_PENDING_DBG_EXCEPTIONS",
+    0x6824: "GUEST_SYSENTER_ESP",
+    0x6826: "GUEST_SYSENTER_EIP",
+    0x6828: "GUEST_S_CET",
+    0x682a: "GUEST_SSP",
+    0x682c: "GUEST_INTR_SSP_TABLE",
+    0x6c00: "HOST_CR0",
+    0x6c02: "HOST_CR3",
+    0x6c04: "HOST_CR4",
+    0x6c06: "HOST_FS_BASE",
+    0x6c08: "HOST_GS_BASE",
+    0x6c0a: "HOST_TR_BASE",
+    0x6c0c: "HOST_GDTR_BASE",
+    0x6c0e: "HOST_IDTR_BASE",
+    0x6c10: "HOST_IA32_SYSENTER_ESP",
+    0x6c12: "HOST_IA32_SYSENTER_EIP",
+    0x6c14: "HOST_RSP",
+    0x6c16: "HOST_RIP",
+    0x6c18: "HOST_S_CET",
+    0x6c1a: "HOST_SSP",
+    0x6c1c: "HOST_INTR_SSP_TABLE",
+}
+VMCS_FIELD_ENCODINGS = {name: encoding for encoding, name in VMCS_FIELDS.items()}
+
+# Basic exit reasons (bits 15:0 of VM_EXIT_REASON, SDM Appendix C)
+VMX_EXIT_REASONS = {
+    0: "EXCEPTION_NMI", 1: "EXTERNAL_INTERRUPT", 2: "TRIPLE_FAULT", 3: "INIT_SIGNAL", 4: "SIPI_SIGNAL",
+    7: "INTERRUPT_WINDOW", 8: "NMI_WINDOW", 9: "TASK_SWITCH", 10: "CPUID", 12: "HLT", 13: "INVD",
+    14: "INVLPG", 15: "RDPMC", 16: "RDTSC", 18: "VMCALL", 19: "VMCLEAR", 20: "VMLAUNCH",
+    21: "VMPTRLD", 22: "VMPTRST", 23: "VMREAD", 24: "VMRESUME", 25: "VMWRITE", 26: "VMOFF",
+    27: "VMON", 28: "CR_ACCESS", 29: "DR_ACCESS", 30: "IO_INSTRUCTION", 31: "MSR_READ",
+    32: "MSR_WRITE", 33: "INVALID_STATE", 34: "MSR_LOAD_FAIL", 36: "MWAIT_INSTRUCTION",
+    37: "MONITOR_TRAP_FLAG", 39: "MONITOR_INSTRUCTION", 40: "PAUSE_INSTRUCTION", 41: "MCE_DURING_VMENTRY",
+    43: "TPR_BELOW_THRESHOLD", 44: "APIC_ACCESS", 45: "EOI_INDUCED", 46: "GDTR_IDTR", 47: "LDTR_TR",
+    48: "EPT_VIOLATION", 49: "EPT_MISCONFIG", 50: "INVEPT", 51: "RDTSCP", 52: "PREEMPTION_TIMER",
+    53: "INVVPID", 54: "WBINVD", 55: "XSETBV", 56: "APIC_WRITE", 57: "RDRAND", 58: "INVPCID",
+    59: "VMFUNC", 60: "ENCLS", 61: "RDSEED", 62: "PML_FULL", 63: "XSAVES", 64: "XRSTORS",
+    67: "UMWAIT", 68: "TPAUSE", 74: "BUS_LOCK", 75: "NOTIFY",
+}
+
+def describe_vmcs_value(encoding, value):
+    """Returns a short decoded annotation for fields where the raw value is not self-explanatory."""
+    name = VMCS_FIELDS.get(encoding)
+    if name == "VM_EXIT_REASON":
+        reason = VMX_EXIT_REASONS.get(value & 0xffff, f"reason {value & 0xffff}")
+        return reason + (" (entry failure)" if value & (1 << 31) else "")
+    if name in ("VM_EXIT_INTR_INFO", "IDT_VECTORING_INFO_FIELD", "VM_ENTRY_INTR_INFO_FIELD"):
+        if not value & (1 << 31):
+            return "invalid"
+        return f"vector {value & 0xff} type {(value >> 8) & 7}" + (" +error code" if value & (1 << 11) else "")
+    return None
+
+class VmcsSnapshot:
+    """Field values of one VMCS at one stop, keyed by field encoding."""
+
+    def __init__(self, source, values, seconds):
+        self.source = source
+        self.values = values
+        self.seconds = seconds
+        self.taken = time.time()
+
+    def lines(self, names=None):
+        wanted = {VMCS_FIELD_ENCODINGS.get(name.upper(), None) for name in names} if names else None
+        for encoding in sorted(self.values):
+            if wanted is not None and encoding not in wanted:
+                continue
+            value = self.values[encoding]
+            line = f"{VMCS_FIELDS[encoding]:<35}\t0x{value:016x}"
+            annotation = describe_vmcs_value(encoding, value)
+            yield f"{line}  {annotation}" if annotation else line
+
+def diff_vmcs_snapshots(old, new):
+    """Returns (encoding, old value or None, new value or None) for every field that differs."""
+    changes = []
+    for encoding in sorted(set(old.values) | set(new.values)):
+        before = old.values.get(encoding)
+        after = new.values.get(encoding)
+        if before != after:
+            changes.append((encoding, before, after))
+    return changes
+
+class Vmcs12Layout:
+    """
+    Offsets and sizes of the VMCS fields in struct vmcs12, taken from the
+    debug info of the loaded hypervisor. Members are matched to encodings by
+    name (guest_rip <-> GUEST_RIP), like vmcs12.c's FIELD() table does.
+    """
+
+    def __init__(self, vmcs12_type):
+        self.size = vmcs12_type.sizeof
+        self.fields = [] # [(encoding, offset, size)]
+        for field in vmcs12_type.fields():
+            encoding = VMCS_FIELD_ENCODINGS.get((field.name or "").upper())
+            if encoding is None or field.bitpos is None:
+                continue
+            self.fields.append((encoding, field.bitpos // 8, field.type.sizeof))
+
+    def decode(self, data):
+        return {encoding: int.from_bytes(data[offset:offset + size], "little")
+                for encoding, offset, size in self.fields}
+
+def parse_register_dump(dump):
+    """Parses 'NAME<whitespace>value' lines of a ramlog register dump into {NAME: value text}."""
+    values = {}
+    for line in dump.splitlines():
+        match = re.match(r"\s*(\w+)\s+(0x.*?)\s*$", line)
+        if match:
+            values[match.group(1)] = match.group(2)
+    return values
+
+class StopState:
+    """MSR and LAPIC state read from the target during one stop."""
+
+    def __init__(self, number):
+        self.number = number
+        self.msrs = {} # {MSR number: value} from debug_read_msr()
+        self.msr_dump = None # debug_dump_vmx_msr_state() output
+        self.lapic_dump = None # print_apicstate() output
+
+    def is_empty(self):
+        return not self.msrs and self.msr_dump is None and self.lapic_dump is None
+
+    def values(self):
+        values = {f"MSR 0x{msr:x}": f"0x{value:016x}" for msr, value in self.msrs.items()}
+        for dump in (self.msr_dump, self.lapic_dump):
+            if dump is not None:
+                values.update(parse_register_dump(dump))
+        return values
+
+class StopStateCache:
+    """
+    Serves MSR and LAPIC reads from memory until the target resumes. The
+    state of the latest earlier stop that read anything is kept for
+    'vmx msr diff'.
+    """
+
+    def __init__(self):
+        self.current = StopState(1)
+        self.previous = None
+        self.target_calls = 0
+        self.cache_hits = 0
+        self.in_target_call = False
+        gdb.events.cont.connect(self.on_resume)
+        gdb.events.exited.connect(self.on_resume)
+
+    def on_resume(self, event):
+        # Inferior calls resume the target too; the debug helpers called
+        # here only read state, so they do not invalidate the cache.
+        if self.in_target_call:
+            return
+        if not self.current.is_empty():
+            self.previous = self.current
+        self.current = StopState(self.current.number + 1)
+
+    def call_target(self, expression):
+        """Evaluates an inferior call without invalidating the cached state."""
+        self.target_calls += 1
+        self.in_target_call = True
+        try:
+            return gdb.parse_and_eval(expression)
+        finally:
+            self.in_target_call = False
+
+    def read_msr(self, msr):
+        if msr in self.current.msrs:
+            self.cache_hits += 1
+        else:
+            self.current.msrs[msr] = int(self.call_target(f"debug_read_msr({msr})")) & ((1 << 64) - 1)
+        return self.current.msrs[msr]
+
+    def read_msr_dump(self):
+        if self.current.msr_dump is None:
+            self.current.msr_dump = self.call_target("debug_dump_vmx_msr_state()").string()
+        else:
+            self.cache_hits += 1
+        return self.current.msr_dump
+
+    def read_lapic_dump(self):
+        if self.current.lapic_dump is None:
+            self.current.lapic_dump = self.call_target("print_apicstate()").string()
+        else:
+            self.cache_hits += 1
+        return self.current.lapic_dump
+
+stop_state = StopStateCache()
+
+class VmxStateCache:
+    """Snapshot history and the vmcs12 layout, reset when the symbols change."""
+
+    def __init__(self):
+        self.snapshots = []
+        self.first_index = 1 # history number of snapshots[0]
+        self.vmcs12_layout = None
+        gdb.events.new_objfile.connect(self.on_new_objfile)
+
+    def on_new_objfile(self, event):
+        self.vmcs12_layout = None
+
+    def get_vmcs12_layout(self):
+        if self.vmcs12_layout is None:
+            try:
+                vmcs12_type = gdb.lookup_type("struct vmcs12")
+            except gdb.error:
+                raise gdb.GdbError("No 'struct vmcs12' in the loaded symbols; load the hypervisor vmlinux first.")
+            self.vmcs12_layout = Vmcs12Layout(vmcs12_type)
+        return self.vmcs12_layout
+
+    def read_vmcs12(self, expression):
+        """Reads a vmcs12 region with one memory read and decodes it on the host."""
+        layout = self.get_vmcs12_layout()
+        value = gdb.parse_and_eval(expression)
+        if value.type.strip_typedefs().code == gdb.TYPE_CODE_ARRAY:
+            value = value.address
+        address = int(value)
+        data = bytes(gdb.selected_inferior().read_memory(address, layout.size))
+        return f"vmcs12 at {hex(address)}", layout.decode(data)
+
+    def read_hardware_vmcs(self):
+        """Parses the output of one debug_dump_vmcs() call in the target."""
+        dump = stop_state.call_target("debug_dump_vmcs()").string()
+        values = {}
+        for line in dump.splitlines():
+            match = re.match(r"\s*(\w+)\s+0x([0-9a-fA-F]+)\s*$", line)
+            if match and match.group(1) in VMCS_FIELD_ENCODINGS:
+                values[VMCS_FIELD_ENCODINGS[match.group(1)]] = int(match.group(2), 16)
+            elif line.strip() and not line.rstrip().endswith("is not available"):
+                print(f"Warning: {line.strip()}")
+        return "current VMCS", values
+
+    def take_snapshot(self, expression=None):
+        start = time.perf_counter()
+        if expression:
+            source, values = self.read_vmcs12(expression)
+        else:
+            source, values = self.read_hardware_vmcs()
+        snapshot = VmcsSnapshot(source, values, time.perf_counter() - start)
+        self.snapshots.append(snapshot)
+        if len(self.snapshots) > VMX_SNAPSHOT_HISTORY:
+            del self.snapshots[0]
+            self.first_index += 1
+        return self.first_index + len(self.snapshots) - 1, snapshot
+
+    def get_snapshot(self, number):
+        """Returns snapshot #number; negative numbers count back from the latest."""
+        if not self.snapshots:
+            raise gdb.GdbError("No VMCS snapshots yet; take one with 'vmx vmcs snapshot'.")
+        index = len(self.snapshots) + number if number < 0 else number - self.first_index
+        if not 0 <= index < len(self.snapshots):
+            raise gdb.GdbError(f"No VMCS snapshot #{number} (have #{self.first_index}.."
+                               f"#{self.first_index + len(self.snapshots) - 1}).")
+        return self.first_index + index, self.snapshots[index]
+
+vmx_state = VmxStateCache()
+
+def parse_snapshot_number(argument):
+    try:
+        return int(argument.lstrip("#"), 0)
+    except ValueError:
+        raise gdb.GdbError(f"Invalid snapshot number '{argument}'.")
+
+class VmxVmcsSnapshotCommand(gdb.Command):
+    """Snapshot VMCS fields for host-side decoding and diffs.
+    Usage: vmx vmcs snapshot [<vmcs12 address expression>]
+
+    With an expression the struct vmcs12 at that address (an array such as
+    shadow_vcpu->cached_vmcs12 or a pointer) is read in one memory read.
+    Without one the current hardware VMCS is read through debug_dump_vmcs()."""
+
+    def __init__(self):
+        super(VmxVmcsSnapshotCommand, self).__init__("vmx vmcs snapshot", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        number, snapshot = vmx_state.take_snapshot(argument.strip() or None)
+        print(f"VMCS snapshot #{number}: {len(snapshot.values)} fields of the {snapshot.source} "
+              f"in {snapshot.seconds * 1000:.1f} ms")
+
+class VmxVmcsShowCommand(gdb.Command):
+    """Print a VMCS snapshot decoded on the host.
+    Usage: vmx vmcs show [<snapshot>] [FIELD...]
+
+    Shows the latest snapshot by default; FIELD limits the output to the
+    named fields, e.g. 'vmx vmcs show GUEST_RIP VM_EXIT_REASON'."""
+
+    def __init__(self):
+        super(VmxVmcsShowCommand, self).__init__("vmx vmcs show", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        args = gdb.string_to_argv(argument)
+        number = -1
+        if args and args[0].upper() not in VMCS_FIELD_ENCODINGS:
+            number = parse_snapshot_number(args.pop(0))
+        unknown = [name for name in args if name.upper() not in VMCS_FIELD_ENCODINGS]
+        if unknown:
+            raise gdb.GdbError(f"Unknown VMCS field(s): {', '.join(unknown)}")
+        number, snapshot = vmx_state.get_snapshot(number)
+        print(f"VMCS snapshot #{number} ({snapshot.source}, "
+              f"{time.strftime('%H:%M:%S', time.localtime(snapshot.taken))}):")
+        for line in snapshot.lines(args):
+            print(line)
+
+class VmxVmcsDiffCommand(gdb.Command):
+    """Show the VMCS fields that differ between two snapshots.
+    Usage: vmx vmcs diff [<old snapshot> [<new snapshot>]]
+
+    Compares the last two snapshots by default; with one argument that
+    snapshot is compared with the latest one."""
+
+    def __init__(self):
+        super(VmxVmcsDiffCommand, self).__init__("vmx vmcs diff", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        args = gdb.string_to_argv(argument)
+        if len(args) > 2:
+            raise gdb.GdbError("Usage: vmx vmcs diff [<old snapshot> [<new snapshot>]]")
+        old_number = parse_snapshot_number(args[0]) if args else -2
+        new_number = parse_snapshot_number(args[1]) if len(args) > 1 else -1
+        old_number, old = vmx_state.get_snapshot(old_number)
+        new_number, new = vmx_state.get_snapshot(new_number)
+
+        changes = diff_vmcs_snapshots(old, new)
+        print(f"VMCS snapshot #{old_number} -> #{new_number}: {len(changes)} fields changed")
+        for encoding, before, after in changes:
+            before_text = f"0x{before:016x}" if before is not None else "-"
+            after_text = f"0x{after:016x}" if after is not None else "-"
+            annotation = describe_vmcs_value(encoding, after) if after is not None else None
+            print(f"{VMCS_FIELDS[encoding]:<35}\t{before_text:>18} -> {after_text}"
+                  + (f"  {annotation}" if annotation else ""))
+
+class VmxMsrDiffCommand(gdb.Command):
+    """Show the MSRs and LAPIC registers that changed since the last stop.
+    Usage: vmx msr diff
+
+    Reads the VMX MSR dump and the LAPIC state of this stop (from the cache
+    when 'vmx msr dump' or 'lapics' already did) and compares them, and the
+    MSRs read with 'vmx msr', with the state recorded at the latest earlier
+    stop."""
+
+    def __init__(self):
+        super(VmxMsrDiffCommand, self).__init__("vmx msr diff", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        stop_state.read_msr_dump()
+        stop_state.read_lapic_dump()
+        current = stop_state.current
+        previous = stop_state.previous
+        if previous is None:
+            print(f"Recorded the MSR and LAPIC state of stop #{current.number}; "
+                  f"nothing from an earlier stop to compare with yet.")
+            return
+
+        old_values = previous.values()
+        new_values = current.values()
+        common = [name for name in new_values if name in old_values]
+        changes = [name for name in common if old_values[name] != new_values[name]]
+        print(f"Stop #{previous.number} -> #{current.number}: {len(changes)} of {len(common)} values changed "
+              f"({stop_state.target_calls} target calls, {stop_state.cache_hits} served from cache so far)")
+        for name in changes:
+            print(f"{name:<35}\t{old_values[name]}  =>  {new_values[name]}")
+
+class VmxMsrFunction(gdb.Function):
+    """$vmx_msr(MSR): debug_read_msr(MSR), read once per stop."""
+
+    def __init__(self):
+        super(VmxMsrFunction, self).__init__("vmx_msr")
+
+    def invoke(self, msr):
+        return gdb.Value(stop_state.read_msr(int(msr))).cast(gdb.lookup_type("unsigned long long"))
+
+class VmxMsrDumpFunction(gdb.Function):
+    """$vmx_msr_dump(): debug_dump_vmx_msr_state() output, read once per stop."""
+
+    def __init__(self):
+        super(VmxMsrDumpFunction, self).__init__("vmx_msr_dump")
+
+    def invoke(self):
+        return stop_state.read_msr_dump()
+
+class LapicStateFunction(gdb.Function):
+    """$lapic_state(): print_apicstate() output, read once per stop."""
+
+    def __init__(self):
+        super(LapicStateFunction, self).__init__("lapic_state")
+
+    def invoke(self):
+        return stop_state.read_lapic_dump()
+
+VmxVmcsSnapshotCommand()
+VmxVmcsShowCommand()
+VmxVmcsDiffCommand()
+VmxMsrDiffCommand()
+VmxMsrFunction()
+VmxMsrDumpFunction()
+LapicStateFunction()
+# Lets gdb-commands switch 'vmx msr' and 'lapics' over to the cached reads
+gdb.set_convenience_variable("vmx_state_loaded", 1)